@@ -0,0 +1,174 @@
+# Auth/alerts.py
+import os
+import json
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+from .db_utils import ALERTS_FILE, get_storage
+from .storage import read_new_lines, transmission_header
+from .normalization import report_timestamp
+from .atomic_io import atomic_write, file_lock
+
+# HL7 table 0078 flags that mean "look at this" (N = normal, empty = not flagged)
+ABNORMAL_FLAGS = {"H", "HH", "L", "LL", "A", "AA", "<", ">"}
+
+_alert_index = None
+
+
+def abnormal_flag(obs):
+    flag = (obs.get("abnormalFlag") or "").strip().upper()
+    return flag if flag in ABNORMAL_FLAGS else None
+
+
+class AlertIndex:
+    """
+    Abnormal observations by doctor, newest report first, with an
+    acknowledgement state. DB/alerts.jsonl is append-only: one line per
+    abnormal observation ({"alert": id, ...}) and one per acknowledgement
+    ({"ack": id, ...}); every process catches up on lines appended since its
+    last read. Alert ids are patientID:reportId:observation number, so indexing
+    the same report twice is a no-op.
+
+    The file is built from the stored transmissions if it is missing, and
+    rebuild() recreates it the same way, keeping acknowledgements.
+    """
+
+    def __init__(self, path=ALERTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # Serialises writers across processes; reads only take the in-process lock
+        self._write_lock = file_lock(path + ".lock")
+        self._reset()
+
+    def _reset(self):
+        self._offset, self._inode = 0, None
+        self._alerts = {}  # id -> alert line
+        self._acks = {}  # id -> ack line
+        self._open = {}  # doctor -> [(report ts, id)] of unacknowledged alerts, oldest first
+
+    # WRITES
+
+    def _alert_lines(self, patient, report):
+        patient_id = patient["patientID"]
+        header = transmission_header(report)
+        lines = []
+        for i, obs in enumerate(report.get("observations") or [], start=1):
+            flag = abnormal_flag(obs)
+            if flag is None:
+                continue
+            lines.append({"alert": f"{patient_id}:{header['reportId']}:{i}",
+                          "doctor": patient.get("AssignedDoctor"), "patientID": patient_id,
+                          "patient": patient.get("Name"), "MRN": patient.get("MRN"), "reportId": header["reportId"],
+                          "reportDate": header["reportDate"], "ts": report_timestamp(header["reportDate"]),
+                          "code": obs.get("code") or obs.get("observation"), "value": obs.get("value"),
+                          "unit": obs.get("unit"), "referenceRange": obs.get("referenceRange"), "abnormalFlag": flag})
+        return lines
+
+    def _write_lines(self, lines, replace=False):
+        data = "".join(json.dumps(line, separators=(",", ":")) + "\n" for line in lines)
+        if not replace:
+            if data:
+                with open(self.path, "a") as f:
+                    f.write(data)
+            return
+        atomic_write(self.path, data)
+
+    def _build(self, acks=()):
+        """Write the index from every stored transmission, then the given ack lines."""
+        storage = get_storage()
+        lines = []
+        for p in storage.list_patients():
+            for report in storage.transmissions_for_patient(p["patientID"]):
+                lines.extend(self._alert_lines(p, report))
+        known = {line["alert"] for line in lines}
+        lines.extend(a for a in acks if a["ack"] in known)
+        self._write_lines(lines, replace=True)
+        self._reset()
+        return len(known)
+
+    def _ensure_index(self):
+        if os.path.exists(self.path):
+            return
+        with self._write_lock, self._lock:
+            if not os.path.exists(self.path):
+                self._build()
+
+    def add_reports(self, items):
+        """Index the abnormal observations of newly stored (patient, report) pairs; patient is a summary dict."""
+        lines = []
+        for patient, report in items:
+            lines.extend(self._alert_lines(patient, report))
+        if not lines:
+            return 0
+        self._ensure_index()  # a fresh build already includes these reports
+        with self._write_lock, self._lock:
+            self._catch_up()
+            lines = [line for line in lines if line["alert"] not in self._alerts]
+            self._write_lines(lines)
+        return len(lines)
+
+    def acknowledge(self, alert_ids, username):
+        """Mark alerts as seen by username; returns how many were newly acknowledged."""
+        self._ensure_index()
+        with self._write_lock, self._lock:
+            self._catch_up()
+            at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            lines = [{"ack": alert_id, "by": username, "at": at} for alert_id in dict.fromkeys(alert_ids)
+                     if alert_id in self._alerts and alert_id not in self._acks]
+            self._write_lines(lines)
+            self._catch_up()
+        return len(lines)
+
+    def rebuild(self):
+        """Recreate the index from storage, keeping existing acknowledgements."""
+        with self._write_lock, self._lock:
+            acks = []
+            if os.path.exists(self.path):
+                entries, _ = read_new_lines(self.path, 0)
+                acks = [e for e in entries if "ack" in e]
+            return self._build(acks)
+
+    # READS
+
+    def _catch_up(self):
+        """Fold in lines appended (by any process) since the last read."""
+        st = os.stat(self.path)
+        if st.st_ino != self._inode or st.st_size < self._offset:  # first read, or rebuilt since
+            self._reset()
+            self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return
+        entries, self._offset = read_new_lines(self.path, self._offset)
+        for e in entries:
+            if "alert" in e:
+                if e["alert"] in self._alerts:
+                    continue
+                self._alerts[e["alert"]] = e
+                if e["alert"] not in self._acks:
+                    insort(self._open.setdefault(e["doctor"], []), (e["ts"], e["alert"]))
+            elif "ack" in e and e["ack"] not in self._acks:
+                self._acks[e["ack"]] = e
+                alert = self._alerts.get(e["ack"])
+                if alert is not None:
+                    entries_open = self._open.get(alert["doctor"], [])
+                    i = bisect_left(entries_open, (alert["ts"], alert["alert"]))
+                    if i < len(entries_open) and entries_open[i][1] == alert["alert"]:
+                        del entries_open[i]
+
+    def open_alerts(self, doctor_username, offset=0, limit=None):
+        """(alerts, total): a page of the doctor's unacknowledged alerts, newest report first."""
+        self._ensure_index()
+        with self._lock:
+            self._catch_up()
+            entries = self._open.get(doctor_username, [])
+            total = len(entries)
+            end = max(0, total - offset)
+            start = 0 if limit is None else max(0, end - limit)
+            return [dict(self._alerts[alert_id]) for _, alert_id in reversed(entries[start:end])], total
+
+
+def get_alert_index():
+    global _alert_index
+    if _alert_index is None:
+        _alert_index = AlertIndex()
+    return _alert_index
@@ -0,0 +1,142 @@
+# Auth/atomic_io.py
+import os
+import json
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def fsync_dir(directory):
+    """Make a rename in directory durable (POSIX; a no-op elsewhere)."""
+    if os.name != "posix":
+        return
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data, mode="w"):
+    """
+    Replace path with data: written to a temporary file beside it, fsynced,
+    then renamed over it. Readers and a crash at any point see either the old
+    file or the new one, never a truncated mix.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_dir(os.path.dirname(path))
+
+
+def atomic_write_json(path, value, indent=4):
+    atomic_write(path, json.dumps(value, indent=indent))
+
+
+def ensure_json_file(path, default):
+    """Create path holding default unless it exists; never overwrites a file another process just wrote."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path):
+        return
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(default, f, indent=4)
+    try:
+        os.link(tmp_path, path)  # fails if path appeared meanwhile
+    except FileExistsError:
+        pass
+    except OSError:  # no hard links on this filesystem
+        if not os.path.exists(path):
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class FileLock:
+    """
+    Exclusive writer lock shared by threads and processes: a thread lock plus
+    an advisory lock (flock, or msvcrt.locking on Windows) on a separate lock
+    file, so readers of the data file are never blocked. Re-entrant within a
+    thread; the OS lock is taken by the outermost acquire only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth > 1:
+            return
+        try:
+            if self._fd is None:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory, exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                while True:
+                    try:
+                        msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)  # retries for ~10 s, then raises
+                        break
+                    except OSError:
+                        continue
+        except BaseException:
+            self._depth -= 1
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def file_lock(path):
+    """The process-wide FileLock for a lock file path."""
+    path = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+        return lock
@@ -0,0 +1,89 @@
+# Auth/blocking.py
+from collections import Counter, defaultdict
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6"
+}
+
+
+def soundex(word: str) -> str:
+    """American Soundex code of a lowercase word, e.g. johnson -> j525"""
+    if not word:
+        return ""
+    code = word[0]
+    last = SOUNDEX_CODES.get(word[0], "")
+    for ch in word[1:]:
+        digit = SOUNDEX_CODES.get(ch, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if ch not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+
+class CandidateIndex:
+    """
+    Blocking layer for PatientManager.fuzzy_match_patient: only patients sharing
+    a blocking key with the report are sent to the weighted scorer.
+
+    Keys:
+      "dob"  - same normalized DOB. With the 1.0/0.8/0.6 weights a patient whose
+               DOB differs scores at most 75, so for thresholds above 75 this key
+               alone finds every patient the exhaustive scorer could accept.
+      "mrn"  - shares at least `min_shared_grams` digit n-grams of the normalized MRN
+      "name" - same set of Soundex codes over the normalized name tokens
+
+    Dropping keys or raising `min_shared_grams` trades recall for speed.
+    """
+
+    def __init__(self, manager, keys=("dob", "mrn", "name"), ngram=3, min_shared_grams=2):
+        self.manager = manager
+        self.keys = tuple(keys)
+        self.ngram = ngram
+        self.min_shared_grams = min_shared_grams
+        self.position = {}                # Patient -> registry order, to keep tie-breaking identical
+        self.by_dob = defaultdict(list)
+        self.by_gram = defaultdict(list)
+        self.by_name = defaultdict(list)
+        for p in manager.patients:
+            self.add(p)
+
+    def mrn_grams(self, digits):
+        if len(digits) <= self.ngram:
+            return {digits} if digits else set()
+        return {digits[i:i + self.ngram] for i in range(len(digits) - self.ngram + 1)}
+
+    def name_key(self, normalized_name):
+        return " ".join(sorted(soundex(t) for t in normalized_name.split()))
+
+    def add(self, p):
+        # Patients carry their normalized identity columns, so indexing does no parsing
+        self.position[p] = len(self.position)
+        if "dob" in self.keys:
+            self.by_dob[p.NormalizedDOB].append(p)
+        if "mrn" in self.keys:
+            for gram in self.mrn_grams(p.NormalizedMRN):
+                self.by_gram[gram].append(p)
+        if "name" in self.keys:
+            key = self.name_key(p.NormalizedName)
+            if key:
+                self.by_name[key].append(p)
+
+    def candidates(self, mrn, name, dob):
+        """Patients sharing at least one blocking key with the report, in registry order."""
+        found = set()
+        if "dob" in self.keys:
+            found.update(self.by_dob.get(self.manager.normalize_dob(dob), ()))
+        if "mrn" in self.keys:
+            grams = self.mrn_grams(self.manager.normalize_mrn(mrn))
+            shared = Counter(p for gram in grams for p in self.by_gram.get(gram, ()))
+            needed = min(self.min_shared_grams, len(grams))
+            found.update(p for p, count in shared.items() if count >= needed)
+        if "name" in self.keys:
+            key = self.name_key(self.manager.normalize_name(name))
+            if key:
+                found.update(self.by_name.get(key, ()))
+        return sorted(found, key=self.position.__getitem__)
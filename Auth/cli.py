@@ -1,9 +1,14 @@
 # Auth/cli.py
 from .user_management import login, logout, get_current_user
-from .user_management import Admin
+from .user_management import Admin, show_session_log
 from .patient_management import create_patient , search_patient
-from parsing.report_uploader import upload_report
+from parsing.report_uploader import upload_report, upload_directory, watch_folder
+from parsing.mllp_listener import run_listener
 from .doctor_dashboard import run_dashboard
+from .db_utils import PATIENTS_FILE, PATIENTS_DB_FILE, get_storage, cache_stats
+from .storage import migrate_json_to_sqlite
+from .search_index import get_search_index
+from .alerts import get_alert_index
 
 def run_cli():
     print("Welcome to Health+ CLI. Type 'help' to see commands.")
@@ -23,10 +28,59 @@ def run_cli():
             create_patient()
         elif command == "upload-report":
             upload_report()
+        elif command == "upload-batch":
+            upload_report(batch=True)
+        elif command == "ingest-dir":
+            upload_directory()
+        elif command == "watch":
+            watch_folder()
+        elif command == "mllp-listen":
+            current = get_current_user()
+            if not current or current.role != "admin":
+                print("ERROR: Only admin can start the MLLP listener")
+                continue
+            run_listener()
         elif command == "search-patient":
             search_patient()    
         elif command == "dashboard":
             run_dashboard()
+        elif command == "migrate-db":
+            current = get_current_user()
+            if not current or current.role != "admin":
+                print("ERROR: Only admin can migrate the database")
+                continue
+            json_path = input(f"patients.json to import (Enter for {PATIENTS_FILE}): ").strip() or PATIENTS_FILE
+            try:
+                imported, skipped = migrate_json_to_sqlite(json_path, PATIENTS_DB_FILE)
+            except FileNotFoundError:
+                print(f"ERROR: {json_path} not found")
+                continue
+            if imported:
+                get_search_index().rebuild()
+                get_alert_index().rebuild()
+            print(f"SUCCESS: Imported {imported} patients into {PATIENTS_DB_FILE} ({skipped} already present)")
+        elif command == "compact-db":
+            current = get_current_user()
+            if not current or current.role != "admin":
+                print("ERROR: Only admin can compact the database")
+                continue
+            merged = get_storage().compact()
+            print(f"SUCCESS: Storage compacted ({merged} bytes)")
+        elif command == "rebuild-alerts":
+            current = get_current_user()
+            if not current or current.role != "admin":
+                print("ERROR: Only admin can rebuild the abnormal-result index")
+                continue
+            count = get_alert_index().rebuild()
+            print(f"SUCCESS: Abnormal-result index rebuilt ({count} results)")
+        elif command == "session-log":
+            show_session_log()
+        elif command == "cache-stats":
+            stats = cache_stats()
+            if not stats:
+                print("INFO: No files read yet")
+            for name, counts in stats.items():
+                print(f"{name}: {counts['hits']} hits, {counts['misses']} misses")
         elif command == "exit":
             print("Exiting CLI...")
             break
@@ -39,6 +93,15 @@ def run_cli():
             print("dashboard ")
             print("search-patient")
             print("upload-report ")
+            print("upload-batch - Upload a multi-message HL7 batch file")
+            print("ingest-dir - Parse, match and store every report in a directory")
+            print("watch - Keep ingesting new or changed reports in a directory until Ctrl+C")
+            print("mllp-listen - Receive HL7 over MLLP on localhost:2575 until Ctrl+C (admin)")
+            print("migrate-db - Import patients.json (or another JSON registry) into the SQLite database (admin)")
+            print("compact-db - VACUUM the SQLite database, or merge the JSON patient journal into a new snapshot (admin)")
+            print("rebuild-alerts - Rebuild the abnormal-result index from stored reports (admin)")
+            print("session-log - List logins by user and date range (admin)")
+            print("cache-stats - Show how often users, sessions and patient files were served from memory")
             print("exit - Exit the CLI")
         else:
             print("Unknown command. Type 'help' to see commands.")
@@ -1,36 +1,61 @@
 # Auth/db_utils.py
 import os
-import json
+from .storage import JsonStorage, SqliteStorage
+from .file_cache import get_file_cache
+from .atomic_io import atomic_write_json, ensure_json_file, file_lock
 
-BASE_DIR = os.path.join(os.path.dirname(__file__), "../DB")
+# HEALTHPLUS_DB_DIR points everything at another data directory (e.g. a scratch copy)
+BASE_DIR = os.environ.get("HEALTHPLUS_DB_DIR") or os.path.join(os.path.dirname(__file__), "../DB")
 
 USERS_FILE = os.path.join(BASE_DIR, "users.json")
 LOGS_FILE = os.path.join(BASE_DIR, "session.json")
 PATIENTS_FILE = os.path.join(BASE_DIR, "patients.json")
+PATIENTS_DB_FILE = os.path.join(BASE_DIR, "patients.db")
+# Parsed reports by content hash, and the index of reports already stored
+REPORT_CACHE_DIR = os.path.join(BASE_DIR, "report_cache")
+REPORT_INDEX_FILE = os.path.join(BASE_DIR, "report_index.jsonl")
+# Per-patient observation time series (see Auth/observations.py)
+OBSERVATIONS_DIR = os.path.join(BASE_DIR, "observations")
+# Abnormal results and their acknowledgements (see Auth/alerts.py)
+ALERTS_FILE = os.path.join(BASE_DIR, "alerts.jsonl")
+# Per-doctor n-gram index for patient search (see Auth/search_index.py)
+SEARCH_INDEX_DIR = os.path.join(BASE_DIR, "search")
+# Append-only login audit segments (see Auth/session_log.py); replaces session.json
+SESSION_LOG_DIR = os.path.join(BASE_DIR, "sessions")
+# Files already ingested by watch mode (path, size, mtime, content hash)
+WATCH_CHECKPOINT_FILE = os.path.join(BASE_DIR, "watch_checkpoint.jsonl")
+
+# "sqlite" (default) or "json" for the legacy single-file registry
+STORAGE_BACKEND = os.environ.get("HEALTHPLUS_STORAGE", "sqlite").lower()
+
+_storage = None
 
 
 def ensure_file(path):
-    if not os.path.exists(BASE_DIR):
-        os.makedirs(BASE_DIR)
-    if not os.path.exists(path):
-        with open(path, "w") as f:
-            json.dump([], f, indent=4)
+    ensure_json_file(path, [])
+
+
+# Writers take the file's lock (serialised across processes) and replace the
+# file atomically; readers take no lock and always see a complete file
+def users_lock():
+    """Hold around a read-modify-write of users.json so no other process's update is lost."""
+    return file_lock(USERS_FILE + ".lock")
 
 
 # Users
 def read_users():
     ensure_file(USERS_FILE)
     try:
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
+        return get_file_cache().load(USERS_FILE)
     except:
         return []
 
 
 def write_users(users):
     try:
-        with open(USERS_FILE, "w") as f:
-            json.dump(users, f, indent=4)
+        with users_lock():
+            atomic_write_json(USERS_FILE, users)
+        get_file_cache().invalidate(USERS_FILE)
         return True
     except:
         return False
@@ -40,38 +65,42 @@ def write_users(users):
 def read_logs():
     ensure_file(LOGS_FILE)
     try:
-        with open(LOGS_FILE, "r") as f:
-            return json.load(f)
+        return get_file_cache().load(LOGS_FILE)
     except:
         return []
 
 
 def write_logs(logs):
     try:
-        with open(LOGS_FILE, "w") as f:
-            json.dump(logs, f, indent=4)
+        with file_lock(LOGS_FILE + ".lock"):
+            atomic_write_json(LOGS_FILE, logs)
+        get_file_cache().invalidate(LOGS_FILE)
         return True
     except:
         return False
 
 
 # Patients
+def get_storage():
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "json":
+            _storage = JsonStorage(PATIENTS_FILE)
+        else:
+            # A fresh database imports patients.json on first open
+            _storage = SqliteStorage(PATIENTS_DB_FILE, legacy_json=PATIENTS_FILE)
+    return _storage
+
+
 def read_patients():
-    ensure_file(PATIENTS_FILE)
-    try:
-        with open(PATIENTS_FILE, "r") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return []
-    except:
-        return []
+    return get_storage().read_all()
 
 
 def write_patients(patients):
-    try:
-        with open(PATIENTS_FILE, "w") as f:
-            json.dump(patients, f, indent=4)
-        return True
-    except:
-        return False
+    return get_storage().write_all(patients)
+
+
+# Cache
+def cache_stats():
+    """Hit/miss counts of the in-process file cache, per file name."""
+    return get_file_cache().stats()
@@ -1,7 +1,16 @@
 # Auth/doctor_dashboard.py
-from datetime import datetime
+from datetime import datetime, timezone
 from .user_management import get_current_user
-from .db_utils import read_patients
+from .db_utils import get_storage
+from .storage import PANEL_SORTS
+from .observations import get_observation_store
+from .alerts import get_alert_index
+
+# Patients / transmissions per page in the dashboard lists
+PAGE_SIZE = 10
+# Trend view: windows the last year is split into, and latest values listed
+TREND_WINDOWS = 12
+TREND_LAST_N = 10
 
 
 def parse_report_date(report_date_str: str) -> str:
@@ -45,83 +54,172 @@ def format_observation(obs: dict) -> str:
     return " ".join(parts)
 
 
-def list_my_patients(doctor_username: str):
-    patients = read_patients()
-    my = [p for p in patients if p.get("AssignedDoctor") == doctor_username]
-    if not my:
-        print("\n=== My Patients ===")
-        print("No patients assigned to you.")
-        return None
-    print("\n=== My Patients ===")
-    for i, p in enumerate(my, start=1):
-        name = p.get("Name", "Unknown")
-        mrn = p.get("MRN", "Unknown")
-        dob = p.get("DOB", "Unknown")
-        transmissions = p.get("Transmissions", []) or []
-        print(f"{i}. {name} (MRN: {mrn}, DOB: {dob}) - {len(transmissions)} transmissions")
-    print(f"{len(my)+1}. Back to dashboard")
-    # choose
+def list_my_patients(doctor_username: str, page_size: int = PAGE_SIZE):
+    storage = get_storage()
+    page, sort = 1, "added"
     while True:
-        choice = input("Enter patient number to view details: ").strip()
-        if choice.lower() in ("back", str(len(my)+1)):
+        my, total = storage.doctor_panel(doctor_username, sort, (page - 1) * page_size, page_size)
+        print("\n=== My Patients ===")
+        if not total:
+            print("No patients assigned to you.")
             return None
+        pages = (total + page_size - 1) // page_size
+        if not my:  # the panel shrank under us; show its last page
+            page = pages
+            continue
+        first = (page - 1) * page_size + 1
+        for i, p in enumerate(my, start=first):
+            name = p.get("Name", "Unknown")
+            mrn = p.get("MRN", "Unknown")
+            dob = p.get("DOB", "Unknown")
+            count = p.get("TransmissionCount", 0)
+            print(f"{i}. {name} (MRN: {mrn}, DOB: {dob}) - {count} transmissions")
+        print(f"Page {page} of {pages} - {total} patients, sorted by {sort}")
+        choice = input("Enter patient number to view details, 'n'/'p' to change page, 'g <page>' to jump, "
+                       f"'s <{'|'.join(PANEL_SORTS)}>' to sort, or 'back' to return: ").strip().lower()
+        if choice == "back":
+            return None
+        if choice in ("n", "p"):
+            target = page + 1 if choice == "n" else page - 1
+            if 1 <= target <= pages:
+                page = target
+            else:
+                print("No more pages in that direction.")
+            continue
+        if choice.startswith("g "):
+            target = choice[2:].strip()
+            if target.isdigit() and 1 <= int(target) <= pages:
+                page = int(target)
+            else:
+                print(f"Page must be between 1 and {pages}.")
+            continue
+        if choice.startswith("s "):
+            if choice[2:].strip() in PANEL_SORTS:
+                sort, page = choice[2:].strip(), 1
+            else:
+                print(f"Sort by one of: {', '.join(PANEL_SORTS)}.")
+            continue
         if not choice.isdigit():
-            print("Invalid input. Enter a number.")
+            print("Invalid input. Enter a number, 'n', 'p', 'g <page>', 's <order>' or 'back'.")
             continue
         idx = int(choice)
-        if 1 <= idx <= len(my):
-            show_patient_details(my[idx - 1])
+        if first <= idx < first + len(my):
+            show_patient_details(my[idx - first])
             return None
         else:
             print("Number out of range.")
 
 
-def list_recent_transmissions(doctor_username: str):
-    patients = read_patients()
-    transmissions = []
-    for p in patients:
-        if p.get("AssignedDoctor") != doctor_username:
+def list_recent_transmissions(doctor_username: str, page_size: int = PAGE_SIZE):
+    storage = get_storage()
+    # cursor of the transmission before each page visited; the last one is the current page
+    cursors = [None]
+    while True:
+        # one extra row tells whether there is a next page
+        rows = storage.recent_transmissions(doctor_username, page_size + 1, cursors[-1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        print("\n=== Recent Transmissions ===")
+        if not rows:
+            print("No transmissions found for your patients.")
+            return
+        first = (len(cursors) - 1) * page_size + 1
+        for i, (p, t) in enumerate(rows, start=first):
+            rd = parse_report_date(t.get("reportDate") or "")
+            print(f"{i}. Report ID: {t.get('reportId')} ({rd}) - Patient: {p.get('Name')} (MRN: {p.get('MRN')})")
+        nav = []
+        if len(cursors) > 1:
+            nav.append("'p' previous")
+        if has_next:
+            nav.append("'n' next")
+        print(f"Page {len(cursors)}" + (f" ({', '.join(nav)})" if nav else ""))
+        choice = input("Enter transmission number to view details, 'n'/'p' to change page, or 'back' to return: ").strip().lower()
+        if choice == "back":
+            return
+        if choice == "n":
+            if has_next:
+                cursors.append(rows[-1][1]["cursor"])
+            else:
+                print("Already on the last page.")
+            continue
+        if choice == "p":
+            if len(cursors) > 1:
+                cursors.pop()
+            else:
+                print("Already on the first page.")
             continue
-        for t in p.get("Transmissions", []) or []:
-            # unify fields for display
-            transmissions.append({
+        if not choice.isdigit():
+            print("Invalid input. Enter a number, 'n', 'p' or 'back'.")
+            continue
+        idx = int(choice)
+        if first <= idx < first + len(rows):
+            p, t = rows[idx - first]
+            show_transmission_details({
                 "patient": p.get("Name"),
                 "patient_mrn": p.get("MRN"),
-                "reportId": t.get("reportId") or t.get("transmissionID") or t.get("report_id"),
-                "reportDate": t.get("reportDate") or t.get("report_date") or "",
-                "raw": t
+                "patientID": p.get("patientID"),
+                "reportId": t.get("reportId"),
+                "reportDate": t.get("reportDate")
             })
-    if not transmissions:
-        print("\n=== Recent Transmissions ===")
-        print("No transmissions found for your patients.")
-        return
-    # sort by reportDate if possible (descending)
-    def sort_key(x):
-        s = x.get("reportDate") or ""
-        try:
-            return datetime.strptime(s, "%Y%m%d%H%M%S")
-        except Exception:
-            try:
-                return datetime.strptime(s, "%Y%m%d")
-            except Exception:
-                return datetime.min
-    transmissions.sort(key=sort_key, reverse=True)
-    print("\n=== Recent Transmissions ===")
-    for i, t in enumerate(transmissions, start=1):
-        rd = parse_report_date(t.get("reportDate") or "")
-        print(f"{i}. Report ID: {t.get('reportId')} ({rd}) - Patient: {t.get('patient')} (MRN: {t.get('patient_mrn')})")
-    print(f"{len(transmissions)+1}. Back to dashboard")
+            return
+        else:
+            print("Number out of range.")
+
+
+def list_abnormal_results(doctor_username: str, page_size: int = PAGE_SIZE):
+    alerts = get_alert_index()
+    page = 1
     while True:
-        choice = input("Enter transmission number to view details, or 'back' to return: ").strip()
-        if choice.lower() in ("back", str(len(transmissions)+1)):
+        rows, total = alerts.open_alerts(doctor_username, (page - 1) * page_size, page_size)
+        print("\n=== Abnormal Results ===")
+        if not total:
+            print("No unacknowledged abnormal results for your patients.")
+            return
+        pages = (total + page_size - 1) // page_size
+        if not rows:  # acknowledged past the last page
+            page = pages
+            continue
+        first = (page - 1) * page_size + 1
+        for i, a in enumerate(rows, start=first):
+            rd = parse_report_date(a.get("reportDate") or "")
+            print(f"{i}. {rd} - {a.get('patient')} (MRN: {a.get('MRN')}) - {format_observation(a)}")
+        print(f"Page {page} of {pages} - {total} unacknowledged")
+        choice = input("Enter result number to view its report, 'a <number>' or 'a page' to acknowledge, "
+                       "'n'/'p' to change page, or 'back' to return: ").strip().lower()
+        if choice == "back":
             return
+        if choice in ("n", "p"):
+            target = page + 1 if choice == "n" else page - 1
+            if 1 <= target <= pages:
+                page = target
+            else:
+                print("No more pages in that direction.")
+            continue
+        if choice.startswith("a "):
+            target = choice[2:].strip()
+            if target == "page":
+                selected = rows
+            elif target.isdigit() and first <= int(target) < first + len(rows):
+                selected = [rows[int(target) - first]]
+            else:
+                print("Acknowledge a number on this page or 'page'.")
+                continue
+            count = alerts.acknowledge([a["alert"] for a in selected], doctor_username)
+            print(f"SUCCESS: {count} result(s) acknowledged.")
+            continue
         if not choice.isdigit():
-            print("Invalid input. Enter a number.")
+            print("Invalid input. Enter a number, 'a <number>', 'a page', 'n', 'p' or 'back'.")
             continue
         idx = int(choice)
-        if 1 <= idx <= len(transmissions):
-            show_transmission_details(transmissions[idx - 1])
-            return
+        if first <= idx < first + len(rows):
+            a = rows[idx - first]
+            show_transmission_details({
+                "patient": a.get("patient"),
+                "patient_mrn": a.get("MRN"),
+                "patientID": a.get("patientID"),
+                "reportId": a.get("reportId"),
+                "reportDate": a.get("reportDate")
+            })
         else:
             print("Number out of range.")
 
@@ -131,29 +229,34 @@ def show_patient_details(patient: dict):
     print(f"MRN: {patient.get('MRN')}")
     print(f"Date of Birth: {patient.get('DOB')}")
     print(f"Assigned Doctor: {patient.get('AssignedDoctor')}")
-    transmissions = patient.get("Transmissions", []) or []
+    transmissions = get_storage().transmission_headers(patient.get("patientID"))
     print(f"Total Transmissions: {len(transmissions)}")
     if not transmissions:
         input("Press Enter to return.")
         return
     for i, t in enumerate(transmissions, start=1):
-        rd = parse_report_date(t.get("reportDate") or t.get("report_date") or "")
+        rd = parse_report_date(t.get("reportDate") or "")
         print(f"{i}. Report ID: {t.get('reportId')} ({rd})")
     while True:
-        choice = input("Enter transmission number to view details, or 'back' to return: ").strip()
+        choice = input("Enter transmission number to view details, 't' for observation trends, "
+                       "or 'back' to return: ").strip()
         if choice.lower() == "back":
             return
+        if choice.lower() == "t":
+            show_observation_trends(patient)
+            print(f"\n=== Back to {patient.get('Name')} details ===")
+            continue
         if not choice.isdigit():
-            print("Invalid input. Enter a number or 'back'.")
+            print("Invalid input. Enter a number, 't' or 'back'.")
             continue
         idx = int(choice)
         if 1 <= idx <= len(transmissions):
             show_transmission_details({
                 "patient": patient.get("Name"),
                 "patient_mrn": patient.get("MRN"),
+                "patientID": patient.get("patientID"),
                 "reportId": transmissions[idx - 1].get("reportId"),
-                "reportDate": transmissions[idx - 1].get("reportDate"),
-                "raw": transmissions[idx - 1]
+                "reportDate": transmissions[idx - 1].get("reportDate")
             })
             # after viewing go back to patient details
             print(f"\n=== Back to {patient.get('Name')} details ===")
@@ -162,8 +265,64 @@ def show_patient_details(patient: dict):
             print("Number out of range.")
 
 
+def format_epoch(epoch) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S") if epoch is not None else ""
+
+
+def show_observation_trends(patient: dict):
+    store = get_observation_store()
+    patient_id = patient.get("patientID")
+    series = sorted(store.series(patient_id).items(), key=lambda item: item[1]["code"] or item[0])
+    print(f"\n=== Observation Trends: {patient.get('Name')} ===")
+    if not series:
+        print("No numeric observations recorded.")
+        input("Press Enter to return.")
+        return
+    for i, (key, info) in enumerate(series, start=1):
+        s = store.summary(patient_id, key)
+        print(f"{i}. {info['code']} ({info['unit'] or 'no unit'}) - {s['count']} values, "
+              f"min {s['min']:g}, max {s['max']:g}, mean {s['mean']:.1f}, last on {format_epoch(s['last'])}")
+    while True:
+        choice = input("Enter observation number to view its trend, or 'back' to return: ").strip()
+        if choice.lower() == "back":
+            return
+        if choice.isdigit() and 1 <= int(choice) <= len(series):
+            show_trend(patient_id, *series[int(choice) - 1])
+            continue
+        print("Invalid input. Enter a number or 'back'.")
+
+
+def show_trend(patient_id: str, key: str, info: dict):
+    store = get_observation_store()
+    unit = info["unit"] or ""
+    overall = store.summary(patient_id, key)
+    # The year up to the latest value, in TREND_WINDOWS equal windows
+    end = overall["last"] + 1
+    start = end - 365 * 86400
+    windows = store.windows(patient_id, key, -(-(end - start) // TREND_WINDOWS), start, end)
+    year = store.summary(patient_id, key, start, end)
+    print(f"\n=== {info['code']} trend ({unit or 'no unit'}) ===")
+    print(f"Last 12 months: {year['count']} values, min {year['min']:g}, max {year['max']:g}, mean {year['mean']:.1f}")
+    for w in windows:
+        if not w["count"]:
+            print(f"{format_epoch(w['start'])[:10]}  -")
+            continue
+        # bar scaled between the year's min and max
+        span = (year["max"] - year["min"]) or 1
+        bar = "#" * (1 + round((w["mean"] - year["min"]) / span * 29))
+        print(f"{format_epoch(w['start'])[:10]}  {bar:<30} mean {w['mean']:.1f} (min {w['min']:g}, "
+              f"max {w['max']:g}, n={w['count']})")
+    print(f"Last {TREND_LAST_N} values:")
+    for epoch, value in store.last(patient_id, key, TREND_LAST_N):
+        print(f"  {format_epoch(epoch)}  {value:g} {unit}")
+    input("Press Enter to return.")
+
+
 def show_transmission_details(item: dict):
-    raw = item.get("raw", {})
+    raw = item.get("raw")
+    if raw is None:
+        # Observations are only loaded here, when a report is actually opened
+        raw = get_storage().get_transmission(item.get("patientID"), item.get("reportId")) or {}
     print("\n=== Transmission Details ===")
     print(f"Report ID: {item.get('reportId')}")
     rd = parse_report_date(item.get("reportDate") or raw.get("reportDate") or raw.get("report_date") or "")
@@ -194,13 +353,16 @@ def run_dashboard():
         print("Choose view:")
         print("1. List my patients")
         print("2. List recent transmissions")
-        print("3. Exit")
+        print("3. Unacknowledged abnormal results")
+        print("4. Exit")
         choice = input("Select: ").strip()
         if choice == "1":
             list_my_patients(current_user.username)
         elif choice == "2":
             list_recent_transmissions(current_user.username)
-        elif choice == "3" or choice.lower() in ("exit", "back"):
+        elif choice == "3":
+            list_abnormal_results(current_user.username)
+        elif choice == "4" or choice.lower() in ("exit", "back"):
             return
         else:
-            print("Invalid option. Choose 1, 2 or 3.")
+            print("Invalid option. Choose 1, 2, 3 or 4.")
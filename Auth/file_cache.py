@@ -0,0 +1,111 @@
+# Auth/file_cache.py
+import os
+import json
+import threading
+
+_file_cache = None
+
+
+def copy_json(value):
+    """Copy of parsed JSON (dicts, lists, scalars); several times faster than copy.deepcopy."""
+    if isinstance(value, dict):
+        return {k: copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_json(v) for v in value]
+    return value
+
+
+def nested_items(value):
+    """Indexes of a list's items that are not flat dicts (None if value is not a list)."""
+    if not isinstance(value, list):
+        return None
+    return {i for i, item in enumerate(value)
+            if type(item) is not dict or any(isinstance(v, (dict, list)) for v in item.values())}
+
+
+def copy_items(value, nested):
+    # A list of flat records (users, sessions, patient summaries) only needs each record copied
+    if nested is None:
+        return copy_json(value)
+    if not nested:
+        return [dict(item) for item in value]
+    return [copy_json(item) if i in nested else dict(item) for i, item in enumerate(value)]
+
+
+def load_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_jsonl(path):
+    """Every complete JSON line of a file; torn or corrupt lines are skipped."""
+    entries = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+class FileCache:
+    """
+    Parsed files kept in memory between reads. An entry is reused while the
+    file's (mtime_ns, size, inode) is unchanged and no writer in this process
+    has called invalidate() on it since; a write by another process changes
+    the stat signature, a write here bumps the generation (which also covers
+    rewrites within the same mtime tick).
+
+    Callers always get their own copy, so changing a returned list or record
+    never changes what the next reader sees.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> (signature, generation, parsed value, nested_items(value))
+        self._generations = {}  # path -> writes seen through invalidate()
+        self.hits = {}
+        self.misses = {}
+
+    def _signature(self, path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def load(self, path, loader=load_json):
+        """loader(path)'s result for the file as it is now, from memory if it has not changed."""
+        name = os.path.basename(path)
+        signature = self._signature(path)
+        with self._lock:
+            generation = self._generations.get(path, 0)
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature and entry[1] == generation:
+                self.hits[name] = self.hits.get(name, 0) + 1
+                return copy_items(entry[2], entry[3])
+            self.misses[name] = self.misses.get(name, 0) + 1
+        value = loader(path)
+        nested = nested_items(value)
+        with self._lock:
+            # Keep it only if nothing was written while we parsed
+            if self._generations.get(path, 0) == generation and self._signature(path) == signature:
+                self._entries[path] = (signature, generation, value, nested)
+        return copy_items(value, nested)
+
+    def invalidate(self, path):
+        """Call after writing path."""
+        with self._lock:
+            self._generations[path] = self._generations.get(path, 0) + 1
+            self._entries.pop(path, None)
+
+    def stats(self):
+        """{file name: {"hits", "misses"}}"""
+        with self._lock:
+            return {name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)}
+                    for name in sorted(set(self.hits) | set(self.misses))}
+
+
+def get_file_cache():
+    global _file_cache
+    if _file_cache is None:
+        _file_cache = FileCache()
+    return _file_cache
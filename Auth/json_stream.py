@@ -0,0 +1,156 @@
+# Auth/json_stream.py
+import os
+import re
+import json
+import mmap
+
+# Bytes that open or close a nested value, or start a string
+_TOKEN = re.compile(rb'[\[\]{}"]')
+# Unrolled loops: every alternative starts with a different byte and the
+# filler between them excludes those bytes, so a failed match never backtracks
+_OTHER = rb'[^{}\[\]"]*'
+_STRING_RE = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+# An object with no nested objects or non-empty arrays (an observation)
+_FLAT_RE = rb'\{' + _OTHER + rb'(?:(?:' + _STRING_RE + rb'|\[\s*\])' + _OTHER + rb')*\}'
+# An array or object nesting at most flat objects (a report and its observations)
+_FLAT_ARRAY_RE = rb'\[' + _OTHER + rb'(?:(?:' + _STRING_RE + rb'|' + _FLAT_RE + rb')' + _OTHER + rb')*\]'
+_SHALLOW_RE = rb'\{' + _OTHER + rb'(?:(?:' + _STRING_RE + rb'|' + _FLAT_RE + rb'|' + _FLAT_ARRAY_RE + rb')' + _OTHER + rb')*\}'
+_STRING = re.compile(_STRING_RE)
+_FLAT_OBJECT = re.compile(_FLAT_RE)
+_SHALLOW_OBJECT = re.compile(_SHALLOW_RE)
+_SCALAR = re.compile(rb'[^,\]}\s]+')
+_SPACE = re.compile(rb'\s*')
+_COLON = re.compile(rb'\s*:\s*')
+
+
+def _string_end(buf, pos):
+    match = _STRING.match(buf, pos)
+    if match is None:
+        raise ValueError(f"invalid JSON string at byte {pos}")
+    return match.end()
+
+
+def _skip_value(buf, pos):
+    """
+    (end offset, item count) of the JSON value at pos, found without parsing
+    it. The count is the number of objects/arrays in an array value (None for
+    other values).
+    """
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        return _string_end(buf, pos), None
+    if first == b"{":
+        shallow = _SHALLOW_OBJECT.match(buf, pos)
+        if shallow:
+            return shallow.end(), None
+    elif first != b"[":
+        scalar = _SCALAR.match(buf, pos)
+        if scalar is None:
+            raise ValueError(f"invalid JSON value at byte {pos}")
+        return scalar.end(), None
+    depth, items = 0, 0
+    while True:
+        token = _TOKEN.search(buf, pos)
+        if token is None:
+            raise ValueError(f"unterminated JSON value at byte {pos}")
+        ch, start, pos = token.group(), token.start(), token.end()
+        if ch == b'"':
+            pos = _string_end(buf, start)
+        elif ch == b"{" or ch == b"[":
+            if depth == 1:
+                items += 1
+            shallow = _SHALLOW_OBJECT.match(buf, start) if ch == b"{" else None
+            if shallow:  # a whole report with its observations in one step
+                pos = shallow.end()
+            else:
+                depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos, items if first == b"[" else None
+
+
+def _read_object(buf, pos, skip_key, keep):
+    """(object, skipped member's item count, end offset) for the object at pos; skip_key is (name, JSON bytes)."""
+    flat = _FLAT_OBJECT.match(buf, pos)
+    if flat:  # nothing nested, so a skipped member can only be empty
+        obj, count = json.loads(buf[pos:flat.end()]), None
+        if skip_key is not None and skip_key[0] in obj:
+            del obj[skip_key[0]]
+            count = 0
+        return obj, count, flat.end()
+    if skip_key is None:
+        end, _ = _skip_value(buf, pos)
+        return json.loads(buf[pos:end]), None, end
+    members, skipped, count = [], None, None
+    pos += 1
+    while True:
+        pos = _SPACE.match(buf, pos).end()
+        ch = buf[pos:pos + 1]
+        if ch == b"}":
+            pos += 1
+            break
+        if ch == b",":
+            pos += 1
+            continue
+        key_end = _string_end(buf, pos)
+        colon = _COLON.match(buf, key_end)
+        if colon is None:
+            raise ValueError(f"expected ':' at byte {key_end}")
+        value_end, items = _skip_value(buf, colon.end())
+        if buf[pos:key_end] == skip_key[1]:
+            skipped, count = (colon.end(), value_end), items or 0
+        else:
+            members.append(buf[pos:value_end])
+        pos = value_end
+    obj = json.loads(b"{" + b",".join(members) + b"}")
+    if skipped and keep is not None and keep(obj):
+        obj[skip_key[0]] = json.loads(buf[skipped[0]:skipped[1]])
+    return obj, count, pos
+
+
+def file_contains(path, needle):
+    """Whether the file's bytes contain needle (a bytes search over a memory map, without reading it in)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return buf.find(needle) != -1
+
+
+def iter_objects(path, skip_key=None, keep=None):
+    """
+    Yield (object, count) for each object of the top-level JSON array in path,
+    one at a time, from a memory map of the file: memory use is one object,
+    not the file.
+
+    With skip_key, that member's value is stepped over by the tokenizer
+    instead of parsed and left out of the object; count is the number of
+    items in it (None if the object has no such member). keep(object) can ask
+    for the member to be parsed after all, for the objects that need it.
+    """
+    if skip_key is not None:
+        skip_key = (skip_key, json.dumps(skip_key).encode())
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        pos = _SPACE.match(buf, 0).end()
+        if buf[pos:pos + 1] != b"[":
+            raise ValueError(f"{path} does not hold a JSON array")
+        pos += 1
+        while True:
+            pos = _SPACE.match(buf, pos).end()
+            ch = buf[pos:pos + 1]
+            if ch == b"]":
+                return
+            if ch == b",":
+                pos += 1
+                continue
+            if ch != b"{":
+                raise ValueError(f"expected an object at byte {pos}")
+            obj, count, pos = _read_object(buf, pos, skip_key, keep)
+            yield obj, count
+    finally:
+        buf.close()
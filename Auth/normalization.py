@@ -0,0 +1,62 @@
+# Auth/normalization.py
+import re
+from datetime import datetime
+
+DIGITS_RE = re.compile(r"\d+")
+NON_LETTER_RE = re.compile(r"[^a-zA-Z\s]")
+DOB_FORMATS = ["%Y%m%d", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y"]
+# HL7 TS (YYYYMMDD[HHMM[SS]], any fraction/offset ignored) or ISO-style YYYY-MM-DD[ HH:MM[:SS]]
+REPORT_DATE_RE = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})(?:[ T]?(\d{2}):?(\d{2})(?::?(\d{2}))?)?")
+
+
+def normalize_mrn(mrn: str) -> str:
+    """Extract digits only from MRN, MRN-0022-445 -> 0022445"""
+    if not mrn:
+        return ""
+    return "".join(DIGITS_RE.findall(mrn))
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, remove non-letter symbols, compress spaces, split by '^' if exists"""
+    if not name:
+        return ""
+    # Replace HL7 separator '^' with space
+    name = name.replace("^", " ")
+    cleaned = NON_LETTER_RE.sub("", name).strip().lower()
+    return " ".join(cleaned.split())
+
+
+def normalize_dob(dob: str) -> str:
+    """Normalize DOB into YYYY-MM-DD"""
+    if not dob:
+        return ""
+    dob = dob.strip()
+    # Try multiple formats
+    for fmt in DOB_FORMATS:
+        try:
+            return datetime.strptime(dob, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return dob  # fallback
+
+
+def with_normalized(record: dict) -> dict:
+    """Fill in the stored normalized identity fields of a patient record if missing."""
+    if record.get("NormalizedMRN") is None:
+        record["NormalizedMRN"] = normalize_mrn(record.get("MRN"))
+    if record.get("NormalizedName") is None:
+        record["NormalizedName"] = normalize_name(record.get("Name"))
+    if record.get("NormalizedDOB") is None:
+        record["NormalizedDOB"] = normalize_dob(record.get("DOB"))
+    return record
+
+
+def report_timestamp(report_date: str) -> int:
+    """Sortable YYYYMMDDHHMMSS integer for a report date, 20240116120000; 0 if unparseable"""
+    match = REPORT_DATE_RE.match((report_date or "").strip())
+    if not match:
+        return 0
+    year, month, day, hour, minute, second = (int(g or 0) for g in match.groups())
+    if not (1 <= month <= 12 and 1 <= day <= 31 and hour < 24 and minute < 60 and second < 60):
+        return 0
+    return ((((year * 100 + month) * 100 + day) * 100 + hour) * 100 + minute) * 100 + second
@@ -0,0 +1,259 @@
+# Auth/observations.py
+import os
+import re
+import json
+import shutil
+import calendar
+from array import array
+from bisect import bisect_left
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from .db_utils import OBSERVATIONS_DIR, get_storage
+from .normalization import report_timestamp
+from .atomic_io import file_lock
+
+# Report codes that name the same measurement (PDF field code -> HL7 code)
+CODE_ALIASES = {"hr": "heart_rate", "rhy": "rhythm"}
+# Leading comparators on numeric results, e.g. "<5" or ">=100"
+NUMERIC_RE = re.compile(r"^\s*[<>=]*\s*([-+]?\d+(?:\.\d+)?)\s*$")
+
+_observation_store = None
+
+
+def series_key(code):
+    """File-safe key shared by every spelling of an observation code, 'Heart Rate' -> heart_rate"""
+    key = re.sub(r"[^a-z0-9]+", "_", (code or "").lower()).strip("_")
+    return CODE_ALIASES.get(key, key)
+
+
+def numeric_value(value):
+    match = NUMERIC_RE.match(str(value or ""))
+    return float(match.group(1)) if match else None
+
+
+def report_epoch(report_date):
+    """Report date as UTC epoch seconds, or None if it cannot be parsed."""
+    ts = report_timestamp(report_date)
+    if not ts:
+        return None
+    ts, second = divmod(ts, 100)
+    ts, minute = divmod(ts, 100)
+    ts, hour = divmod(ts, 100)
+    ts, day = divmod(ts, 100)
+    year, month = divmod(ts, 100)
+    return calendar.timegm((year, month, day, hour, minute, second))
+
+
+class ObservationStore:
+    """
+    Numeric observations as per-patient, per-code time series:
+    DB/observations/<patientID>/<key>.ts (int64 epoch seconds) and <key>.val
+    (float64), both in time order, plus series.json with each series' code and
+    unit. Columns are appended as stored reports arrive and memory-mapped with
+    NumPy for queries (plain arrays when NumPy is not installed).
+
+    A patient's directory is created from their stored transmissions the first
+    time it is needed, so history from before the store existed is included.
+    """
+
+    TS_TYPE, VALUE_TYPE = "q", "d"  # int64, float64
+
+    def __init__(self, base_dir=OBSERVATIONS_DIR):
+        self.base_dir = base_dir
+        # Column appends from several ingesting processes must not interleave
+        self._lock = file_lock(base_dir + ".lock")
+
+    # LAYOUT
+
+    def _patient_dir(self, patient_id):
+        return os.path.join(self.base_dir, patient_id)
+
+    def _meta_path(self, patient_id):
+        return os.path.join(self._patient_dir(patient_id), "series.json")
+
+    def _column_path(self, patient_id, key, column):
+        return os.path.join(self._patient_dir(patient_id), f"{key}.{column}")
+
+    def _read_meta(self, patient_id):
+        try:
+            with open(self._meta_path(patient_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, patient_id, meta):
+        tmp_path = self._meta_path(patient_id) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=4)
+        os.replace(tmp_path, self._meta_path(patient_id))
+
+    # WRITES
+
+    def _points(self, reports, meta):
+        """{key: [(epoch, value), ...]} of the numeric observations in reports; fills in meta."""
+        points = {}
+        for report in reports:
+            epoch = report_epoch(report.get("reportDate") or report.get("report_date"))
+            if epoch is None:
+                continue
+            for obs in report.get("observations") or []:
+                value = numeric_value(obs.get("value"))
+                key = series_key(obs.get("code") or obs.get("observation"))
+                if value is None or not key:
+                    continue
+                points.setdefault(key, []).append((epoch, value))
+                meta["series"].setdefault(key, {"code": obs.get("code"),
+                                                "unit": (obs.get("unit") or "").split("^")[0] or None})
+        return points
+
+    def _trim_columns(self, ts_path, val_path):
+        """Cut both columns to the points written to both; a crash mid-append can leave one longer."""
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0 for path in (ts_path, val_path)]
+        n = min(sizes) // 8
+        for path, size in zip((ts_path, val_path), sizes):
+            if size != n * 8:
+                with open(path, "r+b") as f:
+                    f.truncate(n * 8)
+
+    def _append_series(self, patient_id, key, points):
+        points.sort()
+        ts_path = self._column_path(patient_id, key, "ts")
+        val_path = self._column_path(patient_id, key, "val")
+        # Appending after an unequal pair would pair new values with old timestamps
+        self._trim_columns(ts_path, val_path)
+        ts, values = self._read_columns(patient_id, key)
+        if len(ts) and points[0][0] < ts[-1]:
+            # Out-of-order report (e.g. a late backfill): merge and rewrite both columns
+            merged = sorted(list(zip(ts, values)) + points, key=lambda p: p[0])
+            for path, column, kind in ((ts_path, 0, self.TS_TYPE), (val_path, 1, self.VALUE_TYPE)):
+                with open(path + ".tmp", "wb") as f:
+                    array(kind, [p[column] for p in merged]).tofile(f)
+                os.replace(path + ".tmp", path)
+            return
+        # Timestamps first: readers use the shorter of the two columns
+        for path, column, kind in ((ts_path, 0, self.TS_TYPE), (val_path, 1, self.VALUE_TYPE)):
+            with open(path, "ab") as f:
+                array(kind, [p[column] for p in points]).tofile(f)
+
+    def _build_patient(self, patient_id):
+        """Create a patient's series from every transmission already in storage."""
+        shutil.rmtree(self._patient_dir(patient_id), ignore_errors=True)
+        os.makedirs(self._patient_dir(patient_id))
+        meta = {"series": {}}
+        for key, points in self._points(get_storage().transmissions_for_patient(patient_id), meta).items():
+            self._append_series(patient_id, key, points)
+        self._write_meta(patient_id, meta)
+        return meta
+
+    def _ensure_patient(self, patient_id):
+        meta = self._read_meta(patient_id)
+        if meta is None:
+            with self._lock:
+                meta = self._read_meta(patient_id) or self._build_patient(patient_id)
+        return meta
+
+    def add_reports(self, items):
+        """Index the observations of newly stored (patient_id, report) pairs."""
+        by_patient = {}
+        for patient_id, report in items:
+            by_patient.setdefault(patient_id, []).append(report)
+        with self._lock:
+            for patient_id, reports in by_patient.items():
+                meta = self._read_meta(patient_id)
+                if meta is None:
+                    self._build_patient(patient_id)  # already includes these reports
+                    continue
+                known = set(meta["series"])
+                for key, points in self._points(reports, meta).items():
+                    self._append_series(patient_id, key, points)
+                if set(meta["series"]) != known:
+                    self._write_meta(patient_id, meta)
+
+    def rebuild(self, patient_id):
+        """Drop and rebuild one patient's series from storage."""
+        with self._lock:
+            return self._build_patient(patient_id)
+
+    # READS
+
+    def _read_columns(self, patient_id, key):
+        """(timestamps, values) of one series, memory-mapped; same length, oldest first."""
+        ts_path = self._column_path(patient_id, key, "ts")
+        val_path = self._column_path(patient_id, key, "val")
+        try:
+            n = min(os.path.getsize(ts_path) // 8, os.path.getsize(val_path) // 8)
+        except OSError:
+            n = 0
+        if np is not None:
+            if not n:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+            return (np.memmap(ts_path, dtype=np.int64, mode="r", shape=(n,)),
+                    np.memmap(val_path, dtype=np.float64, mode="r", shape=(n,)))
+        ts, values = array(self.TS_TYPE), array(self.VALUE_TYPE)
+        if n:
+            with open(ts_path, "rb") as f:
+                ts.fromfile(f, n)
+            with open(val_path, "rb") as f:
+                values.fromfile(f, n)
+        return ts, values
+
+    def _range(self, ts, start, end):
+        """Index bounds of start <= timestamp < end."""
+        if np is not None:
+            lo = int(np.searchsorted(ts, start, "left")) if start is not None else 0
+            hi = int(np.searchsorted(ts, end, "left")) if end is not None else len(ts)
+        else:
+            lo = bisect_left(ts, start) if start is not None else 0
+            hi = bisect_left(ts, end) if end is not None else len(ts)
+        return lo, hi
+
+    def _stats(self, ts, values):
+        if not len(values):
+            return {"count": 0, "min": None, "max": None, "mean": None, "first": None, "last": None}
+        if np is not None:
+            low, high, mean = float(values.min()), float(values.max()), float(values.mean())
+        else:
+            low, high, mean = min(values), max(values), sum(values) / len(values)
+        return {"count": len(values), "min": low, "max": high, "mean": mean,
+                "first": int(ts[0]), "last": int(ts[-1])}
+
+    def series(self, patient_id):
+        """{key: {"code", "unit", "count"}} for every numeric series the patient has."""
+        meta = self._ensure_patient(patient_id)
+        result = {}
+        for key, info in meta["series"].items():
+            ts, _ = self._read_columns(patient_id, key)
+            result[key] = dict(info, count=len(ts))
+        return result
+
+    def summary(self, patient_id, key, start=None, end=None):
+        """count/min/max/mean and first/last timestamp of values with start <= time < end."""
+        self._ensure_patient(patient_id)
+        ts, values = self._read_columns(patient_id, key)
+        lo, hi = self._range(ts, start, end)
+        return self._stats(ts[lo:hi], values[lo:hi])
+
+    def windows(self, patient_id, key, seconds, start, end):
+        """Summary of each consecutive seconds-long window from start up to end, oldest first."""
+        self._ensure_patient(patient_id)
+        ts, values = self._read_columns(patient_id, key)
+        result = []
+        for window_start in range(int(start), int(end), int(seconds)):
+            lo, hi = self._range(ts, window_start, min(window_start + seconds, end))
+            result.append(dict(self._stats(ts[lo:hi], values[lo:hi]), start=window_start))
+        return result
+
+    def last(self, patient_id, key, n):
+        """The n most recent (timestamp, value) pairs, newest first."""
+        self._ensure_patient(patient_id)
+        ts, values = self._read_columns(patient_id, key)
+        return [(int(t), float(v)) for t, v in zip(ts[-n:][::-1], values[-n:][::-1])] if n > 0 else []
+
+
+def get_observation_store():
+    global _observation_store
+    if _observation_store is None:
+        _observation_store = ObservationStore()
+    return _observation_store
@@ -3,19 +3,66 @@ import os
 import re
 import uuid
 import json
-from rapidfuzz import fuzz
+import weakref
+from rapidfuzz import fuzz, process
 from datetime import datetime
+try:
+    import numpy as np
+except ImportError:
+    np = None
 from .user_management import get_current_user
-from .db_utils import read_patients, write_patients
+from .db_utils import write_patients, get_storage
+from .blocking import CandidateIndex
+from .observations import get_observation_store
+from .alerts import get_alert_index
+from .search_index import get_search_index
+from .normalization import normalize_mrn, normalize_name, normalize_dob
+
+# Long-lived in-memory registries (e.g. the ingestion pipeline's matcher) that
+# create_patient() adds new patients to, so they can be matched without a reload
+_tracked_managers = weakref.WeakSet()
+
+
+def track_new_patients(manager):
+    _tracked_managers.add(manager)
+
 
 class Patient:
-    def __init__(self, MRN, Name, DOB, AssignedDoctor, patientID=None, Transmissions=None):
-        self.patientID = patientID if patientID else str(uuid.uuid4())
+    # Slots keep a registry of many loaded patients compact in memory
+    __slots__ = ("patientID", "MRN", "Name", "DOB", "AssignedDoctor", "TransmissionCount",
+                 "NormalizedMRN", "NormalizedName", "NormalizedDOB", "_transmissions")
+
+    def __init__(self, MRN, Name, DOB, AssignedDoctor, patientID=None, Transmissions=None,
+                 TransmissionCount=None, NormalizedMRN=None, NormalizedName=None, NormalizedDOB=None):
         self.MRN = MRN
         self.Name = Name
         self.DOB = DOB
         self.AssignedDoctor = AssignedDoctor
-        self.Transmissions = Transmissions if Transmissions else []
+        # Identity columns the matchers compare against; stored with the record,
+        # computed here only for records written before they existed
+        self.NormalizedMRN = NormalizedMRN if NormalizedMRN is not None else normalize_mrn(MRN)
+        self.NormalizedName = NormalizedName if NormalizedName is not None else normalize_name(Name)
+        self.NormalizedDOB = NormalizedDOB if NormalizedDOB is not None else normalize_dob(DOB)
+        # Stored patients come from storage as summaries; their transmissions load on first access
+        if patientID and Transmissions is None:
+            self._transmissions = None
+        else:
+            self._transmissions = Transmissions if Transmissions else []
+        self.patientID = patientID if patientID else str(uuid.uuid4())
+        if TransmissionCount is None:
+            TransmissionCount = len(self._transmissions or [])
+        self.TransmissionCount = TransmissionCount
+
+    @property
+    def Transmissions(self):
+        if self._transmissions is None:
+            self._transmissions = get_storage().transmissions_for_patient(self.patientID)
+        return self._transmissions
+
+    def summary(self):
+        """Demographics only; does not load transmissions."""
+        return {"patientID": self.patientID, "MRN": self.MRN, "Name": self.Name, "DOB": self.DOB,
+                "AssignedDoctor": self.AssignedDoctor}
 
     def to_dict(self):
         return {
@@ -24,11 +71,16 @@ class Patient:
             "Name": self.Name,
             "DOB": self.DOB,
             "AssignedDoctor": self.AssignedDoctor,
+            "NormalizedMRN": self.NormalizedMRN,
+            "NormalizedName": self.NormalizedName,
+            "NormalizedDOB": self.NormalizedDOB,
             "Transmissions": self.Transmissions
         }
 
     def add_transmission(self, report_json: dict):
-        self.Transmissions.append(report_json)
+        if self._transmissions is not None:
+            self._transmissions.append(report_json)
+        self.TransmissionCount += 1
 
 
 def validate_mrn(mrn):
@@ -36,11 +88,9 @@ def validate_mrn(mrn):
         print("ERROR: MRN cannot be empty.")
         return False
     pattern = r"^MRN\d{7}$"
-    patients = read_patients()
-    for patient in patients:
-        if patient["MRN"] == mrn:
-            print("ERROR: MRN already exists. Please use a different MRN.")
-            return False
+    if get_storage().find_patient_by_mrn(mrn):
+        print("ERROR: MRN already exists. Please use a different MRN.")
+        return False
     if not re.match(pattern, mrn):
         print("ERROR: MRN format invalid. Expected MRN followed by 7 digits (e.g., MRN1234567).")
         return False
@@ -82,9 +132,10 @@ def create_patient():
         return
 
     patient_record = Patient(mrn, name, dob, current_user.username)
-    patients = read_patients()
-    patients.append(patient_record.to_dict())
-    if write_patients(patients):
+    if get_storage().insert_patient(patient_record.to_dict()):
+        get_search_index().add_patient(patient_record.summary())
+        for manager in list(_tracked_managers):
+            manager.index_patient(patient_record)
         print(f"SUCCESS: Patient '{name}' created successfully with PatientID {patient_record.patientID}.")
 
 #PATIENT SEARCH#
@@ -96,27 +147,8 @@ def search_patients_for_doctor(query, doctor_username):
         print("ERROR: Search query cannot be empty.")
         return []
 
-    manager = PatientManager()
-    results = []
-
-    # Filter patients assigned to this doctor
-    assigned_patients = [p for p in manager.patients if p.AssignedDoctor.lower() == doctor_username.lower()]
-
-    # MRN search 
-    for p in assigned_patients:
-        if query in p.MRN.lower():
-            results.append(p)
-
-    # If MRN found, return immediately
-    if results:
-        return results
-
-    # Name search (partial, case-insensitive)
-    for p in assigned_patients:
-        if query in p.Name.lower():
-            results.append(p)
-
-    return results
+    # MRN search if the query has digits, name search otherwise; ranked, typo tolerant
+    return [Patient(**p) for p in get_search_index().search(doctor_username, query)]
 
 
 def display_patient_details(p):
@@ -125,7 +157,7 @@ def display_patient_details(p):
     print(f"MRN: {p.MRN}")
     print(f"DOB: {p.DOB}")
     print(f"Assigned Doctor: {p.AssignedDoctor}")
-    print(f"Total Transmissions: {len(p.Transmissions)}")
+    print(f"Total Transmissions: {p.TransmissionCount}")
 
 
 def search_patient():
@@ -157,7 +189,7 @@ def search_patient():
     print("\n=== Search Results ===")
     print(f"Found {len(matches)} patients:")
     for i, p in enumerate(matches, start=1):
-        print(f"{i}. {p.Name} (MRN: {p.MRN}, DOB: {p.DOB}) - {len(p.Transmissions)} transmissions")
+        print(f"{i}. {p.Name} (MRN: {p.MRN}, DOB: {p.DOB}) - {p.TransmissionCount} transmissions")
 
     while True:
         choice = input("Enter patient number to view details, or 'back' to return: ").strip()
@@ -170,96 +202,146 @@ def search_patient():
 
 
 class PatientManager:
-    def __init__(self):
-        self.patients = [Patient(**p) for p in read_patients()]
+    # Fuzzy-match blocking (see Auth/blocking.py): fewer keys or more shared MRN
+    # digit trigrams means fewer candidates scored, at the cost of recall
+    BLOCKING_KEYS = ("dob", "mrn", "name")
+    BLOCKING_MIN_SHARED_GRAMS = 2
+
+    def __init__(self, patients=None, blocking_keys=None, min_shared_grams=None):
+        if patients is None:
+            patients = [Patient(**p) for p in get_storage().list_patients()]
+        self.patients = patients
+        # Exact-match indexes, kept in step with self.patients by add_patient()
+        self.mrn_index = {}        # normalized MRN -> Patient
+        self.name_dob_index = {}   # (normalized name, normalized DOB) -> Patient
+        for p in self.patients:
+            self._index_patient(p)
+        self.candidate_index = CandidateIndex(
+            self,
+            keys=blocking_keys or self.BLOCKING_KEYS,
+            min_shared_grams=min_shared_grams or self.BLOCKING_MIN_SHARED_GRAMS
+        )
+
+    def _index_patient(self, p):
+        # setdefault keeps the first patient for a key, same as the old linear scan
+        if p.NormalizedMRN:
+            self.mrn_index.setdefault(p.NormalizedMRN, p)
+        if p.NormalizedName and p.NormalizedDOB:
+            self.name_dob_index.setdefault((p.NormalizedName, p.NormalizedDOB), p)
+
+    def add_patient(self, patient):
+        """Persist a new patient and add it to the in-memory indexes."""
+        if not get_storage().insert_patient(patient.to_dict()):
+            return False
+        get_search_index().add_patient(patient.summary())
+        self.index_patient(patient)
+        return True
+
+    def index_patient(self, patient):
+        """Add an already stored patient to the in-memory registry and indexes."""
+        self.patients.append(patient)
+        self._index_patient(patient)
+        self.candidate_index.add(patient)
 
     def save_patients(self):
-        return write_patients([p.to_dict() for p in self.patients])
-
-    # NORMALIZATION HELPERS
-
-    def normalize_mrn(self, mrn: str) -> str:
-        """Extract digits only from MRN, MRN-0022-445 -> 0022445"""
-        if not mrn:
-            return ""
-        return "".join(re.findall(r"\d+", mrn))
-
-    def normalize_name(self, name: str) -> str:
-        """Lowercase, remove non-letter symbols, compress spaces, split by '^' if exists"""
-        if not name:
-            return ""
-        # Replace HL7 separator '^' with space
-        name = name.replace("^", " ")
-        cleaned = re.sub(r"[^a-zA-Z\s]", "", name).strip().lower()
-        return " ".join(cleaned.split())
-
-    def normalize_dob(self, dob: str) -> str:
-        """Normalize DOB into YYYY-MM-DD"""
-        if not dob:
-            return ""
-        dob = dob.strip()
-        # Try multiple formats
-        formats = ["%Y%m%d", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y"]
-        for fmt in formats:
-            try:
-                return datetime.strptime(dob, fmt).strftime("%Y-%m-%d")
-            except ValueError:
-                pass
-        return dob  # fallback
+        if not write_patients([p.to_dict() for p in self.patients]):
+            return False
+        get_search_index().rebuild()
+        return True
+
+    def add_transmission(self, patient, report_json: dict):
+        """Attach a report to a patient and persist just that transmission."""
+        if not get_storage().add_transmission(patient.patientID, report_json):
+            return False
+        patient.add_transmission(report_json)
+        get_observation_store().add_reports([(patient.patientID, report_json)])
+        stored = [(patient.summary(), report_json)]
+        get_alert_index().add_reports(stored)
+        get_search_index().add_reports(stored)
+        return True
+
+    def add_transmissions(self, matches):
+        """Persist many (patient, report) pairs in one batched storage write."""
+        if not matches:
+            return True
+        if not get_storage().add_transmissions([(p.patientID, r) for p, r in matches]):
+            return False
+        for patient, report_json in matches:
+            patient.add_transmission(report_json)
+        get_observation_store().add_reports([(p.patientID, r) for p, r in matches])
+        stored = [(p.summary(), r) for p, r in matches]
+        get_alert_index().add_reports(stored)
+        get_search_index().add_reports(stored)
+        return True
+
+    # NORMALIZATION HELPERS (see Auth/normalization.py)
+
+    normalize_mrn = staticmethod(normalize_mrn)
+    normalize_name = staticmethod(normalize_name)
+    normalize_dob = staticmethod(normalize_dob)
 
     # MATCHING LOGIC
 
-    def match_patient(self, mrn: str, name: str, dob: str):
+    def match_patient(self, mrn: str, name: str, dob: str, messages=None):
         """
-        Match a patient using normalized MRN, name, and DOB.
+        Match a patient using normalized MRN, name, and DOB. The match found is
+        printed, or appended to messages (a list) for the caller to print.
         """
+        say = print if messages is None else messages.append
         target_mrn = self.normalize_mrn(mrn)
         target_name = self.normalize_name(name)
         target_dob = self.normalize_dob(dob)
 
         # -------- Primary: MRN match -------- #
         if target_mrn:
-            for p in self.patients:
-                p_mrn = self.normalize_mrn(p.MRN)
-                if p_mrn == target_mrn:
-                    print("\n")
-                    print(f"Primary MRN match found: {p.Name} ({p.MRN})")
-                    print("Match Confidence : 100%")
-                    return p  # exact MRN match
+            p = self.mrn_index.get(target_mrn)
+            if p:
+                say("\n")
+                say(f"Primary MRN match found: {p.Name} ({p.MRN})")
+                say("Match Confidence : 100%")
+                return p  # exact MRN match
 
         # -------- Secondary: Name + DOB match -------- #
         target_name_and_dob = target_name and target_dob
         if target_name_and_dob:
-            for p in self.patients:
-                p_name = self.normalize_name(p.Name)
-                p_dob = self.normalize_dob(p.DOB)
-                if p_name == target_name and p_dob == target_dob:
-                    print(f"Secondary Name+DOB match found: {p.Name} ({p.MRN})")
-                    print("Match Confidence : 80%")
-                    return p  # exact name + DOB match
+            p = self.name_dob_index.get((target_name, target_dob))
+            if p:
+                say(f"Secondary Name+DOB match found: {p.Name} ({p.MRN})")
+                say("Match Confidence : 80%")
+                return p  # exact name + DOB match
 
         return None
 
     # FUZZY MATCHING
     from rapidfuzz import fuzz
 
-    def fuzzy_match_patient(self, report_identifiers, threshold=80):
+    def fuzzy_match_patient(self, report_identifiers, threshold=80, exhaustive=False):
+        """
+        Weighted fuzzy match. Only candidates from the blocking index are scored
+        unless exhaustive=True, which scores every patient in the registry.
+        """
         report_mrn = report_identifiers.get("mrn", "").strip().lower()
         report_name = report_identifiers.get("name", "").strip().lower()
         report_dob = report_identifiers.get("dateOfBirth", "").strip()
+        target_dob = self.normalize_dob(report_dob)
 
         best_match = None
         best_score = 0
         details = {}
 
-        for p in self.patients:
+        if exhaustive:
+            candidates = self.patients
+        else:
+            candidates = self.candidate_index.candidates(report_mrn, report_name, report_dob)
+
+        for p in candidates:
             # Only calculate for assigned patients if you want
             # For general match: remove doctor filter
             # p.AssignedDoctor == current_doctor.username
 
             mrn_score = fuzz.ratio(report_mrn, p.MRN.lower())
             name_score = fuzz.ratio(report_name, p.Name.lower())
-            dob_score = 100 if self.normalize_dob(report_dob) == self.normalize_dob(p.DOB) else 0
+            dob_score = 100 if target_dob == p.NormalizedDOB else 0
 
             # Weighted scoring: MRN=100%, Name=80%, DOB=60%
             combined_score = (mrn_score * 1.0 + name_score * 0.8 + dob_score * 0.6) / 2.4  # normalize to 0-100
@@ -276,3 +358,55 @@ class PatientManager:
         if best_score >= threshold:
             return best_match, round(best_score), details
         return None, round(best_score), details
+
+    # Largest report x patient score matrix computed at once by fuzzy_match_batch
+    BATCH_MATRIX_CELLS = 20_000_000
+
+    def fuzzy_match_batch(self, reports_identifiers, threshold=80):
+        """
+        Exhaustive fuzzy match of many reports at once. MRN and name similarity
+        matrices come from rapidfuzz.process.cdist on all cores, then the same
+        weighting as fuzzy_match_patient(exhaustive=True) is applied with NumPy.
+        Returns one (patient, score, details) tuple per report, identical to the
+        single-report path.
+        """
+        if np is None or not self.patients:
+            return [self.fuzzy_match_patient(r, threshold, exhaustive=True) for r in reports_identifiers]
+
+        p_mrns = [p.MRN.lower() for p in self.patients]
+        p_names = [p.Name.lower() for p in self.patients]
+        # Compare DOBs as integer codes instead of strings
+        dob_codes = {}
+        p_dobs = np.array([dob_codes.setdefault(p.NormalizedDOB, len(dob_codes)) for p in self.patients])
+
+        results = []
+        chunk = max(1, self.BATCH_MATRIX_CELLS // len(self.patients))
+        for start in range(0, len(reports_identifiers), chunk):
+            batch = reports_identifiers[start:start + chunk]
+            report_mrns = [r.get("mrn", "").strip().lower() for r in batch]
+            report_names = [r.get("name", "").strip().lower() for r in batch]
+            report_dobs = np.array([dob_codes.get(self.normalize_dob(r.get("dateOfBirth", "").strip()), -1)
+                                    for r in batch])
+
+            mrn_scores = process.cdist(report_mrns, p_mrns, scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+            name_scores = process.cdist(report_names, p_names, scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+            dob_scores = np.where(report_dobs[:, None] == p_dobs[None, :], 100.0, 0.0)
+
+            # Weighted scoring: MRN=100%, Name=80%, DOB=60%
+            combined = (mrn_scores * 1.0 + name_scores * 0.8 + dob_scores * 0.6) / 2.4
+            # argmax returns the first maximum, the same patient the sequential scan keeps
+            best = combined.argmax(axis=1)
+
+            for row, col in enumerate(best):
+                best_score = float(combined[row, col])
+                if best_score <= 0:
+                    results.append((None, 0, {}))
+                    continue
+                details = {
+                    "mrn_score": float(mrn_scores[row, col]),
+                    "name_score": float(name_scores[row, col]),
+                    "dob_score": int(dob_scores[row, col])
+                }
+                match = self.patients[col] if best_score >= threshold else None
+                results.append((match, round(best_score), details))
+        return results
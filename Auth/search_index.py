@@ -0,0 +1,248 @@
+# Auth/search_index.py
+import os
+import re
+import json
+import shutil
+import threading
+from collections import Counter, defaultdict
+from rapidfuzz import fuzz, process
+from .db_utils import SEARCH_INDEX_DIR, get_storage
+from .storage import read_new_lines
+from .normalization import normalize_mrn, normalize_name
+from .atomic_io import file_lock
+
+# Patient fields kept in the index, enough to list a result without a storage read
+SUMMARY_FIELDS = ("patientID", "MRN", "Name", "DOB", "AssignedDoctor", "TransmissionCount")
+# Non-exact candidates (most shared n-grams first) scored with rapidfuzz per query
+SEARCH_CANDIDATES = 50
+# partial_ratio a non-exact name or MRN needs to be listed
+SEARCH_MIN_SCORE = 75
+NGRAM = 3
+# Present in an index written with lowercase doctor keys; an older index is rebuilt
+FORMAT_MARKER = "format-2"
+
+_search_index = None
+
+
+def doctor_key(doctor):
+    """Doctors are matched case-insensitively, as usernames were before the index"""
+    return (doctor or "").lower()
+
+
+def term_grams(term):
+    """Index keys of a normalized name or MRN: each token's trigrams (space padded) and its 1-2 character prefixes"""
+    keys = set()
+    for token in term.split():
+        padded = f" {token} "
+        keys.update(padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1))
+        keys.update("^" + token[:n] for n in range(1, NGRAM))
+    return keys
+
+
+def query_grams(term):
+    """Keys every name containing term has: trigrams, or a prefix key for tokens shorter than a trigram"""
+    keys = set()
+    for token in term.split():
+        if len(token) < NGRAM:
+            keys.add("^" + token)
+        else:
+            keys.update(token[i:i + NGRAM] for i in range(len(token) - NGRAM + 1))
+    return keys
+
+
+def prefix_keys(term):
+    """Two-letter prefix key of each word; still shared when a typo breaks every trigram"""
+    return {"^" + token[:2] for token in term.split()}
+
+
+class _DoctorShard:
+    __slots__ = ("offset", "inode", "patients", "terms", "postings")
+
+    def __init__(self):
+        self.offset, self.inode = 0, None
+        self.patients = {}  # patientID -> summary
+        self.terms = {}  # patientID -> (normalized name, MRN digits)
+        self.postings = defaultdict(set)  # n-gram / prefix key -> patientIDs
+
+
+class SearchIndex:
+    """
+    N-gram index for searching a doctor's patients by name or MRN. One
+    append-only file per doctor, DB/search/<doctor, lowercased>.jsonl, holds a summary
+    line per patient ({"patient": {...}}) and transmission count updates
+    ({"count": patientID, "add": n}). A doctor's postings are built in memory
+    on their first search and caught up with lines appended since (by any
+    process), so a query only touches its own doctor's patients.
+
+    Substring matches are always listed (query words under three characters
+    are matched by scanning the panel); other patients sharing n-grams with
+    the query are ranked with rapidfuzz, and when nothing contains the query
+    the whole panel is, so small typos still find the patient.
+    """
+
+    def __init__(self, base_dir=SEARCH_INDEX_DIR):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        # Serialises writers across processes; searches only take the in-process lock
+        self._write_lock = file_lock(base_dir + ".lock")
+        self._shards = {}
+
+    def _path(self, doctor):
+        return os.path.join(self.base_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", doctor or "") + ".jsonl")
+
+    # WRITES
+
+    def _summary(self, patient):
+        return {field: patient.get(field) for field in SUMMARY_FIELDS}
+
+    def _append(self, by_doctor):
+        for doctor, lines in by_doctor.items():
+            with open(self._path(doctor), "a") as f:
+                f.write("".join(json.dumps(line, separators=(",", ":")) + "\n" for line in lines))
+
+    def _is_current(self):
+        return os.path.exists(os.path.join(self.base_dir, FORMAT_MARKER))
+
+    def _ensure_index(self):
+        """Write every doctor's file from storage if the index does not exist yet; True if this call wrote it."""
+        if self._is_current():
+            return False
+        with self._write_lock, self._lock:
+            if self._is_current():
+                return False
+            shutil.rmtree(self.base_dir, ignore_errors=True)  # written by an older version
+            tmp_dir = f"{self.base_dir}.tmp{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            by_doctor = defaultdict(list)
+            for p in get_storage().list_patients():
+                by_doctor[doctor_key(p.get("AssignedDoctor"))].append(
+                    json.dumps({"patient": self._summary(p)}, separators=(",", ":")) + "\n")
+            for doctor, lines in by_doctor.items():
+                with open(os.path.join(tmp_dir, os.path.basename(self._path(doctor))), "w") as f:
+                    f.write("".join(lines))
+            open(os.path.join(tmp_dir, FORMAT_MARKER), "w").close()
+            try:
+                os.replace(tmp_dir, self.base_dir)
+            except OSError:  # another process built it first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return False
+            self._shards = {}
+            return True
+
+    def add_patient(self, patient):
+        """Index a newly stored patient (a dict or summary with SUMMARY_FIELDS)."""
+        self._ensure_index()
+        summary = self._summary(patient)
+        summary["TransmissionCount"] = summary["TransmissionCount"] or 0
+        with self._write_lock:
+            self._append({doctor_key(summary["AssignedDoctor"]): [{"patient": summary}]})
+
+    def add_reports(self, items):
+        """Count newly stored (patient, report) pairs against their patients' summaries."""
+        if self._ensure_index():
+            return  # a fresh build already counted these reports
+        counts = Counter()
+        for patient, _ in items:
+            counts[(doctor_key(patient["AssignedDoctor"]), patient["patientID"])] += 1
+        by_doctor = defaultdict(list)
+        for (doctor, patient_id), n in counts.items():
+            by_doctor[doctor].append({"count": patient_id, "add": n})
+        with self._write_lock:
+            self._append(by_doctor)
+
+    def rebuild(self):
+        """Drop the index; it is written again from storage on next use."""
+        with self._write_lock:
+            with self._lock:
+                shutil.rmtree(self.base_dir, ignore_errors=True)
+                self._shards = {}
+            self._ensure_index()
+
+    # READS
+
+    def _shard(self, doctor):
+        """The doctor's in-memory postings, caught up with their file; call with the lock held."""
+        shard = self._shards.setdefault(doctor, _DoctorShard())
+        try:
+            st = os.stat(self._path(doctor))
+        except OSError:
+            self._shards[doctor] = _DoctorShard()
+            return self._shards[doctor]
+        if st.st_ino != shard.inode or st.st_size < shard.offset:  # first read, or rebuilt since
+            shard = self._shards[doctor] = _DoctorShard()
+            shard.inode = st.st_ino
+        if st.st_size == shard.offset:
+            return shard
+        entries, shard.offset = read_new_lines(self._path(doctor), shard.offset)
+        for e in entries:
+            if "patient" in e:
+                p = e["patient"]
+                if p["patientID"] in shard.patients:
+                    continue
+                terms = (normalize_name(p.get("Name")), normalize_mrn(p.get("MRN")))
+                shard.patients[p["patientID"]] = p
+                shard.terms[p["patientID"]] = terms
+                for key in term_grams(terms[0]) | term_grams(terms[1]):
+                    shard.postings[key].add(p["patientID"])
+            elif e.get("count") in shard.patients:
+                p = shard.patients[e["count"]]
+                p["TransmissionCount"] = (p.get("TransmissionCount") or 0) + e.get("add", 1)
+        return shard
+
+    def _ranked(self, shard, term, field):
+        keys = query_grams(term)
+        if any(len(token) < NGRAM for token in term.split()):
+            # Short words match inside a word too, as the plain substring search did: scan the panel
+            shared = Counter()
+            exact = {pid for pid, terms in shard.terms.items() if term in terms[field]}
+        else:
+            shared = Counter(pid for key in keys for pid in shard.postings.get(key, ()))
+            # Every substring match shares all of the query's keys
+            exact = {pid for pid, count in shared.items()
+                     if count == len(keys) and term in shard.terms[pid][field]}
+        scored = [(100, pid) for pid in exact]
+        if not exact:
+            # Nothing contains the query: rank the whole panel so a typo loses no candidate
+            choices = {pid: terms[field] for pid, terms in shard.terms.items()}
+            scored += [(score, pid) for _, score, pid in process.extract(
+                term, choices, scorer=fuzz.partial_ratio, score_cutoff=SEARCH_MIN_SCORE, limit=SEARCH_CANDIDATES)]
+        elif field == 0:
+            # Names also list near misses sharing n-grams with the query
+            shared.update(pid for key in prefix_keys(term) - keys for pid in shard.postings.get(key, ()))
+            for pid, _ in shared.most_common(SEARCH_CANDIDATES + len(exact)):
+                if pid in exact:
+                    continue
+                score = fuzz.partial_ratio(term, shard.terms[pid][field], score_cutoff=SEARCH_MIN_SCORE)
+                if score:
+                    scored.append((score, pid))
+        # Best score first; among equals the closest whole-value match, then by name
+        scored.sort(key=lambda s: (-s[0], -fuzz.ratio(term, shard.terms[s[1]][field]),
+                                   shard.patients[s[1]].get("Name") or ""))
+        return [dict(shard.patients[pid]) for _, pid in scored]
+
+    def search(self, doctor_username, query):
+        """
+        The doctor's patients matching query, best first, as summaries. Queries
+        with digits search MRNs first (MRN2024 and 2024 are the same), then
+        names if no MRN matches, as the substring search did.
+        """
+        self._ensure_index()
+        digits, name = normalize_mrn(query), normalize_name(query)
+        with self._lock:
+            shard = self._shard(doctor_key(doctor_username))
+            results = self._ranked(shard, digits, 1) if digits else []
+            if not results and name:
+                results = self._ranked(shard, name, 0)
+            if not results:
+                # Letters or symbols of the MRN itself ("mrn", "-"), which normalizing drops
+                raw = query.strip().lower()
+                results = [dict(p) for p in shard.patients.values() if raw and raw in (p.get("MRN") or "").lower()]
+            return results
+
+
+def get_search_index():
+    global _search_index
+    if _search_index is None:
+        _search_index = SearchIndex()
+    return _search_index
@@ -0,0 +1,224 @@
+# Auth/session_log.py
+import os
+import re
+import gzip
+import json
+from datetime import datetime, timedelta
+from .db_utils import SESSION_LOG_DIR, LOGS_FILE
+from .atomic_io import file_lock
+
+# Start a new segment once the current one passes this size or age
+SESSION_SEGMENT_BYTES = int(os.environ.get("HEALTHPLUS_SESSION_SEGMENT_BYTES", 1024 * 1024))
+SESSION_SEGMENT_DAYS = int(os.environ.get("HEALTHPLUS_SESSION_SEGMENT_DAYS", 30))
+# gzip closed segments ("0" keeps them as plain .jsonl)
+SESSION_GZIP = os.environ.get("HEALTHPLUS_SESSION_GZIP", "1") != "0"
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Closed segments are named by the time range they cover
+SEGMENT_RE = re.compile(r"^session-(\d{14})-(\d{14})\.jsonl(\.gz)?$")
+
+_session_log = None
+
+
+def compact_time(text):
+    """'2024-01-16 12:00:00' -> '20240116120000'"""
+    return re.sub(r"\D", "", text or "")[:14].ljust(14, "0")
+
+
+class SessionLog:
+    """
+    Login audit trail as line-delimited JSON: DB/sessions/current.jsonl takes
+    one appended line per login, and is closed into
+    session-<first>-<last>.jsonl(.gz) once it passes SESSION_SEGMENT_BYTES or
+    SESSION_SEGMENT_DAYS. query() reads segments one line at a time and skips
+    the ones whose time range does not overlap the query.
+
+    The entries of the old DB/session.json are imported into a closed
+    segment the first time the log is used.
+    """
+
+    def __init__(self, base_dir=SESSION_LOG_DIR, legacy_json=LOGS_FILE):
+        self.base_dir = base_dir
+        self.legacy_json = legacy_json
+        self.current_path = os.path.join(base_dir, "current.jsonl")
+        # Shared with other processes: only one of them imports or rotates at a time
+        self._lock = file_lock(base_dir + ".lock")
+
+    def _ensure_dir(self):
+        if os.path.isdir(self.base_dir):
+            return
+        with self._lock:
+            if os.path.isdir(self.base_dir):
+                return
+            tmp_dir = f"{self.base_dir}.tmp{os.getpid()}"
+            os.makedirs(tmp_dir, exist_ok=True)
+            self._import_legacy(tmp_dir)
+            try:
+                os.replace(tmp_dir, self.base_dir)
+            except OSError:  # another process created it first
+                for name in os.listdir(tmp_dir):
+                    os.remove(os.path.join(tmp_dir, name))
+                os.rmdir(tmp_dir)
+
+    # WRITES
+
+    def _write_segment(self, directory, entries):
+        """Write entries (oldest first) as one closed segment."""
+        if not entries:
+            return None
+        name = f"session-{compact_time(entries[0].get('loggedinAt'))}-{compact_time(entries[-1].get('loggedinAt'))}"
+        path = os.path.join(directory, name + ".jsonl")
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries)
+        if SESSION_GZIP:
+            path += ".gz"
+            with gzip.open(path + ".tmp", "wt", compresslevel=6) as f:
+                f.write(data)
+        else:
+            with open(path + ".tmp", "w") as f:
+                f.write(data)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def _import_legacy(self, directory):
+        try:
+            with open(self.legacy_json, "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        entries = sorted((e for e in entries if isinstance(e, dict)), key=lambda e: e.get("loggedinAt") or "")
+        self._write_segment(directory, entries)
+        return len(entries)
+
+    def _current_first_time(self):
+        """loggedinAt of the current segment's first line (read each time: other processes rotate too)."""
+        try:
+            with open(self.current_path, "r") as f:
+                return json.loads(f.readline()).get("loggedinAt") or ""
+        except (OSError, ValueError):
+            return None
+
+    def _due_for_rotation(self, now):
+        try:
+            size = os.path.getsize(self.current_path)
+        except OSError:
+            return False
+        if size >= SESSION_SEGMENT_BYTES:
+            return True
+        first = self._current_first_time()
+        return bool(first) and first < (now - timedelta(days=SESSION_SEGMENT_DAYS)).strftime(TIME_FORMAT)
+
+    def _rotate(self, now):
+        """Close the current segment; call with the lock held."""
+        first = compact_time(self._current_first_time())
+        closed = os.path.join(self.base_dir, f"session-{first}-{now.strftime('%Y%m%d%H%M%S')}.jsonl")
+        if os.path.exists(closed) or os.path.exists(closed + ".gz"):
+            return  # closed a segment this very second already; rotate on a later login
+        try:
+            os.replace(self.current_path, closed)
+        except FileNotFoundError:  # another process rotated it
+            return
+        if not SESSION_GZIP:
+            return
+        # Compress older closed segments; the one just closed may still take a
+        # line from a writer that opened it before the rename
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            if SEGMENT_RE.match(name) and name.endswith(".jsonl") and path != closed:
+                with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb", compresslevel=6) as dst:
+                    dst.write(src.read())
+                os.replace(path + ".gz.tmp", path + ".gz")
+                os.remove(path)
+
+    def append(self, entry):
+        """Record one session; a single appended line regardless of history size."""
+        self._ensure_dir()
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        try:
+            with self._lock:
+                now = datetime.now()
+                if self._due_for_rotation(now):
+                    self._rotate(now)
+                # One write() on an O_APPEND file: concurrent logins never interleave lines
+                with open(self.current_path, "a") as f:
+                    f.write(line)
+            return True
+        except OSError:
+            return False
+
+    # READS
+
+    def _segments(self, start=None, end=None):
+        """Paths of the segments that can hold entries between start and end, oldest first."""
+        low = compact_time(start) if start else None
+        high = compact_time(end) if end else None
+        segments = []
+        for name in os.listdir(self.base_dir):
+            match = SEGMENT_RE.match(name)
+            if not match:
+                continue
+            first, last = match.group(1), match.group(2)
+            if (high and first > high) or (low and last < low):
+                continue
+            segments.append((first, last, os.path.join(self.base_dir, name)))
+        segments.sort()
+        if os.path.exists(self.current_path):
+            segments.append((None, None, self.current_path))
+        return [path for _, _, path in segments]
+
+    def _open_segment(self, path):
+        """Open a segment for reading, following it to its .gz name if compressed since it was listed."""
+        try:
+            return gzip.open(path, "rt") if path.endswith(".gz") else open(path, "rt")
+        except FileNotFoundError:
+            pass
+        if path == self.current_path or path.endswith(".gz"):
+            return None
+        try:
+            return gzip.open(path + ".gz", "rt")
+        except FileNotFoundError:
+            return None
+
+    def query(self, username=None, start=None, end=None):
+        """
+        Yield session entries, oldest first, for username (all users if None)
+        with start <= loggedinAt <= end ('YYYY-MM-DD HH:MM:SS' strings, either optional).
+        """
+        self._ensure_dir()
+        needle = json.dumps(username) if username is not None else None
+        read = set()
+        pending = self._segments(start, end)
+        while pending:
+            path = pending.pop(0)
+            f = self._open_segment(path)
+            if f is None:
+                if path == self.current_path:
+                    # Rotated meanwhile: its lines are in a closed segment not listed yet
+                    pending = [p for p in self._segments(start, end) if _plain_name(p) not in read]
+                continue
+            read.add(_plain_name(path))
+            with f:
+                for line in f:
+                    # Cheap text test before parsing: the username appears verbatim on its lines
+                    if needle is not None and needle not in line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if username is not None and entry.get("username") != username:
+                        continue
+                    logged_in = entry.get("loggedinAt") or ""
+                    if (start and logged_in < start) or (end and logged_in > end):
+                        continue
+                    yield entry
+
+
+def _plain_name(path):
+    return path[:-3] if path.endswith(".gz") else path
+
+
+def get_session_log():
+    global _session_log
+    if _session_log is None:
+        _session_log = SessionLog()
+    return _session_log
@@ -0,0 +1,968 @@
+# Auth/storage.py
+import os
+import re
+import json
+import shutil
+import sqlite3
+import threading
+from bisect import bisect_left
+from collections import Counter
+from .normalization import with_normalized, report_timestamp
+from .file_cache import get_file_cache, load_json, load_jsonl
+from .json_stream import file_contains, iter_objects
+from .atomic_io import atomic_write, ensure_json_file, file_lock
+
+# Listing/search queries return patient summaries: demographics plus a cached
+# TransmissionCount. Transmission bodies (with observations) are loaded on demand
+# through transmission_headers() / get_transmission() / transmissions_for_patient().
+
+
+# Marks summaries whose transmissions still sit inline in patients.json
+INLINE_COUNT = "InlineTransmissionCount"
+
+
+def load_snapshot_summaries(path):
+    """
+    patients.json records without their inline Transmissions arrays (files
+    written before sharding): the streaming reader counts each array instead
+    of parsing it, so only one record is ever being decoded.
+    """
+    if not file_contains(path, b'"Transmissions"'):
+        return load_json(path)  # compacted: nothing to skip, and one json.load is fastest
+    patients = []
+    for record, count in iter_objects(path, "Transmissions"):
+        if count:
+            record.setdefault("TransmissionCount", count)
+            record[INLINE_COUNT] = count
+        patients.append(record)
+    return patients
+
+
+# doctor_panel() orders: "added" is registration order, "transmissions" is most first
+PANEL_SORTS = ("added", "name", "mrn", "dob", "transmissions")
+
+
+def read_new_lines(path, offset):
+    """
+    JSON objects appended to a .jsonl file since byte offset. Returns
+    (entries, new offset); a line still being written is left for the next read.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    data = data[:data.rfind(b"\n") + 1]
+    lines = data.splitlines()
+    try:
+        # One decode for the whole batch; line by line only if some line is torn
+        entries = json.loads(b"[" + b",".join(lines) + b"]") if lines else []
+    except json.JSONDecodeError:
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries, offset + len(data)
+
+
+def transmission_header(report):
+    return {
+        "reportId": report.get("reportId") or report.get("transmissionID") or report.get("report_id"),
+        "reportDate": report.get("reportDate") or report.get("report_date") or ""
+    }
+
+
+class JsonStorage:
+    """
+    Legacy backend: a JSON snapshot of patient demographics, an append-only
+    journal (one JSON object per line) of patients and transmissions added since,
+    and one append-only shard per patient holding that patient's transmissions
+    (DB/transmissions/<patientID>.jsonl).
+    Reads fold the journal onto the snapshot; compact() merges the two.
+    A time index of every transmission by doctor (DB/patients.recent.jsonl,
+    append-only) serves recent_transmissions() without reading the shards, and
+    one panel file per doctor (DB/panels/<doctor>.jsonl: patient summaries and
+    count increments) serves that doctor's patient list without reading the
+    rest of the registry.
+    """
+
+    # Compact in the background once the journal grows past this many bytes
+    COMPACT_THRESHOLD = 4 * 1024 * 1024
+    # Lock-free reads retry this many times if a compaction swaps the snapshot under them
+    READ_RETRIES = 5
+
+    def __init__(self, path, compact_threshold=None):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".journal"
+        self.shard_dir = os.path.join(os.path.dirname(path), "transmissions")
+        self.recent_path = os.path.splitext(path)[0] + ".recent.jsonl"
+        self.panel_dir = os.path.join(os.path.dirname(path), "panels")
+        self.compact_threshold = compact_threshold or self.COMPACT_THRESHOLD
+        # Writers (appends, compaction, full rewrites) are serialised across
+        # processes by patients.json.lock; readers never take it
+        self._lock = file_lock(path + ".lock")
+        self._compactor = None
+        # patientIDs whose transmissions still sit inline in the snapshot/journal
+        # (files written before sharding); None until the snapshot is first read
+        self._inline_ids = None
+        # patientID -> summary, and doctor -> sorted [(report_ts, seq, patientID, reportId, reportDate)]
+        # read from the time index up to _recent_offset; loaded on first use
+        self._patients_by_id = None
+        self._recent = None
+        self._recent_offset = 0
+        self._recent_seq = 0
+        # doctor -> {"offset", "patients": {patientID: summary}, "order": {sort: [summary, ...]}}
+        self._panels = {}
+
+    def _ensure_file(self):
+        ensure_json_file(self.path, [])
+
+    # SNAPSHOT + JOURNAL
+
+    def _read_snapshot(self, transmissions=False):
+        """
+        The snapshot's records. Listing reads get summaries, streamed without
+        the inline transmissions and cached until the file changes;
+        transmissions=True parses whole records (compaction, full exports).
+        """
+        self._ensure_file()
+        try:
+            if transmissions:
+                return load_json(self.path)
+            return get_file_cache().load(self.path, load_snapshot_summaries)
+        except json.JSONDecodeError:
+            return []
+        except:
+            return []
+
+    def _write_snapshot(self, patients):
+        # Write beside the live file and swap it in, so readers never see half a snapshot
+        atomic_write(self.path, json.dumps(patients, indent=4))
+        get_file_cache().invalidate(self.path)
+
+    def _journal_files(self):
+        # A journal left over from an interrupted compaction is replayed first
+        return [p for p in (self.journal_path + ".compacting", self.journal_path) if os.path.exists(p)]
+
+    def _fold_journal(self, patients, journal_files, touched=None):
+        """
+        Apply journal entries in order. Patient and inline report replays are
+        idempotent (keyed by patientID/reportId); sharded report entries only bump
+        the cached count, which compact() recounts from the shard.
+        """
+        by_id = {p.get("patientID"): p for p in patients}
+        for p in patients:
+            p.setdefault("TransmissionCount", len(p.get("Transmissions") or []))
+        for journal in journal_files:
+            # Torn final lines from a crash mid-append are skipped by load_jsonl
+            for entry in get_file_cache().load(journal, load_jsonl):
+                if entry.get("op") == "patient":
+                    record = entry["record"]
+                    if record["patientID"] not in by_id:
+                        record.setdefault("TransmissionCount", len(record.get("Transmissions") or []))
+                        patients.append(record)
+                        by_id[record["patientID"]] = record
+                elif entry.get("op") == "transmission":
+                    patient = by_id.get(entry["patientID"])
+                    if patient is None:
+                        continue
+                    if touched is not None:
+                        touched.add(entry["patientID"])
+                    report = entry.get("report")
+                    if report is None:
+                        patient["TransmissionCount"] += 1
+                        continue
+                    # Journal written before sharding: report body is inline
+                    transmissions = patient.setdefault("Transmissions", [])
+                    report_id = report.get("reportId")
+                    if report_id and any(t.get("reportId") == report_id for t in transmissions):
+                        continue
+                    transmissions.append(report)
+                    patient["TransmissionCount"] += 1
+        return patients
+
+    def _snapshot_version(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_state(self, transmissions=False):
+        # Snapshot first, then the journals: if a compaction replaced the snapshot
+        # meanwhile (and removed the journal it merged), read both again
+        for attempt in range(self.READ_RETRIES):
+            version = self._snapshot_version()
+            try:
+                patients = self._fold_journal(self._read_snapshot(transmissions), self._journal_files())
+            except FileNotFoundError:  # journal renamed or removed mid-read
+                if attempt == self.READ_RETRIES - 1:
+                    raise
+                continue
+            if self._snapshot_version() == version:
+                break
+        self._inline_ids = set()
+        for p in patients:
+            if p.pop(INLINE_COUNT, None) or p.get("Transmissions"):
+                self._inline_ids.add(p["patientID"])
+        return patients
+
+    def _inline_transmissions(self, patient_id):
+        """One patient's inline transmissions: the snapshot is streamed and only their array parsed."""
+        record = None
+        for p, _ in iter_objects(self.path, "Transmissions", keep=lambda p: p.get("patientID") == patient_id):
+            if p.get("patientID") == patient_id:
+                record = p
+                break
+        for p in self._fold_journal([record] if record else [], self._journal_files()):
+            if p["patientID"] == patient_id:
+                return p.get("Transmissions") or []
+        return []
+
+    def _append(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        try:
+            with self._lock:
+                with open(self.journal_path, "a") as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                size = os.path.getsize(self.journal_path)
+        except OSError:
+            return False
+        if size >= self.compact_threshold:
+            self.compact_in_background()
+        return True
+
+    # PER-PATIENT TRANSMISSION SHARDS
+
+    def _shard_path(self, patient_id):
+        return os.path.join(self.shard_dir, f"{patient_id}.jsonl")
+
+    def _read_shard(self, patient_id):
+        path = self._shard_path(patient_id)
+        if not os.path.exists(path):
+            return []
+        reports = []
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    reports.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return reports
+
+    def _append_shard(self, patient_id, reports):
+        if not os.path.exists(self.shard_dir):
+            os.makedirs(self.shard_dir)
+        with open(self._shard_path(patient_id), "a") as f:
+            f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in reports))
+
+    def _move_inline_to_shard(self, patient):
+        """Move a patient's inline transmissions into its shard, skipping ones already there."""
+        inline = patient.pop("Transmissions", None) or []
+        if inline:
+            stored = {t.get("reportId") for t in self._read_shard(patient["patientID"])}
+            missing = [t for t in inline if not t.get("reportId") or t.get("reportId") not in stored]
+            if missing:
+                self._append_shard(patient["patientID"], missing)
+        return bool(inline)
+
+    def _summary(self, record):
+        return {k: v for k, v in record.items() if k != "Transmissions"}
+
+    # FULL-FILE ACCESS (compatibility layer)
+
+    def read_all(self):
+        patients = self._read_state(transmissions=True)
+        for p in patients:
+            p["Transmissions"] = self._merge_inline(p.get("Transmissions"), self._read_shard(p["patientID"]))
+            p.pop("TransmissionCount", None)
+        return patients
+
+    def _merge_inline(self, inline, sharded):
+        inline = inline or []
+        seen = {t.get("reportId") for t in inline if t.get("reportId")}
+        return inline + [t for t in sharded if not t.get("reportId") or t.get("reportId") not in seen]
+
+    def write_all(self, patients):
+        try:
+            with self._lock:
+                snapshot = []
+                for p in patients:
+                    transmissions = p.get("Transmissions") or []
+                    if os.path.exists(self._shard_path(p["patientID"])):
+                        os.remove(self._shard_path(p["patientID"]))
+                    if transmissions:
+                        self._append_shard(p["patientID"], transmissions)
+                    record = with_normalized(self._summary(p))
+                    record["TransmissionCount"] = len(transmissions)
+                    snapshot.append(record)
+                self._write_snapshot(snapshot)
+                for journal in self._journal_files():
+                    os.remove(journal)
+                self._inline_ids = set()
+                # Rebuilt from the new shards on next use
+                if os.path.exists(self.recent_path):
+                    os.remove(self.recent_path)
+                shutil.rmtree(self.panel_dir, ignore_errors=True)
+                self._patients_by_id = self._recent = None
+                self._panels = {}
+            return True
+        except:
+            return False
+
+    def compact(self):
+        """
+        Merge the journal into a new snapshot, moving any inline transmissions to
+        their shards and backfilling normalized identity fields on the way.
+        Returns the number of journal bytes merged.
+        """
+        pending = self.journal_path + ".compacting"
+        with self._lock:
+            if os.path.exists(self.journal_path) and not os.path.exists(pending):
+                os.replace(self.journal_path, pending)
+            # New appends go to a fresh journal while we fold the frozen one
+        journals = [pending] if os.path.exists(pending) else []
+        merged = sum(os.path.getsize(j) for j in journals)
+        touched = set()
+        patients = self._fold_journal(self._read_snapshot(transmissions=True), journals, touched)
+        with self._lock:
+            if journals and not os.path.exists(pending):
+                return 0  # a full write_all() replaced the snapshot meanwhile
+            changed = bool(journals)
+            for p in patients:
+                if self._move_inline_to_shard(p) or p["patientID"] in touched:
+                    p["TransmissionCount"] = len(self._read_shard(p["patientID"]))
+                    changed = True
+                if p.get("NormalizedMRN") is None or p.get("NormalizedDOB") is None:
+                    with_normalized(p)  # records written before the normalized columns
+                    changed = True
+            if changed:
+                self._write_snapshot(patients)
+            for journal in journals:
+                os.remove(journal)
+            self._inline_ids = set()
+        return merged
+
+    def compact_in_background(self):
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name="journal-compactor")
+        self._compactor.start()
+
+    # TIME INDEX
+
+    def _patient_summary(self, patient_id):
+        # Patients are only ever added, so summaries are cached; reload on a
+        # miss (a patient created by another process)
+        if self._patients_by_id is None or patient_id not in self._patients_by_id:
+            self._patients_by_id = {p["patientID"]: p for p in self.list_patients()}
+        return self._patients_by_id.get(patient_id)
+
+    def _recent_line(self, doctor, patient_id, header):
+        return json.dumps({"doctor": doctor, "ts": report_timestamp(header["reportDate"]), "patientID": patient_id,
+                           "reportId": header["reportId"], "reportDate": header["reportDate"]},
+                          separators=(",", ":")) + "\n"
+
+    def _ensure_recent_index(self):
+        """Build the time index from the shards if it does not exist yet."""
+        if os.path.exists(self.recent_path):
+            return
+        with self._lock:
+            if os.path.exists(self.recent_path):
+                return
+            lines = []
+            for p in self.list_patients():
+                for header in self.transmission_headers(p["patientID"]):
+                    lines.append(self._recent_line(p.get("AssignedDoctor"), p["patientID"], header))
+            tmp_path = self.recent_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write("".join(lines))
+            os.replace(tmp_path, self.recent_path)
+
+    def _recent_index(self):
+        """The in-memory time index, caught up with lines appended (by any process) since last read."""
+        self._ensure_recent_index()
+        size = os.path.getsize(self.recent_path)
+        if self._recent is None or size < self._recent_offset:
+            self._recent, self._recent_offset, self._recent_seq = {}, 0, 0
+        if size > self._recent_offset:
+            entries, self._recent_offset = read_new_lines(self.recent_path, self._recent_offset)
+            grown = set()
+            for e in entries:
+                self._recent_seq += 1
+                self._recent.setdefault(e["doctor"], []).append(
+                    (e["ts"], self._recent_seq, e["patientID"], e["reportId"], e["reportDate"]))
+                grown.add(e["doctor"])
+            for doctor in grown:
+                self._recent[doctor].sort()  # appended runs are mostly in order already
+        return self._recent
+
+    def _append_recent(self, items):
+        """Index newly stored (patient_id, report) pairs; call with the lock held."""
+        lines = []
+        for patient_id, report in items:
+            patient = self._patient_summary(patient_id) or {}
+            lines.append(self._recent_line(patient.get("AssignedDoctor"), patient_id, transmission_header(report)))
+        with open(self.recent_path, "a") as f:
+            f.write("".join(lines))
+
+    def recent_transmissions(self, doctor_username, limit, before=None):
+        """
+        Up to limit (patient, header) pairs of the doctor's transmissions, newest
+        first, read from the time index. Each header carries a "cursor"; pass the
+        last one as before= for the next (older) page.
+        """
+        entries = self._recent_index().get(doctor_username, [])
+        end = bisect_left(entries, tuple(before)) if before is not None else len(entries)
+        page = []
+        for ts, seq, patient_id, report_id, report_date in reversed(entries[max(0, end - limit):end]):
+            patient = self._patient_summary(patient_id)
+            if patient is not None:
+                page.append((patient, {"reportId": report_id, "reportDate": report_date or "",
+                                       "cursor": (ts, seq)}))
+        return page
+
+    # DOCTOR PANELS
+
+    def _panel_path(self, doctor):
+        return os.path.join(self.panel_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", doctor) + ".jsonl")
+
+    def _panel_line(self, entry):
+        return json.dumps(entry, separators=(",", ":")) + "\n"
+
+    def _ensure_panels(self):
+        """Split the registry into per-doctor panel files if they do not exist yet."""
+        if os.path.isdir(self.panel_dir):
+            return
+        with self._lock:
+            if os.path.isdir(self.panel_dir):
+                return
+            by_doctor = {}
+            for p in self.list_patients():
+                if p.get("AssignedDoctor"):
+                    by_doctor.setdefault(p["AssignedDoctor"], []).append(p)
+            tmp_dir = self.panel_dir + ".tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for doctor, patients in by_doctor.items():
+                path = os.path.join(tmp_dir, os.path.basename(self._panel_path(doctor)))
+                with open(path, "w") as f:
+                    f.write("".join(self._panel_line({"op": "patient", "record": p}) for p in patients))
+            os.replace(tmp_dir, self.panel_dir)
+
+    def _append_panels(self, entries):
+        """Append (doctor, entry) pairs to the panel files; call with the lock held."""
+        if not os.path.isdir(self.panel_dir):
+            return  # built from the registry, including these changes, on first use
+        by_doctor = {}
+        for doctor, entry in entries:
+            if doctor:
+                by_doctor.setdefault(doctor, []).append(self._panel_line(entry))
+        for doctor, lines in by_doctor.items():
+            with open(self._panel_path(doctor), "a") as f:
+                f.write("".join(lines))
+
+    def _panel(self, doctor):
+        """A doctor's panel, caught up with lines appended (by any process) since last read."""
+        self._ensure_panels()
+        path = self._panel_path(doctor)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        panel = self._panels.get(doctor)
+        if panel is None or size < panel["offset"]:
+            panel = self._panels[doctor] = {"offset": 0, "patients": {}, "order": {}}
+        if size > panel["offset"]:
+            entries, panel["offset"] = read_new_lines(path, panel["offset"])
+            for e in entries:
+                if e["op"] == "patient":
+                    panel["patients"][e["record"]["patientID"]] = e["record"]
+                elif e["op"] == "count" and e["patientID"] in panel["patients"]:
+                    panel["patients"][e["patientID"]]["TransmissionCount"] += e["n"]
+            if entries:
+                panel["order"] = {}
+        return panel
+
+    def _panel_order(self, panel, sort):
+        order = panel["order"].get(sort)
+        if order is None:
+            patients = list(panel["patients"].values())
+            if sort == "name":
+                patients.sort(key=lambda p: p.get("NormalizedName") or "")
+            elif sort == "mrn":
+                patients.sort(key=lambda p: p.get("MRN") or "")
+            elif sort == "dob":
+                patients.sort(key=lambda p: p.get("NormalizedDOB") or "")
+            elif sort == "transmissions":
+                # most first; ties newest first, as in SQLite
+                patients.reverse()
+                patients.sort(key=lambda p: p.get("TransmissionCount", 0), reverse=True)
+            order = panel["order"][sort] = patients
+        return order
+
+    def doctor_panel(self, doctor_username, sort="added", offset=0, limit=None):
+        """
+        One page of the doctor's patient summaries in a PANEL_SORTS order.
+        Returns (patients, total number of patients on the panel).
+        """
+        order = self._panel_order(self._panel(doctor_username), sort)
+        end = len(order) if limit is None else offset + limit
+        return [dict(p) for p in order[offset:end]], len(order)
+
+    # POINT QUERIES (full scans on this backend, except per-doctor panels)
+
+    def list_patients(self):
+        return [self._summary(p) for p in self._read_state()]
+
+    def _find_patient(self, field, value):
+        """
+        First patient summary whose field equals value. The snapshot is
+        streamed one record at a time up to the match and nothing is cached;
+        only that record (or, without one, the journal's patients) is folded.
+        """
+        self._ensure_file()
+        for attempt in range(self.READ_RETRIES):
+            version = self._snapshot_version()
+            found = []
+            try:
+                for record, count in iter_objects(self.path, "Transmissions"):
+                    if record.get(field) == value:
+                        if count:
+                            record.setdefault("TransmissionCount", count)
+                        found.append(record)
+                        break
+            except ValueError:  # unreadable snapshot: listed as empty too
+                pass
+            try:
+                patients = self._fold_journal(found, self._journal_files())
+            except FileNotFoundError:  # journal renamed or removed mid-read
+                if attempt == self.READ_RETRIES - 1:
+                    raise
+                continue
+            if self._snapshot_version() == version:
+                break
+        for p in patients:
+            if p.get(field) == value:
+                return self._summary(p)
+        return None
+
+    def get_patient(self, patient_id):
+        return self._find_patient("patientID", patient_id)
+
+    def find_patient_by_mrn(self, mrn):
+        return self._find_patient("MRN", mrn)
+
+    def transmissions_for_patient(self, patient_id):
+        if self._inline_ids is None:
+            self._read_state()
+        inline = self._inline_transmissions(patient_id) if patient_id in self._inline_ids else []
+        return self._merge_inline(inline, self._read_shard(patient_id))
+
+    def transmission_headers(self, patient_id):
+        return [transmission_header(t) for t in self.transmissions_for_patient(patient_id)]
+
+    def get_transmission(self, patient_id, report_id):
+        for t in self.transmissions_for_patient(patient_id):
+            if transmission_header(t)["reportId"] == report_id:
+                return t
+        return None
+
+    # WRITES (one journal line each, independent of registry size)
+
+    def insert_patient(self, record):
+        transmissions = record.get("Transmissions") or []
+        record = with_normalized(self._summary(record))
+        record["TransmissionCount"] = len(transmissions)
+        try:
+            if transmissions:
+                with self._lock:
+                    self._append_shard(record["patientID"], transmissions)
+        except OSError:
+            return False
+        if not self._append({"op": "patient", "record": record}):
+            return False
+        if self._patients_by_id is not None:
+            self._patients_by_id[record["patientID"]] = record
+        with self._lock:
+            self._append_panels([(record.get("AssignedDoctor"), {"op": "patient", "record": record})])
+            if transmissions and os.path.exists(self.recent_path):
+                self._append_recent([(record["patientID"], t) for t in transmissions])
+        return True
+
+    def add_transmission(self, patient_id, report):
+        return self.add_transmissions([(patient_id, report)])
+
+    def add_transmissions(self, items):
+        """Store many (patient_id, report) pairs: one shard append per patient and one journal write."""
+        by_patient = {}
+        for patient_id, report in items:
+            by_patient.setdefault(patient_id, []).append(report)
+        lines = "".join(
+            json.dumps({"op": "transmission", "patientID": patient_id, "reportId": report.get("reportId")},
+                       separators=(",", ":")) + "\n"
+            for patient_id, report in items
+        )
+        try:
+            self._ensure_recent_index()
+            self._ensure_panels()
+            doctors = {pid: (self._patient_summary(pid) or {}).get("AssignedDoctor") for pid in by_patient}
+            with self._lock:
+                for patient_id, reports in by_patient.items():
+                    self._append_shard(patient_id, reports)
+                # The journal line is the commit record: durable before we report success
+                with open(self.journal_path, "a") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._append_recent(items)
+                self._append_panels([(doctors[pid], {"op": "count", "patientID": pid, "n": len(reports)})
+                                     for pid, reports in by_patient.items()])
+                size = os.path.getsize(self.journal_path)
+        except OSError:
+            return False
+        if size >= self.compact_threshold:
+            self.compact_in_background()
+        return True
+
+
+class SqliteStorage:
+    """Default backend: embedded SQLite with one row per patient and per transmission."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS patients (
+            patient_id TEXT PRIMARY KEY,
+            mrn TEXT NOT NULL,
+            name TEXT,
+            dob TEXT,
+            assigned_doctor TEXT,
+            transmission_count INTEGER NOT NULL DEFAULT 0,
+            mrn_norm TEXT,
+            name_norm TEXT,
+            dob_norm TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_patients_mrn ON patients(mrn);
+        CREATE INDEX IF NOT EXISTS idx_patients_mrn_norm ON patients(mrn_norm);
+        CREATE INDEX IF NOT EXISTS idx_patients_doctor ON patients(assigned_doctor);
+        -- One per doctor_panel() sort, so a page is read in order straight off the index
+        CREATE INDEX IF NOT EXISTS idx_patients_doctor_name ON patients(assigned_doctor, name_norm);
+        CREATE INDEX IF NOT EXISTS idx_patients_doctor_mrn ON patients(assigned_doctor, mrn);
+        CREATE INDEX IF NOT EXISTS idx_patients_doctor_dob ON patients(assigned_doctor, dob_norm);
+        CREATE INDEX IF NOT EXISTS idx_patients_doctor_count ON patients(assigned_doctor, transmission_count);
+
+        CREATE TABLE IF NOT EXISTS transmissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id TEXT,
+            patient_id TEXT NOT NULL REFERENCES patients(patient_id),
+            report_date TEXT,
+            body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transmissions_patient ON transmissions(patient_id);
+        CREATE INDEX IF NOT EXISTS idx_transmissions_report_date ON transmissions(report_date);
+
+        -- Time-ordered index of each doctor's transmissions; report_ts is
+        -- report_timestamp(report_date), transmission_id breaks ties
+        CREATE TABLE IF NOT EXISTS recent_transmissions (
+            doctor TEXT,
+            report_ts INTEGER NOT NULL,
+            transmission_id INTEGER NOT NULL,
+            patient_id TEXT NOT NULL,
+            report_id TEXT,
+            report_date TEXT,
+            PRIMARY KEY (doctor, report_ts, transmission_id)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        base_dir = os.path.dirname(path)
+        if base_dir and not os.path.exists(base_dir):
+            os.makedirs(base_dir)
+        is_new = not os.path.exists(path)
+        self._local = threading.local()
+        self._upgrade_schema()
+        has_recent_index = self._has_table("recent_transmissions")
+        self.conn.executescript(self.SCHEMA)
+        if not has_recent_index:
+            # Databases from before the time index: build it from the stored transmissions
+            with self.conn:
+                self._index_transmissions_after(0)
+        # First start on an existing install: import the JSON registry once
+        if is_new and legacy_json and os.path.exists(legacy_json):
+            self.import_json(legacy_json)
+
+    @property
+    def conn(self):
+        """This thread's connection; a sqlite3 connection is never shared between threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Writers from other threads and processes wait up to the timeout for the
+            # write lock; in WAL mode readers see the last committed state without blocking them
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            conn.create_function("report_timestamp", 1, report_timestamp, deterministic=True)
+        return conn
+
+    def _has_table(self, table):
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+    def _columns(self, table):
+        return {row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+
+    def _upgrade_schema(self):
+        """Bring databases created by older versions up to the current SCHEMA."""
+        columns = self._columns("patients")
+        if columns and "transmission_count" not in columns:
+            with self.conn:
+                self.conn.execute(
+                    "ALTER TABLE patients ADD COLUMN transmission_count INTEGER NOT NULL DEFAULT 0"
+                )
+                self.conn.execute(
+                    "UPDATE patients SET transmission_count = "
+                    "(SELECT COUNT(*) FROM transmissions t WHERE t.patient_id = patients.patient_id)"
+                )
+        if columns and "mrn_norm" not in columns:
+            with self.conn:
+                for column in ("mrn_norm", "name_norm", "dob_norm"):
+                    self.conn.execute(f"ALTER TABLE patients ADD COLUMN {column} TEXT")
+                # Backfill the normalized identity columns of existing rows
+                rows = self.conn.execute("SELECT patient_id, mrn, name, dob FROM patients").fetchall()
+                for row in rows:
+                    record = with_normalized({"MRN": row["mrn"], "Name": row["name"], "DOB": row["dob"]})
+                    self.conn.execute(
+                        "UPDATE patients SET mrn_norm = ?, name_norm = ?, dob_norm = ? WHERE patient_id = ?",
+                        (record["NormalizedMRN"], record["NormalizedName"], record["NormalizedDOB"],
+                         row["patient_id"])
+                    )
+
+    # ROW <-> RECORD HELPERS
+
+    def _patient_record(self, row, transmissions=None):
+        record = {
+            "patientID": row["patient_id"],
+            "MRN": row["mrn"],
+            "Name": row["name"],
+            "DOB": row["dob"],
+            "AssignedDoctor": row["assigned_doctor"],
+            "NormalizedMRN": row["mrn_norm"],
+            "NormalizedName": row["name_norm"],
+            "NormalizedDOB": row["dob_norm"]
+        }
+        if transmissions is None:
+            record["TransmissionCount"] = row["transmission_count"]
+        else:
+            record["Transmissions"] = transmissions
+        return record
+
+    def _insert_patient_row(self, record):
+        record = with_normalized(dict(record))
+        self.conn.execute(
+            "INSERT INTO patients (patient_id, mrn, name, dob, assigned_doctor, mrn_norm, name_norm, dob_norm) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (record["patientID"], record["MRN"], record.get("Name"), record.get("DOB"),
+             record.get("AssignedDoctor"), record["NormalizedMRN"], record["NormalizedName"],
+             record["NormalizedDOB"])
+        )
+
+    def _insert_transmission_row(self, patient_id, report):
+        cursor = self.conn.execute(
+            "INSERT INTO transmissions (report_id, patient_id, report_date, body) VALUES (?, ?, ?, ?)",
+            (transmission_header(report)["reportId"], patient_id, report.get("reportDate"), json.dumps(report))
+        )
+        self._index_transmissions_after(cursor.lastrowid - 1)
+        self.conn.execute(
+            "UPDATE patients SET transmission_count = transmission_count + 1 WHERE patient_id = ?",
+            (patient_id,)
+        )
+
+    def _index_transmissions_after(self, last_id):
+        """Add transmissions with id > last_id to the time index, under their patient's doctor."""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO recent_transmissions "
+            "(doctor, report_ts, transmission_id, patient_id, report_id, report_date) "
+            "SELECT p.assigned_doctor, report_timestamp(t.report_date), t.id, t.patient_id, t.report_id, "
+            "t.report_date FROM transmissions t JOIN patients p ON p.patient_id = t.patient_id WHERE t.id > ?",
+            (last_id,)
+        )
+
+    def _transmissions_by_patient(self):
+        grouped = {}
+        for row in self.conn.execute("SELECT patient_id, body FROM transmissions ORDER BY id"):
+            grouped.setdefault(row["patient_id"], []).append(json.loads(row["body"]))
+        return grouped
+
+    # FULL-REGISTRY ACCESS (compatibility layer)
+
+    def read_all(self):
+        rows = self.conn.execute("SELECT * FROM patients ORDER BY rowid").fetchall()
+        transmissions = self._transmissions_by_patient()
+        return [self._patient_record(r, transmissions.get(r["patient_id"], [])) for r in rows]
+
+    def write_all(self, patients):
+        try:
+            with self.conn:
+                self.conn.execute("DELETE FROM recent_transmissions")
+                self.conn.execute("DELETE FROM transmissions")
+                self.conn.execute("DELETE FROM patients")
+                self._import(patients)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def import_records(self, patients):
+        with self.conn:
+            self._import(patients)
+
+    def import_json(self, json_path):
+        """
+        Copy the patients of a JSON registry, with their transmissions, that
+        this database does not hold yet (by patientID). The check and the
+        inserts run under the write lock, so processes importing at once never
+        import a patient twice. Returns (patients imported, already present).
+        """
+        patients = JsonStorage(json_path).read_all()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            present = {row[0] for row in self.conn.execute("SELECT patient_id FROM patients")}
+            new = [p for p in patients if p["patientID"] not in present]
+            self._import(new)
+        return len(new), len(patients) - len(new)
+
+    def _import(self, patients):
+        for p in patients:
+            self._insert_patient_row(p)
+            for t in p.get("Transmissions", []) or []:
+                self._insert_transmission_row(p["patientID"], t)
+
+    # POINT QUERIES
+
+    def list_patients(self):
+        rows = self.conn.execute("SELECT * FROM patients ORDER BY rowid")
+        return [self._patient_record(r) for r in rows]
+
+    def get_patient(self, patient_id):
+        row = self.conn.execute("SELECT * FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
+        return self._patient_record(row) if row else None
+
+    def find_patient_by_mrn(self, mrn):
+        row = self.conn.execute("SELECT * FROM patients WHERE mrn = ? LIMIT 1", (mrn,)).fetchone()
+        return self._patient_record(row) if row else None
+
+    PANEL_ORDER = {
+        "added": "rowid",
+        "name": "name_norm, rowid",
+        "mrn": "mrn, rowid",
+        "dob": "dob_norm, rowid",
+        "transmissions": "transmission_count DESC, rowid DESC",
+    }
+
+    def doctor_panel(self, doctor_username, sort="added", offset=0, limit=None):
+        """
+        One page of the doctor's patient summaries in a PANEL_SORTS order.
+        Returns (patients, total number of patients on the panel).
+        """
+        total = self.conn.execute(
+            "SELECT COUNT(*) FROM patients WHERE assigned_doctor = ?", (doctor_username,)
+        ).fetchone()[0]
+        rows = self.conn.execute(
+            f"SELECT * FROM patients WHERE assigned_doctor = ? ORDER BY {self.PANEL_ORDER[sort]} LIMIT ? OFFSET ?",
+            (doctor_username, -1 if limit is None else limit, offset)
+        )
+        return [self._patient_record(r) for r in rows], total
+
+    def transmissions_for_patient(self, patient_id):
+        rows = self.conn.execute(
+            "SELECT body FROM transmissions WHERE patient_id = ? ORDER BY id", (patient_id,)
+        )
+        return [json.loads(r["body"]) for r in rows]
+
+    def transmission_headers(self, patient_id):
+        rows = self.conn.execute(
+            "SELECT report_id, report_date FROM transmissions WHERE patient_id = ? ORDER BY id", (patient_id,)
+        )
+        return [{"reportId": r["report_id"], "reportDate": r["report_date"] or ""} for r in rows]
+
+    def get_transmission(self, patient_id, report_id):
+        row = self.conn.execute(
+            "SELECT body FROM transmissions WHERE patient_id = ? AND report_id = ?", (patient_id, report_id)
+        ).fetchone()
+        return json.loads(row["body"]) if row else None
+
+    def recent_transmissions(self, doctor_username, limit, before=None):
+        """
+        Up to limit (patient, header) pairs of the doctor's transmissions, newest
+        first, read from the time index. Each header carries a "cursor"; pass the
+        last one as before= for the next (older) page.
+        """
+        where, params = "r.doctor = ?", [doctor_username]
+        if before is not None:
+            where += " AND (r.report_ts, r.transmission_id) < (?, ?)"
+            params += list(before)
+        rows = self.conn.execute(
+            "SELECT p.*, r.report_ts, r.transmission_id, r.report_id, r.report_date FROM recent_transmissions r "
+            f"JOIN patients p ON p.patient_id = r.patient_id WHERE {where} "
+            "ORDER BY r.report_ts DESC, r.transmission_id DESC LIMIT ?",
+            params + [limit]
+        )
+        return [(self._patient_record(r), {"reportId": r["report_id"], "reportDate": r["report_date"] or "",
+                                           "cursor": (r["report_ts"], r["transmission_id"])})
+                for r in rows]
+
+    # WRITES
+
+    def insert_patient(self, record):
+        try:
+            with self.conn:
+                self._insert_patient_row(record)
+                for t in record.get("Transmissions", []) or []:
+                    self._insert_transmission_row(record["patientID"], t)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def add_transmission(self, patient_id, report):
+        try:
+            with self.conn:
+                self._insert_transmission_row(patient_id, report)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def add_transmissions(self, items):
+        """Store many (patient_id, report) pairs in a single transaction."""
+        counts = Counter(patient_id for patient_id, _ in items)
+        try:
+            with self.conn:
+                last_id = self.conn.execute("SELECT IFNULL(MAX(id), 0) FROM transmissions").fetchone()[0]
+                self.conn.executemany(
+                    "INSERT INTO transmissions (report_id, patient_id, report_date, body) VALUES (?, ?, ?, ?)",
+                    [(transmission_header(r)["reportId"], patient_id, r.get("reportDate"), json.dumps(r))
+                     for patient_id, r in items]
+                )
+                self.conn.executemany(
+                    "UPDATE patients SET transmission_count = transmission_count + ? WHERE patient_id = ?",
+                    [(n, patient_id) for patient_id, n in counts.items()]
+                )
+                self._index_transmissions_after(last_id)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def compact(self):
+        """Reclaim free pages. Returns the number of bytes saved."""
+        before = os.path.getsize(self.path)
+        self.conn.execute("VACUUM")
+        return max(before - os.path.getsize(self.path), 0)
+
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """Import a JSON registry into the SQLite database at db_path (created if needed). Returns (imported, skipped)."""
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(json_path)
+    storage = SqliteStorage(db_path)
+    try:
+        return storage.import_json(json_path)
+    finally:
+        storage.conn.close()
@@ -1,6 +1,7 @@
 # Auth/user_management.py
 from datetime import datetime
-from .db_utils import read_users, write_users, read_logs, write_logs
+from .db_utils import read_users, write_users, users_lock
+from .session_log import get_session_log
 from .security import hash_password, check_password
 
 _current_user = None
@@ -39,16 +40,18 @@ class Admin(User):
             print("ERROR: Password must be at least 8 characters long.")
             return
 
-        users = read_users()
-        for user in users:
-            if user["username"] == username:
-                print("ERROR: Username already exists")
-                return
-
         hashed = hash_password(password)
-        users.append({"username": username, "passwordHash": hashed, "role": role})
-        if write_users(users):
-            print(f"SUCCESS: User '{username}' created successfully.")
+        # Check and write under the lock, so a user created by another process meanwhile is kept
+        with users_lock():
+            users = read_users()
+            for user in users:
+                if user["username"] == username:
+                    print("ERROR: Username already exists")
+                    return
+
+            users.append({"username": username, "passwordHash": hashed, "role": role})
+            if write_users(users):
+                print(f"SUCCESS: User '{username}' created successfully.")
 
 
 class Doctor(User):
@@ -85,10 +88,8 @@ def login():
         if user_obj.username == username and user_obj.check_password(password):
             _current_user = user_obj
             print(f"SUCCESS: Logged in as {username} ({user_obj.role})")
-            logs = read_logs()
-            logs.append({"username": username, "role": user_obj.role,
-                         "loggedinAt": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-            write_logs(logs)
+            get_session_log().append({"username": username, "role": user_obj.role,
+                                      "loggedinAt": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
             return
 
     print("ERROR: Invalid credentials")
@@ -105,3 +106,26 @@ def logout():
 
 def get_current_user():
     return _current_user
+
+
+def show_session_log():
+    current = get_current_user()
+    if not current or current.role != "admin":
+        print("ERROR: Only admin can view the session log")
+        return
+    username = input("Username (blank for all users): ").strip() or None
+    start = input("From date YYYY-MM-DD (blank for the beginning): ").strip()
+    end = input("To date YYYY-MM-DD (blank for today): ").strip()
+    try:
+        for day in (start, end):
+            if day:
+                datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        print("ERROR: Invalid date format. Expected YYYY-MM-DD.")
+        return
+    count = 0
+    # Entries stream from the log segments; only segments overlapping the range are opened
+    for entry in get_session_log().query(username, start and f"{start} 00:00:00", end and f"{end} 23:59:59"):
+        count += 1
+        print(f"{entry.get('loggedinAt')}  {entry.get('username')} ({entry.get('role')})")
+    print(f"INFO: {count} session(s) found")
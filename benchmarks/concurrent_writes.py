@@ -0,0 +1,154 @@
+# benchmarks/concurrent_writes.py
+# Several processes creating patients, uploading HL7 reports and adding users against one DB directory at once;
+# every operation must report SUCCESS, and afterwards every write must be there (no lost updates) and every file
+# must still parse.
+# Run from the repository root:  python -m benchmarks.concurrent_writes [processes] [operations per process]
+import io
+import os
+import sys
+import json
+import time
+import builtins
+import tempfile
+import contextlib
+import multiprocessing
+
+DOCTOR = "doctorBench"
+SEED_PATIENTS = 5
+BACKENDS = ("json", "sqlite")
+
+
+def seed_mrn(i):
+    return f"MRN9{i:06d}"
+
+
+def hl7_message(worker_id, k):
+    # Each worker cycles through the seed patients; control IDs and times keep every message distinct
+    i = k % SEED_PATIENTS
+    stamp = f"2024{1 + worker_id % 12:02d}{1 + k % 28:02d}{k // 60 % 24:02d}{k % 60:02d}00"
+    return "\r".join([
+        f"MSH|^~\\&|CARDIAC_DEVICE|HEART_CLINIC|EHR_SYSTEM|HOSPITAL|{stamp}||ORU^R01|W{worker_id}K{k}|P|2.5",
+        f"PID|1||{seed_mrn(i)}^^^MRN^MR||PATIENT^SEED{i}||19700101|M",
+        f"OBR|1|||ECG^ELECTROCARDIOGRAM^LN||{stamp}|{stamp}",
+        f"OBX|1|NM|Heart Rate^Heart Rate^LN|{60 + k % 70}|bpm^beats per minute^UCUM|60-100|{'H' if k % 3 else 'N'}|||F",
+    ]) + "\r"
+
+
+def seed(_):
+    # Runs in its own process so HEALTHPLUS_DB_DIR is read by a fresh import
+    from Auth.db_utils import write_users, get_storage
+    from Auth.patient_management import Patient
+    write_users([{"username": "admin", "passwordHash": "", "role": "admin"}])
+    for i in range(SEED_PATIENTS):
+        get_storage().insert_patient(Patient(seed_mrn(i), f"Seed{i} Patient", "01/01/1970", DOCTOR).to_dict())
+
+
+def worker(worker_id, ops, report_dir, results):
+    # A plain (non-daemonic) process: the ingest pipeline may start a parse process pool of its own
+    import Auth.user_management as um
+    from Auth.patient_management import create_patient
+    from parsing.report_uploader import upload_report
+    from parsing.pipeline import get_pipeline
+    um._current_user = um.Doctor(DOCTOR, "")
+    admin = um.Admin("admin", "")
+    timings = {"create_patient": 0.0, "upload_report": 0.0, "create_user": 0.0}
+    problems = []
+
+    def run(name, fn, answers):
+        answers = iter(answers)
+        builtins.input = lambda *a: next(answers)
+        output = io.StringIO()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                fn()
+        except Exception as e:
+            output.write(f"{type(e).__name__}: {e}")
+        timings[name] += time.perf_counter() - start
+        if "SUCCESS:" not in output.getvalue():
+            problems.append(f"worker {worker_id} {name}: {' '.join(output.getvalue().split())}")
+
+    for k in range(ops):
+        run("create_patient", create_patient,
+            [f"MRN{worker_id + 1:02d}{k:05d}", f"Worker{worker_id} Patient{k}", "01/01/1980"])
+        run("upload_report", upload_report, [os.path.join(report_dir, f"w{worker_id}_{k}.hl7")])
+        run("create_user", admin.create_user, [f"bench{worker_id}_{k}", "password123", "doctor"])
+    # Stop the parse pool now: a finished Process joins its children before atexit would close the pipeline
+    get_pipeline().close()
+    results.put((timings, problems))
+
+
+def verify(args):
+    processes, ops = args
+    from Auth.db_utils import USERS_FILE, get_storage
+    storage = get_storage()
+    problems = []
+    patients = storage.list_patients()
+    if len(patients) != SEED_PATIENTS + processes * ops:
+        problems.append(f"{len(patients)} patients, expected {SEED_PATIENTS + processes * ops}")
+    expected = [0] * SEED_PATIENTS
+    for k in range(ops):
+        expected[k % SEED_PATIENTS] += processes
+    for i in range(SEED_PATIENTS):
+        patient = storage.find_patient_by_mrn(seed_mrn(i))
+        if patient is None:
+            problems.append(f"{seed_mrn(i)}: patient missing")
+            continue
+        stored = len(storage.transmission_headers(patient["patientID"]))
+        if stored != expected[i]:
+            problems.append(f"{seed_mrn(i)}: {stored} transmissions, expected {expected[i]}")
+    with open(USERS_FILE, "r") as f:
+        users = json.load(f)  # must parse: no torn write
+    if len(users) != 1 + processes * ops:
+        problems.append(f"{len(users)} users, expected {1 + processes * ops}")
+    return problems
+
+
+def run_backend(backend, processes, ops):
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_dir = os.path.join(tmp, "DB")
+        report_dir = os.path.join(tmp, "reports")
+        os.makedirs(report_dir)
+        for worker_id in range(processes):
+            for k in range(ops):
+                with open(os.path.join(report_dir, f"w{worker_id}_{k}.hl7"), "w") as f:
+                    f.write(hl7_message(worker_id, k))
+        # Spawned processes import Auth afresh and pick these up
+        os.environ["HEALTHPLUS_DB_DIR"] = db_dir
+        os.environ["HEALTHPLUS_STORAGE"] = backend
+        with context.Pool(1) as pool:
+            pool.map(seed, [None])
+        results = context.Queue()
+        workers = [context.Process(target=worker, args=(worker_id, ops, report_dir, results))
+                   for worker_id in range(processes)]
+        start = time.perf_counter()
+        for p in workers:
+            p.start()
+        # Drain before joining: a process does not exit while its queued result is unread
+        finished = [results.get() for _ in workers]
+        for p in workers:
+            p.join()
+        elapsed = time.perf_counter() - start
+        timings = [t for t, _ in finished]
+        problems = [problem for _, worker_problems in finished for problem in worker_problems]
+        with context.Pool(1) as pool:
+            problems += pool.map(verify, [(processes, ops)])[0]
+    per_op = {name: sum(t[name] for t in timings) / (processes * ops) * 1e3 for name in timings[0]}
+    print(f"{backend:>7} {elapsed:>9.2f} {per_op['create_patient']:>12.1f} {per_op['upload_report']:>12.1f} "
+          f"{per_op['create_user']:>12.1f}  {'OK' if not problems else 'LOST'}")
+    for problem in problems:
+        print(f"        {problem}")
+    return not problems
+
+
+def main(processes, ops):
+    print(f"{processes} processes x {ops} rounds of create_patient + upload_report + create_user")
+    print(f"{'backend':>7} {'total (s)':>9} {'patient (ms)':>12} {'upload (ms)':>12} {'user (ms)':>12}  result")
+    ok = all([run_backend(backend, processes, ops) for backend in BACKENDS])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [4, 10][len(args):]))
@@ -0,0 +1,79 @@
+# benchmarks/doctor_panel.py
+# First page of a doctor's patient list: whole-registry filter vs the per-doctor panel, per sort order.
+# Run from the repository root:  python -m benchmarks.doctor_panel [panel sizes...]
+import os
+import sys
+import time
+import uuid
+import random
+import tempfile
+from Auth.storage import SqliteStorage, JsonStorage, PANEL_SORTS
+from Auth.doctor_dashboard import PAGE_SIZE
+
+# Other doctors' patients in the registry, per patient on the measured panel
+OTHER_DOCTORS = 4
+
+
+def fill(storage, panel_size):
+    random.seed(panel_size)  # same registry for both backends
+    first = ["Anna", "Besnik", "Drita", "Luan", "Mira", "Arben", "Elira", "Gent"]
+    last = ["Hoxha", "Krasniqi", "Berisha", "Gashi", "Shala", "Morina", "Kelmendi"]
+    records = []
+    for i in range(panel_size * (OTHER_DOCTORS + 1)):
+        records.append({
+            "patientID": str(uuid.UUID(int=random.getrandbits(128))), "MRN": f"MRN{random.randrange(10**7):07d}",
+            "Name": f"{random.choice(first)} {random.choice(last)}",
+            "DOB": f"{random.randint(1, 12):02d}/{random.randint(1, 28):02d}/{random.randint(1930, 2020)}",
+            "AssignedDoctor": "doctor0" if i % (OTHER_DOCTORS + 1) == 0 else f"doctor{i % (OTHER_DOCTORS + 1)}",
+            "Transmissions": [{"reportId": str(uuid.uuid4()), "reportDate": "20240101"}] * random.randint(0, 3)
+        })
+    if isinstance(storage, SqliteStorage):
+        storage.import_records(records)  # one transaction
+    else:
+        for record in records:
+            storage.insert_patient(record)
+
+
+def registry_filter(storage):
+    # What list_my_patients did on the JSON backend: read everything, keep this doctor's
+    return [p for p in storage.list_patients() if p.get("AssignedDoctor") == "doctor0"][:PAGE_SIZE]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1e3, result
+
+
+def main(sizes):
+    print(f"{'backend':>7} {'panel':>7} {'registry filter (ms)':>21} " +
+          " ".join(f"{sort + ' (ms)':>18}" for sort in PANEL_SORTS))
+    for n in sizes:
+        pages = {}
+        for name in ("sqlite", "json"):
+            with tempfile.TemporaryDirectory() as tmp:
+                if name == "sqlite":
+                    storage = SqliteStorage(os.path.join(tmp, "patients.db"))
+                else:
+                    storage = JsonStorage(os.path.join(tmp, "patients.json"))
+                fill(storage, n)
+                if name == "json":
+                    storage._ensure_panels()  # built once per install
+                scan, _ = timed(registry_filter, storage)
+                cells = []
+                for sort in PANEL_SORTS:
+                    # first view (cold) and page 2 once the order is known (warm)
+                    cold, (page, _) = timed(storage.doctor_panel, "doctor0", sort, 0, PAGE_SIZE)
+                    warm, _ = timed(storage.doctor_panel, "doctor0", sort, PAGE_SIZE, PAGE_SIZE)
+                    pages.setdefault(sort, []).append([p["patientID"] for p in page])
+                    cells.append(f"{cold:>8.2f} / {warm:>6.2f}")
+                print(f"{name:>7} {n:>7} {scan:>21.1f} " + " ".join(f"{c:>18}" for c in cells))
+                if name == "sqlite":
+                    storage.conn.close()
+        same = [sort for sort, (a, b) in pages.items() if a == b]
+        print(f"  same first page on both backends: {', '.join(same) or 'none'}")
+    print("(doctor_panel columns: first page cold / next page warm)")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 20_000])
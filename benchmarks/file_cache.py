@@ -0,0 +1,48 @@
+# benchmarks/file_cache.py
+# Repeated reads of the same JSON file: json.load every time vs the stat-validated in-process cache.
+# Run from the repository root:  python -m benchmarks.file_cache [record counts...]
+import os
+import sys
+import json
+import time
+import uuid
+import tempfile
+from Auth.file_cache import FileCache
+
+READS = 20
+
+
+def make_records(n):
+    return [{"patientID": str(uuid.uuid4()), "MRN": f"MRN{i:07d}", "Name": f"Patient {i}", "DOB": "01/01/1970",
+             "AssignedDoctor": f"doctor{i % 20}", "NormalizedMRN": f"{i:07d}", "NormalizedName": f"patient {i}",
+             "NormalizedDOB": "1970-01-01", "TransmissionCount": i % 7} for i in range(n)]
+
+
+def main(sizes):
+    print(f"{'records':>8} {'json.load (ms)':>15} {'cache miss (ms)':>16} {'cache hit (ms)':>15} {'hits':>5}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "patients.json")
+            with open(path, "w") as f:
+                json.dump(make_records(n), f, indent=4)
+
+            start = time.perf_counter()
+            for _ in range(READS):
+                with open(path, "r") as f:
+                    json.load(f)
+            plain = (time.perf_counter() - start) / READS
+
+            cache = FileCache()
+            start = time.perf_counter()
+            cache.load(path)
+            miss = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(READS):
+                cache.load(path)  # each hit is a stat and a private copy
+            hit = (time.perf_counter() - start) / READS
+            print(f"{n:>8} {plain * 1e3:>15.1f} {miss * 1e3:>16.1f} {hit * 1e3:>15.1f} "
+                  f"{cache.stats()['patients.json']['hits']:>5}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 20_000, 100_000])
@@ -0,0 +1,68 @@
+# benchmarks/fuzzy_blocking.py
+# Blocked vs exhaustive fuzzy_match_patient, and fuzzy_match_batch: agreement on a noisy report corpus and speed.
+# Run from the repository root:  python -m benchmarks.fuzzy_blocking [sizes...]
+import sys
+import time
+import random
+from Auth.patient_management import PatientManager
+from benchmarks.patient_matching import make_patients
+
+REPORTS = 100
+
+
+def typo(text):
+    i = random.randrange(len(text))
+    return text[:i] + random.choice("0123456789") + text[i + 1:]
+
+
+def noisy_reports(patients):
+    """Registry members with MRN typos, HL7 name order and varied DOB formats, plus strangers."""
+    reports = []
+    for p in random.sample(patients, min(REPORTS, len(patients))):
+        first, last = p.Name.split(" ")
+        month, day, year = p.DOB.split("/")
+        digits = p.MRN[3:]
+        reports.append({
+            "mrn": random.choice([f"MRN-{typo(digits)}^^^MRN^MR", f"MRN{typo(typo(digits))}", ""]),
+            "name": random.choice([f"{last.upper()}^{first.upper()}", f"{first} {typo(last)}", p.Name]),
+            "dateOfBirth": random.choice([f"{year}{month}{day}", f"{year}-{month}-{day}", "19000101"])
+        })
+    for _ in range(REPORTS // 4):
+        reports.append({"mrn": f"MRN{random.randrange(10**7):07d}", "name": "DOE^JANE", "dateOfBirth": "19700101"})
+    return reports
+
+
+def main(sizes):
+    random.seed(7)
+    print(f"{'patients':>9} {'keys':>14} {'agree':>9} {'exhaustive (ms)':>16} {'blocked (ms)':>13}")
+    for n in sizes:
+        patients = make_patients(n)
+        reports = noisy_reports(patients)
+
+        start = time.perf_counter()
+        manager = PatientManager(patients)
+        expected = [manager.fuzzy_match_patient(r, exhaustive=True) for r in reports]
+        exhaustive = time.perf_counter() - start
+
+        for keys in (("dob", "mrn", "name"), ("dob",), ("mrn", "name")):
+            manager = PatientManager(patients, blocking_keys=keys)
+            start = time.perf_counter()
+            actual = [manager.fuzzy_match_patient(r) for r in reports]
+            blocked = time.perf_counter() - start
+
+            # Same accepted patient (or same rejection) as the exhaustive scorer
+            agree = sum(e[0] is a[0] and (e[0] is None or e[1:] == a[1:]) for e, a in zip(expected, actual))
+            print(f"{n:>9} {'+'.join(keys):>14} {agree:>4}/{len(reports):<4} "
+                  f"{exhaustive / len(reports) * 1e3:>16.2f} {blocked / len(reports) * 1e3:>13.3f}")
+
+        # The batch must give exactly the exhaustive single-report result for every report
+        start = time.perf_counter()
+        batch = manager.fuzzy_match_batch(reports)
+        batched = time.perf_counter() - start
+        same = sum(e[0] is b[0] and e[1:] == b[1:] for e, b in zip(expected, batch))
+        print(f"{n:>9} {'batch':>14} {same:>4}/{len(reports):<4} "
+              f"{exhaustive / len(reports) * 1e3:>16.2f} {batched / len(reports) * 1e3:>13.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 20_000])
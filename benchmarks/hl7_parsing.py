@@ -0,0 +1,78 @@
+# benchmarks/hl7_parsing.py
+# Lazy HL7Message mapping vs the previous split-based parser on large OBX-heavy messages.
+# Run from the repository root:  python -m benchmarks.hl7_parsing [obx counts...]
+import sys
+import time
+from parsing.hl7_message import HL7Message
+from parsing.hl7_parser import _build_report
+
+REPEAT = 5
+
+
+def make_message(obx_count):
+    segments = [
+        "MSH|^~\\&|CARDIAC_DEVICE|HEART_CLINIC|EHR_SYSTEM|HOSPITAL|20240115143000||ORU^R01|MSG001|P|2.5",
+        "PID|1||MRN-2024-001^^^MRN^MR||SMITH^JOHN^MICHAEL||19850315|M|||123 MAIN ST^^CITY^ST^12345",
+        "OBR|1|||HOLTER^24 HOUR HOLTER MONITOR^LN||20240115143000",
+    ]
+    for i in range(obx_count):
+        segments.append(f"OBX|{i + 1}|NM|Heart Rate {i}^Heart Rate^LN|{60 + i % 40}|bpm^beats per minute^UCUM|60-100|N|||F")
+    return "\r".join(segments)
+
+
+def split_parser(text):
+    """The split-based parsing loop parse_hl7_file used before the HL7Message model."""
+    patient_identifiers = {}
+    observations = []
+    for line in text.splitlines():
+        parts = line.split('|')
+        segment = parts[0]
+        if segment == "PID":
+            patient_identifiers = {
+                "mrn": parts[3] if len(parts) > 3 else None,
+                "name": parts[5] if len(parts) > 5 else None,
+                "dateOfBirth": parts[7] if len(parts) > 7 else None
+            }
+        elif segment == "OBX":
+            code = parts[3].split('^')[0] if len(parts) > 3 and parts[3] else None
+            observations.append({
+                "code": code,
+                "value": parts[4] if len(parts) > 4 else None,
+                "unit": parts[5] if len(parts) > 6 else None,
+                "referenceRange": parts[6] if len(parts) > 7 else None,
+                "abnormalFlag": parts[7] if len(parts) > 8 else None,
+            })
+    return patient_identifiers, observations
+
+
+def split_identifiers(text):
+    for line in text.splitlines():
+        parts = line.split('|')
+        if parts[0] == "PID":
+            return parts[3], parts[5], parts[7]
+
+
+def lazy_identifiers(text):
+    pid = HL7Message(text).segment("PID")
+    return pid.field(3).text(), pid.field(5).text(), pid.field(7).value()
+
+
+def timed(fn, text):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def main(sizes):
+    print(f"{'OBX':>7} {'split full (ms)':>16} {'lazy full (ms)':>15} {'split PID (ms)':>15} {'lazy PID (ms)':>14}")
+    for n in sizes:
+        text = make_message(n)
+        print(f"{n:>7} {timed(split_parser, text):>16.2f} {timed(lambda t: _build_report(HL7Message(t)), text):>15.2f} "
+              f"{timed(split_identifiers, text):>15.3f} {timed(lazy_identifiers, text):>14.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100, 1_000, 10_000, 100_000])
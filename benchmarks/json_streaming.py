@@ -0,0 +1,78 @@
+# benchmarks/json_streaming.py
+# Listing patients from a patients.json with inline transmissions: json.load of the whole file vs the streaming reader.
+# Run from the repository root:  python -m benchmarks.json_streaming [patient counts...]
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import tempfile
+import tracemalloc
+from Auth.storage import INLINE_COUNT, load_snapshot_summaries
+
+TRANSMISSIONS = 20
+OBSERVATIONS = 10
+
+
+def make_patients(n, transmissions):
+    patients = []
+    for i in range(n):
+        patient = {"patientID": str(uuid.uuid4()), "MRN": f"MRN{i:07d}", "Name": f"Patient {i}", "DOB": "01/01/1970",
+                   "AssignedDoctor": f"doctor{i % 20}"}
+        if transmissions:
+            patient["Transmissions"] = [{"reportId": str(uuid.uuid4()), "reportDate": "20240115143000", "observations": [
+                {"code": f"Code {k}", "value": str(random.randint(50, 120)), "unit": "bpm", "referenceRange": "60-100",
+                 "abnormalFlag": "N"} for k in range(OBSERVATIONS)]} for _ in range(transmissions)]
+        else:  # compacted: the reports live in per-patient shards
+            patient["TransmissionCount"] = 0
+        patients.append(patient)
+    return patients
+
+
+def whole_file(path):
+    # What listing did before: parse everything, then drop the transmissions
+    with open(path, "r") as f:
+        patients = json.load(f)
+    summaries = []
+    for p in patients:
+        summary = {k: v for k, v in p.items() if k != "Transmissions"}
+        summary.setdefault("TransmissionCount", len(p.get("Transmissions") or []))
+        summaries.append(summary)
+    return summaries
+
+
+def measured(fn, *args):
+    # Timed without tracing, then run again under tracemalloc for the peak
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = (time.perf_counter() - start) * 1e3
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main(sizes):
+    random.seed(7)
+    print(f"{'patients':>8} {'transmissions':>13} {'file (MB)':>9} {'json.load (ms)':>14} {'peak (MB)':>9} "
+          f"{'stream (ms)':>11} {'peak (MB)':>9} {'same':>5}")
+    for n in sizes:
+        for transmissions in (TRANSMISSIONS, 0):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "patients.json")
+                with open(path, "w") as f:
+                    json.dump(make_patients(n, transmissions), f, indent=4)
+                size = os.path.getsize(path) / 2 ** 20
+                loaded, loaded_peak, expected = measured(whole_file, path)
+                streamed, streamed_peak, summaries = measured(load_snapshot_summaries, path)
+                for p in summaries:
+                    p.pop(INLINE_COUNT, None)
+                print(f"{n:>8} {n * transmissions:>13} {size:>9.1f} {loaded:>14.0f} {loaded_peak:>9.1f} "
+                      f"{streamed:>11.0f} {streamed_peak:>9.1f} {str(summaries == expected):>5}")
+    print("(peak: Python allocations while reading, from tracemalloc; the file itself is memory-mapped)")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 5_000])
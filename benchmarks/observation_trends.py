@@ -0,0 +1,83 @@
+# benchmarks/observation_trends.py
+# "Heart rate over the last year" for one patient: walking stored transmissions vs the observation store.
+# Run from the repository root:  python -m benchmarks.observation_trends [transmission counts...]
+import os
+import sys
+import time
+import uuid
+import random
+import tempfile
+from unittest import mock
+from Auth.storage import SqliteStorage
+from Auth.observations import ObservationStore, numeric_value, report_epoch
+from Auth import observations
+
+YEAR = 365 * 86400
+
+
+def make_reports(n):
+    reports = []
+    start = report_epoch("20150101")
+    for _ in range(n):
+        epoch = start + random.randrange(10 * YEAR)
+        date = time.strftime("%Y%m%d%H%M%S", time.gmtime(epoch))
+        reports.append({"reportId": str(uuid.uuid4()), "reportDate": date, "observations": [
+            {"code": "Heart Rate", "value": str(random.randint(50, 120)), "unit": "bpm^beats per minute^UCUM"},
+            {"code": "QRS Duration", "value": str(random.randint(80, 120)), "unit": "ms^milliseconds^UCUM"},
+            {"code": "Rhythm", "value": "Normal Sinus Rhythm"},
+        ]})
+    return reports
+
+
+def walk_transmissions(storage, patient_id, start, end):
+    # Without the store: every transmission body is loaded and parsed
+    values = []
+    for report in storage.transmissions_for_patient(patient_id):
+        epoch = report_epoch(report.get("reportDate"))
+        if epoch is None or not start <= epoch < end:
+            continue
+        for obs in report.get("observations") or []:
+            if obs.get("code") == "Heart Rate" and numeric_value(obs.get("value")) is not None:
+                values.append(numeric_value(obs.get("value")))
+    return {"count": len(values), "min": min(values), "max": max(values), "mean": sum(values) / len(values)}
+
+
+def store_query(store, patient_id, start, end):
+    summary = store.summary(patient_id, "heart_rate", start, end)
+    store.windows(patient_id, "heart_rate", YEAR // 12, start, end)
+    store.last(patient_id, "heart_rate", 10)
+    return summary
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1e3, result
+
+
+def main(sizes):
+    random.seed(7)
+    print(f"{'transmissions':>13} {'walk (ms)':>10} {'store build (ms)':>17} {'store query (ms)':>17} {'same':>5}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = SqliteStorage(os.path.join(tmp, "patients.db"))
+            patient_id = str(uuid.uuid4())
+            storage.insert_patient({"patientID": patient_id, "MRN": "MRN0000001", "Name": "Bench Patient",
+                                    "DOB": "01/01/1970", "AssignedDoctor": "doctor0"})
+            storage.add_transmissions([(patient_id, r) for r in make_reports(n)])
+            end = report_epoch("20250101")
+            start = end - YEAR
+
+            walk, expected = timed(walk_transmissions, storage, patient_id, start, end)
+            store = ObservationStore(os.path.join(tmp, "observations"))
+            with mock.patch.object(observations, "get_storage", return_value=storage):
+                build, _ = timed(store.rebuild, patient_id)  # one-time backfill from storage
+            query, actual = timed(store_query, store, patient_id, start, end)
+            same = expected["count"] == actual["count"] and abs(expected["mean"] - actual["mean"]) < 1e-9
+            print(f"{n:>13} {walk:>10.1f} {build:>17.1f} {query:>17.3f} {str(same):>5}")
+            storage.conn.close()
+    print("(store query: last-year summary + 12 monthly windows + last 10 values)")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 50_000])
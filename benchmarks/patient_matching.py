@@ -0,0 +1,66 @@
+# benchmarks/patient_matching.py
+# Exact-match cost of PatientManager.match_patient as the registry grows.
+# Run from the repository root:  python -m benchmarks.patient_matching [sizes...]
+import io
+import sys
+import time
+import random
+import contextlib
+from Auth.patient_management import Patient, PatientManager
+
+FIRST = ["sarah", "john", "patricia", "carlos", "maria", "james", "linda", "robert", "anna", "david"]
+LAST = ["johnson", "smith", "brown", "martinez", "wilson", "garcia", "lee", "clark", "lopez", "young"]
+LOOKUPS = 2000
+
+
+def letters(i):
+    # Unique alphabetic suffix per patient, since name normalization drops digits
+    out = ""
+    while True:
+        i, r = divmod(i, 26)
+        out += chr(ord("a") + r)
+        if not i:
+            return out
+
+
+def make_patients(n):
+    patients = []
+    for i in range(n):
+        name = f"{FIRST[i % 10].title()} {LAST[(i // 10) % 10].title()}{letters(i)}"
+        dob = f"{(i % 12) + 1:02d}/{13 + i % 15:02d}/{1940 + i % 60}"  # day > 12: unambiguous
+        patients.append(Patient(f"MRN{i:07d}", name, dob, "doctorBench", patientID=str(i), Transmissions=[]))
+    return patients
+
+
+def report_identifiers(patients):
+    # HL7-style identifiers for random registry members, half looked up by MRN, half by name+DOB
+    lookups = []
+    for p in random.sample(patients, min(LOOKUPS, len(patients))):
+        first, last = p.Name.split(" ")
+        month, day, year = p.DOB.split("/")
+        mrn = f"MRN-{p.MRN[3:7]}-{p.MRN[7:]}^^^MRN^MR" if len(lookups) % 2 == 0 else ""
+        lookups.append((mrn, f"{first.upper()}^{last.upper()}", f"{year}{month}{day}"))
+    return lookups
+
+
+def main(sizes):
+    random.seed(42)
+    print(f"{'patients':>10} {'index build (s)':>16} {'per match (us)':>15}")
+    for n in sizes:
+        patients = make_patients(n)
+        lookups = report_identifiers(patients)
+
+        start = time.perf_counter()
+        manager = PatientManager(patients)
+        build = time.perf_counter() - start
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for mrn, name, dob in lookups:
+                assert manager.match_patient(mrn, name, dob) is not None
+            elapsed = time.perf_counter() - start
+        print(f"{n:>10} {build:>16.2f} {elapsed / len(lookups) * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000, 1_000_000])
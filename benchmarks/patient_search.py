@@ -0,0 +1,109 @@
+# benchmarks/patient_search.py
+# Doctor patient search: substring scan over the doctor's patients vs the n-gram search index.
+# Run from the repository root:  python -m benchmarks.patient_search [panel sizes...]
+import os
+import sys
+import time
+import uuid
+import random
+import tempfile
+from unittest import mock
+from Auth.storage import SqliteStorage
+from Auth.search_index import SearchIndex
+from Auth import search_index
+
+# Other doctors' patients in the registry, per patient on the measured panel
+OTHER_DOCTORS = 4
+FIRST = ["Anna", "Besnik", "Drita", "Luan", "Mira", "Arben", "Elira", "Gent", "Valbona", "Shpend", "Teuta", "Ilir"]
+LAST = ["Hoxha", "Krasniqi", "Berisha", "Gashi", "Shala", "Morina", "Kelmendi", "Rexhepi", "Bytyqi", "Zeqiri"]
+
+
+def fill(storage, panel_size):
+    random.seed(panel_size)
+    records = []
+    for i in range(panel_size * (OTHER_DOCTORS + 1)):
+        records.append({
+            "patientID": str(uuid.UUID(int=random.getrandbits(128))), "MRN": f"MRN{random.randrange(10**7):07d}",
+            # a made-up third word makes most names unique enough to look one patient up
+            "Name": f"{random.choice(FIRST)} {random.choice(LAST)} "
+                    + "".join(random.choice("aeioubcdfgklmnprstvz") for _ in range(6)),
+            "DOB": "01/01/1970", "AssignedDoctor": f"doctor{i % (OTHER_DOCTORS + 1)}"
+        })
+    storage.import_records(records)
+    return [r for r in records if r["AssignedDoctor"] == "doctor0"]
+
+
+def linear_search(storage, query):
+    # What search_patients_for_doctor did before the index
+    assigned = storage.doctor_panel("doctor0")[0]
+    results = [p for p in assigned if query in p["MRN"].lower()]
+    return results or [p for p in assigned if query in p["Name"].lower()]
+
+
+def first_upload_counts():
+    """Store a report before the index exists, as the first upload does; its count must match storage."""
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SqliteStorage(os.path.join(tmp, "patients.db"))
+        patient = fill(storage, 10)[0]
+        storage.add_transmission(patient["patientID"], {"reportId": "R1", "reportDate": "20240115143000"})
+        index = SearchIndex(os.path.join(tmp, "search"))
+        with mock.patch.object(search_index, "get_storage", return_value=storage):
+            index.add_reports([(patient, None)])
+            # The second upload, once the index exists
+            storage.add_transmission(patient["patientID"], {"reportId": "R2", "reportDate": "20240116143000"})
+            index.add_reports([(patient, None)])
+        found = [p for p in index.search("doctor0", patient["MRN"][3:]) if p["patientID"] == patient["patientID"]]
+        ok = found[0]["TransmissionCount"] == len(storage.transmission_headers(patient["patientID"]))
+        storage.conn.close()
+        return ok
+
+
+def typo(word):
+    i = random.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]  # swap two letters
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1e3, result
+
+
+def main(sizes):
+    print(f"{'panel':>7} {'build (ms)':>11} {'first query (ms)':>17} {'linear (ms)':>12} {'index (ms)':>11} "
+          f"{'same':>5} {'typo found':>11} {'typo (ms)':>10}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = SqliteStorage(os.path.join(tmp, "patients.db"))
+            panel = fill(storage, n)
+            index = SearchIndex(os.path.join(tmp, "search"))
+            with mock.patch.object(search_index, "get_storage", return_value=storage):
+                build, _ = timed(index._ensure_index)
+            first, _ = timed(index.search, "doctor0", "anna")  # loads the doctor's postings
+            queries = [p["Name"].split()[-1] for p in random.sample(panel, 20)] + \
+                      [p["MRN"][5:] for p in random.sample(panel, 20)] + \
+                      [p["Name"].split()[-1][2:4] for p in random.sample(panel, 5)]  # mid-word, short
+            linear = indexed = 0.0
+            same = True
+            for q in queries:
+                t, expected = timed(linear_search, storage, q)
+                linear += t
+                t, actual = timed(index.search, "doctor0", q)
+                indexed += t
+                exact = [p for p in actual if q in p["Name"].lower() or q in p["MRN"]]
+                same &= {p["patientID"] for p in expected} == {p["patientID"] for p in exact}
+            sample = random.sample(panel, 20)
+            found, typo_ms = 0, 0.0
+            for p in sample:
+                t, results = timed(index.search, "doctor0", typo(p["Name"].split()[-1]))
+                typo_ms += t
+                found += p["patientID"] in [r["patientID"] for r in results]
+            print(f"{n:>7} {build:>11.1f} {first:>17.1f} {linear / len(queries):>12.2f} "
+                  f"{indexed / len(queries):>11.3f} {str(same):>5} {found:>8}/20 {typo_ms / len(sample):>10.2f}")
+            storage.conn.close()
+    print(f"first upload counted once: {first_upload_counts()}")
+    print("(linear / index: mean per query over 20 name, 20 MRN and 5 two-letter substrings; typo: one swapped letter pair)")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
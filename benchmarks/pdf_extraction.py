@@ -0,0 +1,107 @@
+# benchmarks/pdf_extraction.py
+# PDF text extraction per backend on the bundled PDFs; on a large report with its fields on page 1:
+# full serial vs page-parallel extraction, and parse_pdf_report, which stops once every field is found.
+# Also checks field extraction on generated single-page layouts against one re.search per field.
+# Run from the repository root:  python -m benchmarks.pdf_extraction [pages of the large document]
+import os
+import re
+import sys
+import glob
+import time
+import tempfile
+from parsing.pdf_backends import available_backends, get_pdf_backend, extract_text, pymupdf
+from parsing.pdf_parser import parse_pdf_report, IDENTIFIER_FIELDS, OBSERVATION_FIELDS
+
+REPEAT = 3
+
+# Page layouts generated as PDFs; labels sharing a line must still all be found
+LAYOUTS = {
+    "one field per line": "Patient Name: John Doe\nMRN: MRN-1234567\nDate of Birth: 01/15/1985\n"
+                          "Report Date: 08/22/2023\nHeart Rate: 72 bpm\nRhythm: Sinus",
+    "two fields per line": "Patient Name: John Doe   MRN: MRN-1234567\n"
+                           "Date of Birth: 01/15/1985 Report Date: 08/22/2023\nHeart Rate: 72 bpm   Rhythm: Sinus",
+}
+
+
+def timed(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3, result
+
+
+def make_large_pdf(first, filler, pages):
+    """`first` followed by repeats of `filler` up to `pages` pages (needs PyMuPDF)."""
+    path = os.path.join(tempfile.mkdtemp(), "large.pdf")
+    with pymupdf.open(filler) as src, pymupdf.open(first) as out:
+        while out.page_count < pages:
+            out.insert_pdf(src, to_page=min(src.page_count, pages - out.page_count) - 1)
+        out.save(path)
+    return path
+
+
+def make_layout_pdf(text):
+    path = os.path.join(tempfile.mkdtemp(), "layout.pdf")
+    with pymupdf.open() as doc:
+        doc.new_page().insert_text((50, 72), text, fontsize=11)
+        doc.save(path)
+    return path
+
+
+def per_field_values(text):
+    # One re.search per field over the whole text, as parse_pdf_report did before the single pass
+    values = {}
+    for f in IDENTIFIER_FIELDS + OBSERVATION_FIELDS:
+        match = re.search(f["pattern"], text, re.IGNORECASE)
+        if match:
+            values[f.get("key") or f["code"]] = match.group(1).strip()
+    return values
+
+
+def check_layouts(backends):
+    print(f"\n{'layout':>28} {'backend':>8} {'fields':>7} {'same as per-field search':>25}")
+    for layout, text in LAYOUTS.items():
+        path = make_layout_pdf(text)
+        for name in backends:
+            report, _ = parse_pdf_report(path, backend=name, workers=1)
+            values = {}
+            if report:
+                values = {k: v for k, v in report["patientIdentifiers"].items() if v}
+                if report["reportDate"]:
+                    values["reportDate"] = report["reportDate"]
+                values.update({o["code"]: o["value"] for o in report["observations"]})
+            expected = per_field_values(extract_text(path, get_pdf_backend(name), workers=1))
+            print(f"{layout:>28} {name:>8} {len(values):>7} {str(values == expected):>25}")
+
+
+def main(large_pages):
+    backends = available_backends()
+    print(f"{'file':>28} {'backend':>8} {'pages':>6} {'chars':>7} {'extract (ms)':>13} {'parsed':>7}")
+    for path in sorted(glob.glob("reports/*.pdf")):
+        for name in backends:
+            backend = get_pdf_backend(name)
+            ms, text = timed(lambda: extract_text(path, backend, workers=1))
+            report, _ = parse_pdf_report(path, backend=name, workers=1)
+            print(f"{os.path.basename(path):>28} {name:>8} {backend.page_count(path):>6} {len(text):>7} "
+                  f"{ms:>13.1f} {'yes' if report else 'no':>7}")
+
+    if pymupdf is None:
+        print("\nPyMuPDF not installed: skipping the layout check and the page-parallel comparison.")
+        return
+    check_layouts(backends)
+    large = make_large_pdf("reports/reportdata.pdf", "reports/medical-report.pdf", large_pages)
+    workers = max(2, os.cpu_count() or 1)
+    print(f"\n{large_pages}-page document, {workers} worker processes, {os.cpu_count()} CPUs")
+    print(f"{'backend':>8} {'serial (ms)':>12} {'parallel (ms)':>14} {'same text':>10} {'parse (ms)':>11}")
+    for name in backends:
+        backend = get_pdf_backend(name)
+        serial_ms, serial = timed(lambda: extract_text(large, backend, workers=1))
+        parallel_ms, parallel = timed(lambda: extract_text(large, backend, workers, min_parallel_pages=1))
+        parse_ms, _ = timed(lambda: parse_pdf_report(large, backend=name))
+        print(f"{name:>8} {serial_ms:>12.1f} {parallel_ms:>14.1f} {str(serial == parallel):>10} {parse_ms:>11.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if sys.argv[1:] else 500)
@@ -0,0 +1,88 @@
+# benchmarks/recent_transmissions.py
+# "Recent transmissions" for one doctor: full scan + sort vs a page from the time index.
+# Run from the repository root:  python -m benchmarks.recent_transmissions [sizes...]
+import os
+import sys
+import time
+import uuid
+import random
+import tempfile
+from datetime import datetime
+from Auth.storage import SqliteStorage, JsonStorage
+from Auth.doctor_dashboard import PAGE_SIZE
+
+DOCTORS = 20
+PATIENTS_PER_DOCTOR = 50
+PAGES = 10
+
+
+def fill(storage, transmissions):
+    patients = [{"patientID": str(uuid.uuid4()), "MRN": f"MRN{i:07d}", "Name": f"Patient {i}", "DOB": "01/01/1970",
+                 "AssignedDoctor": f"doctor{i % DOCTORS}"} for i in range(DOCTORS * PATIENTS_PER_DOCTOR)]
+    for p in patients:
+        storage.insert_patient(p)
+    items = []
+    for _ in range(transmissions):
+        date = f"20{random.randint(10, 24)}{random.randint(1, 12):02d}{random.randint(1, 28):02d}{random.randint(0, 23):02d}0000"
+        items.append((random.choice(patients)["patientID"], {"reportId": str(uuid.uuid4()), "reportDate": date,
+                                                               "observations": []}))
+    for i in range(0, len(items), 1000):
+        storage.add_transmissions(items[i:i + 1000])
+
+
+def full_sort(storage, doctor):
+    # What list_recent_transmissions did before the index
+    def sort_key(s):
+        try:
+            return datetime.strptime(s, "%Y%m%d%H%M%S")
+        except Exception:
+            try:
+                return datetime.strptime(s, "%Y%m%d")
+            except Exception:
+                return datetime.min
+    rows = [(p, t) for p in storage.doctor_panel(doctor)[0] for t in storage.transmission_headers(p["patientID"])]
+    rows.sort(key=lambda pair: sort_key(pair[1]["reportDate"]), reverse=True)
+    return rows[:PAGE_SIZE]
+
+
+def paged(storage, doctor, pages):
+    cursor, page = None, []
+    for _ in range(pages):
+        page = storage.recent_transmissions(doctor, PAGE_SIZE, cursor)
+        cursor = page[-1][1]["cursor"]
+    return page
+
+
+def timed(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(sizes):
+    random.seed(7)
+    print(f"{'backend':>7} {'transmissions':>13} {'full sort (ms)':>15} {'page 1 (ms)':>12} "
+          f"{f'{PAGES} pages (ms)':>13} {'same':>5}")
+    for n in sizes:
+        for name in ("sqlite", "json"):
+            with tempfile.TemporaryDirectory() as tmp:
+                if name == "sqlite":
+                    storage = SqliteStorage(os.path.join(tmp, "patients.db"))
+                else:
+                    storage = JsonStorage(os.path.join(tmp, "patients.json"))
+                fill(storage, n)
+                storage.recent_transmissions("doctor0", 1)  # load the index once (JSON)
+                full, expected = timed(full_sort, storage, "doctor0", repeat=1 if name == "json" else 3)
+                first, page = timed(paged, storage, "doctor0", 1)
+                tenth, _ = timed(paged, storage, "doctor0", PAGES)
+                same = [t["reportDate"] for _, t in expected] == [t["reportDate"] for _, t in page]
+                print(f"{name:>7} {n:>13} {full * 1e3:>15.1f} {first * 1e3:>12.3f} {tenth * 1e3:>13.3f} {str(same):>5}")
+                if name == "sqlite":
+                    storage.conn.close()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
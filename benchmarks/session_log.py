@@ -0,0 +1,73 @@
+# benchmarks/session_log.py
+# One login's audit write: rewriting session.json vs appending to the session log; plus a user/time-range query.
+# Run from the repository root:  python -m benchmarks.session_log [history sizes...]
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+from Auth import session_log
+from Auth.session_log import SessionLog
+
+LOGINS = 20
+USERS = 50
+
+
+def history(n):
+    start = datetime(2020, 1, 1)
+    return [{"username": f"user{random.randrange(USERS)}", "role": "doctor",
+             "loggedinAt": (start + timedelta(minutes=10 * i)).strftime("%Y-%m-%d %H:%M:%S")} for i in range(n)]
+
+
+def rewrite_login(path, entry):
+    # What login() did before the session log
+    with open(path, "r") as f:
+        logs = json.load(f)
+    logs.append(entry)
+    with open(path, "w") as f:
+        json.dump(logs, f, indent=4)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1e3, result
+
+
+def main(sizes):
+    random.seed(7)
+    print(f"{'history':>8} {'rewrite (ms)':>13} {'append (ms)':>12} {'import (ms)':>12} "
+          f"{'query scan (ms)':>16} {'query range (ms)':>17} {'found':>6}")
+    for n in sizes:
+        entries = history(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = os.path.join(tmp, "session.json")
+            with open(legacy, "w") as f:
+                json.dump(entries, f, indent=4)
+            log = SessionLog(os.path.join(tmp, "sessions"), legacy)
+            imported, _ = timed(log._ensure_dir)  # one-time import of session.json
+
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            rewrite = sum(timed(rewrite_login, legacy, {"username": "user0", "role": "doctor", "loggedinAt": now})[0]
+                          for _ in range(LOGINS)) / LOGINS
+            append = sum(timed(log.append, {"username": "user0", "role": "doctor", "loggedinAt": now})[0]
+                         for _ in range(LOGINS)) / LOGINS
+
+            # Closed segments of ~10k entries each, as size-based rotation would leave them
+            for name in os.listdir(log.base_dir):
+                if name != "current.jsonl":
+                    os.remove(os.path.join(log.base_dir, name))
+            for i in range(0, n, 10_000):
+                log._write_segment(log.base_dir, entries[i:i + 10_000])
+
+            scan, _ = timed(lambda: sum(1 for _ in log.query("user7")))
+            day = entries[n // 2]["loggedinAt"][:10]
+            ranged, found = timed(lambda: sum(1 for _ in log.query("user7", f"{day} 00:00:00", f"{day} 23:59:59")))
+            print(f"{n:>8} {rewrite:>13.2f} {append:>12.3f} {imported:>12.1f} {scan:>16.1f} {ranged:>17.2f} {found:>6}")
+    print(f"(append includes the rotation check; gzip closed segments: {session_log.SESSION_GZIP})")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 100_000])
@@ -0,0 +1,183 @@
+import re
+
+# One segment per run of non-terminator characters; CR, LF and CRLF all end a segment
+SEGMENT_RE = re.compile(r"[^\r\n]+")
+
+STANDARD_DELIMITERS = ("|", "^", "~", "\\", "&")
+
+
+class HL7Message:
+    """
+    Lazy view over one HL7 v2 message held in a single string buffer.
+
+    Delimiters come from MSH-1 (field separator) and MSH-2 (component,
+    repetition, escape and subcomponent characters). Segments are located as
+    offsets while iterating, so a lookup such as the PID stops reading at that
+    segment. A segment is split into fields only when one of its fields is
+    read, and escape sequences are decoded only on request.
+    """
+
+    def __init__(self, text, line_numbers=None):
+        self.buf = text
+        self.line_numbers = line_numbers  # source line of each segment, if known
+        field, component, repetition, escape, subcomponent = STANDARD_DELIMITERS
+        msh2_end = 0
+        if text.startswith("MSH") and len(text) > 4:
+            field = text[3]
+            encoding = SEGMENT_RE.match(text).group()[4:].split(field, 1)[0]
+            msh2_end = 4 + len(encoding)
+            chars = list(encoding[:4]) + list(STANDARD_DELIMITERS[1 + len(encoding[:4]):])
+            component, repetition, escape, subcomponent = chars
+        self.field_sep = field
+        self.component_sep = component
+        self.repetition_sep = repetition
+        self.escape_char = escape
+        self.subcomponent_sep = subcomponent
+        delimiters = (field, component, repetition, escape, subcomponent)
+        # Non-standard delimiters are translated back to |^~\& when text is read
+        self._canonical = None
+        if delimiters != STANDARD_DELIMITERS:
+            self._canonical = str.maketrans("".join(delimiters[1:]), "".join(STANDARD_DELIMITERS[1:]))
+        # Standard delimiters and no escape character after MSH-2: raw field text is already final
+        self.plain = self._canonical is None and text.find(escape, msh2_end) == -1
+        self._segments = []
+        self._scanner = SEGMENT_RE.finditer(text)
+
+    def segments(self, segment_id=None):
+        """Iterate segments in order, optionally only those with the given ID."""
+        found = self._segments
+        index = 0
+        while True:
+            if index == len(found):
+                match = next(self._scanner, None)
+                if match is None:
+                    return
+                if match.group().isspace():
+                    continue
+                found.append(Segment(self, index, *match.span()))
+            seg = found[index]
+            index += 1
+            if segment_id is None or seg.id == segment_id:
+                yield seg
+
+    def segment(self, segment_id):
+        return next(self.segments(segment_id), None)
+
+    def text(self, raw):
+        """Raw field text with standard ^~\\& delimiters; escapes stay encoded."""
+        return raw.translate(self._canonical) if self._canonical else raw
+
+    def unescape(self, value):
+        """Decode \\F\\ \\S\\ \\T\\ \\R\\ \\E\\ \\Xhh\\ and \\.br\\ escape sequences."""
+        esc = self.escape_char
+        if esc not in value:
+            return value
+        replacements = {"F": self.field_sep, "S": self.component_sep, "T": self.subcomponent_sep,
+                        "R": self.repetition_sep, "E": esc, ".br": "\n"}
+        out = []
+        i = 0
+        while True:
+            j = value.find(esc, i)
+            k = value.find(esc, j + 1) if j != -1 else -1
+            if k == -1:
+                out.append(value[i:])
+                return "".join(out)
+            out.append(value[i:j])
+            sequence = value[j + 1:k]
+            if sequence in replacements:
+                out.append(replacements[sequence])
+            elif sequence.startswith("X"):
+                try:
+                    out.append(bytes.fromhex(sequence[1:]).decode("latin-1"))
+                except ValueError:
+                    out.append(value[j:k + 1])
+            else:
+                out.append(value[j:k + 1])
+            i = k + 1
+
+
+class Segment:
+    """One segment of an HL7Message: buffer offsets, split into fields on first access."""
+
+    __slots__ = ("message", "index", "start", "end", "_parts")
+
+    def __init__(self, message, index, start, end):
+        self.message = message
+        self.index = index
+        self.start = start
+        self.end = end
+        self._parts = None
+
+    @property
+    def id(self):
+        buf = self.message.buf
+        stop = buf.find(self.message.field_sep, self.start, self.end)
+        return buf[self.start:self.end if stop == -1 else stop]
+
+    @property
+    def line_number(self):
+        if self.message.line_numbers:
+            return self.message.line_numbers[self.index]
+        buf = self.message.buf
+        terminator = "\n" if "\n" in buf else "\r"
+        return buf.count(terminator, 0, self.start) + 1
+
+    def text(self):
+        return self.message.buf[self.start:self.end]
+
+    def has_fields(self):
+        return self.message.buf.find(self.message.field_sep, self.start, self.end) != -1
+
+    def parts(self):
+        """Separator-delimited parts, [0] being the segment ID (split once, then cached)."""
+        if self._parts is None:
+            self._parts = self.message.buf[self.start:self.end].split(self.message.field_sep)
+        return self._parts
+
+    def raw(self, n):
+        """
+        Raw text of HL7 field n (1-based), or None if the segment is shorter.
+        For MSH, field 1 is the field separator itself, as in the standard numbering.
+        """
+        if self.message.buf.startswith("MSH", self.start):
+            if n == 1:
+                return self.message.field_sep
+            n -= 1
+        parts = self.parts()
+        return parts[n] if n < len(parts) else None
+
+    def field(self, n):
+        raw = self.raw(n)
+        return Field(self.message, raw) if raw is not None else None
+
+
+class Field:
+    """One field's raw text with repetition/component access on demand."""
+
+    __slots__ = ("message", "raw")
+
+    def __init__(self, message, raw):
+        self.message = message
+        self.raw = raw
+
+    def text(self):
+        """Field contents with standard ^~\\& delimiters and escapes left encoded."""
+        return self.message.text(self.raw)
+
+    def value(self):
+        """Field contents with escape sequences decoded."""
+        return self.message.unescape(self.raw)
+
+    def repetitions(self):
+        return [Field(self.message, r) for r in self.raw.split(self.message.repetition_sep)]
+
+    def components(self):
+        """All decoded components of the first repetition."""
+        first = self.raw.split(self.message.repetition_sep, 1)[0]
+        return [self.message.unescape(c) for c in first.split(self.message.component_sep)]
+
+    def component(self, i):
+        """Decoded component i (1-based) of the first repetition, "" if absent."""
+        first = self.raw.split(self.message.repetition_sep, 1)[0]
+        components = first.split(self.message.component_sep, i)
+        return self.message.unescape(components[i - 1]) if i <= len(components) else ""
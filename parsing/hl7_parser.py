@@ -1,68 +1,85 @@
 import os
 import uuid
+from .hl7_message import HL7Message
 
-def parse_hl7_file(file_path):
-    errors = []
+# Batch envelope segments (file/batch header and trailer) carry no report data
+BATCH_SEGMENTS = ("FHS", "BHS", "BTS", "FTS")
+# Segments we read, plus ones that are valid in our messages but not needed
+KNOWN_SEGMENTS = ("MSH", "PID", "OBX", "OBR", "PV1", "ORC", "NTE", "EVN", "PD1", "NK1") + BATCH_SEGMENTS
 
-    # File exists
-    if not os.path.exists(file_path):
-        return None, ["ERROR: File not found."]
 
-    # Safe UTF-8
-    try:
-        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.read().splitlines()
-    except Exception:
-        return None, ["ERROR: Could not read HL7 file — invalid encoding."]
+def _message(segments):
+    """Join one message's (line number, segment) pairs into a single HL7Message buffer."""
+    return HL7Message("\r".join(line for _, line in segments), [i for i, _ in segments])
 
-    if not lines:
-        return None, ["ERROR: HL7 file is empty."]
 
-    report_id = str(uuid.uuid4())
+def _read_segments(file_path):
+    """
+    Yield (line number, segment) pairs one at a time. Universal-newline mode
+    treats CR, LF and CRLF alike, so memory use does not depend on file size.
+    """
+    with open(file_path, "r", encoding="utf-8", errors="replace", newline=None) as f:
+        for i, line in enumerate(f, start=1):
+            line = line.rstrip("\n")
+            if line.strip():
+                yield i, line
+
+
+def _build_report(message):
+    """Map one HL7Message onto our report dict. Returns (report, errors)."""
+    errors = []
     report_date = None
     message_type = None
+    sender = (None, None)
+    control_id = None
     patient_identifiers = {}
     observations = []
 
+    # Plain messages (standard delimiters, no escapes) use raw field text as-is
+    text, value = (str, str) if message.plain else (message.text, message.unescape)
+
     # --- PARSING ---
-    for i, line in enumerate(lines, start=1):
-        if "|" not in line:
-            errors.append(f"Invalid segment format at line {i}: '{line}'")
+    for seg in message.segments():
+        parts = seg.parts()
+        n = len(parts)
+        if n == 1:
+            errors.append(f"Invalid segment format at line {seg.line_number}: '{seg.text()}'")
             continue
 
-        parts = line.split('|')
         segment = parts[0]
 
         try:
             if segment == "MSH":
-                report_date = parts[6] if len(parts) > 6 else None
-                message_type = parts[8] if len(parts) > 8 else None
+                # parts[k] is MSH-(k+1): MSH-1 is the separator itself
+                report_date = value(parts[6]) if n > 6 else None
+                message_type = text(parts[8]) if n > 8 else None
+                sender = (text(parts[2]) if n > 2 else None, text(parts[3]) if n > 3 else None)
+                control_id = value(parts[9]) if n > 9 else None
 
             elif segment == "PID":
                 patient_identifiers = {
-                    "mrn": parts[3] if len(parts) > 3 else None,
-                    "name": parts[5] if len(parts) > 5 else None,
-                    "dateOfBirth": parts[7] if len(parts) > 7 else None
+                    "mrn": text(parts[3]) if n > 3 else None,
+                    "name": text(parts[5]) if n > 5 else None,
+                    "dateOfBirth": value(parts[7]) if n > 7 else None
                 }
 
             elif segment == "OBX":
-                code = None
-                if len(parts) > 3 and parts[3]:
-                    code = parts[3].split('^')[0]
-
+                # Our senders omit OBX-4 (sub-ID): value, units, range and flags sit one field early
+                identifier = seg.field(3)
+                code = identifier.component(1) or None if identifier else None
                 observations.append({
                     "code": code,
-                    "value": parts[4] if len(parts) > 4 else None,
-                    "unit": parts[5] if len(parts) > 6 else None,
-                    "referenceRange": parts[6] if len(parts) > 7 else None,
-                    "abnormalFlag": parts[7] if len(parts) > 8 else None,
+                    "value": value(parts[4]) if n > 4 else None,
+                    "unit": text(parts[5]) if n > 5 else None,
+                    "referenceRange": text(parts[6]) if n > 6 else None,
+                    "abnormalFlag": value(parts[7]) if n > 7 else None,
                 })
 
-            else:
-                errors.append(f"Unknown segment '{segment}' at line {i}")
+            elif segment not in KNOWN_SEGMENTS:
+                errors.append(f"Unknown segment '{segment}' at line {seg.line_number}")
 
         except Exception:
-            errors.append(f"Corrupted HL7 segment at line {i}: '{line}'")
+            errors.append(f"Corrupted HL7 segment at line {seg.line_number}: '{seg.text()}'")
 
     if not patient_identifiers:
         errors.append("ERROR: PID segment missing.")
@@ -74,11 +91,79 @@ def parse_hl7_file(file_path):
         return None, errors
 
     report = {
-        "reportId": report_id,
+        "reportId": str(uuid.uuid4()),
         "reportDate": report_date,
         "messageType": message_type,
+        "messageControlId": control_id,
+        "sendingApplication": sender[0],
+        "sendingFacility": sender[1],
         "patientIdentifiers": patient_identifiers,
         "observations": observations
     }
 
     return report, errors
+
+
+def parse_hl7_file(file_path):
+    # File exists
+    if not os.path.exists(file_path):
+        return None, ["ERROR: File not found."]
+
+    # Safe UTF-8
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            text = f.read()
+    except Exception:
+        return None, ["ERROR: Could not read HL7 file — invalid encoding."]
+
+    if not text.strip():
+        return None, ["ERROR: HL7 file is empty."]
+
+    return _build_report(HL7Message(text))
+
+
+def parse_hl7_message(text):
+    """Parse one HL7 message already in memory (e.g. received over MLLP)."""
+    if not text.strip():
+        return None, ["ERROR: HL7 message is empty."]
+    return _build_report(HL7Message(text))
+
+
+def iter_hl7_messages(file_path):
+    """
+    Stream an HL7 file that may hold many messages (optionally wrapped in
+    FHS/BHS ... BTS/FTS batch segments), yielding (report, errors) per MSH.
+    Only the current message is held in memory.
+    """
+    if not os.path.exists(file_path):
+        yield None, ["ERROR: File not found."]
+        return
+
+    message = []
+    stray = []
+    found = False
+    try:
+        for i, line in _read_segments(file_path):
+            segment = line[:3]
+            if segment in BATCH_SEGMENTS:
+                continue
+            if segment == "MSH":
+                if message:
+                    yield _build_report(_message(message))
+                elif stray:
+                    yield None, stray
+                    stray = []
+                message = [(i, line)]
+                found = True
+            elif message:
+                message.append((i, line))
+            else:
+                stray.append(f"Segment outside of any message at line {i}: '{line}'")
+    except Exception:
+        yield None, ["ERROR: Could not read HL7 file — invalid encoding."]
+        return
+
+    if message:
+        yield _build_report(_message(message))
+    if not found:
+        yield None, stray + ["ERROR: No MSH segments found."]
@@ -0,0 +1,116 @@
+# parsing/ingest.py
+# Headless bulk ingestion: python -m parsing.ingest <directory> [workers]
+import os
+import sys
+import time
+from .pipeline import IngestPipeline, get_pipeline
+
+REPORT_EXTENSIONS = (".hl7", ".pdf")
+# Confidence below which a fuzzy match is stored with a warning (same as upload-report)
+LOW_CONFIDENCE = 85
+
+
+def find_report_files(dir_path):
+    """All .hl7/.pdf files under dir_path, in a stable order."""
+    found = []
+    for root, _, files in os.walk(dir_path):
+        for name in files:
+            if name.lower().endswith(REPORT_EXTENSIONS):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def ingest_directory(dir_path, workers=None, verbose=True, pipeline=None):
+    """
+    Feed every report under dir_path through the ingestion pipeline (parallel
+    parsing, one in-memory matcher scoring queued reports in batches,
+    group-committed writes) and print a
+    throughput summary. Returns a dict of counts. An explicit workers count
+    runs on a pipeline of its own, closed when done; otherwise the shared one
+    is used.
+    """
+    start = time.perf_counter()
+    files = find_report_files(dir_path)
+    summary = new_summary(len(files))
+    if not files:
+        print(f"ERROR: No .hl7 or .pdf files found in {dir_path}.")
+        return summary
+
+    # The shared pipeline keeps the worker count it was started with
+    own = pipeline is None and workers is not None
+    if own:
+        pipeline = IngestPipeline(workers).start()
+    pipeline = pipeline or get_pipeline()
+    jobs = [pipeline.submit_file(f) for f in files]
+    for job in jobs:
+        tally(job, summary, verbose)
+
+    summary["seconds"] = time.perf_counter() - start
+    print_summary(summary)
+    if verbose:
+        pipeline.print_metrics()
+    if own:
+        pipeline.close()
+    return summary
+
+
+def new_summary(files=0):
+    return {"files": files, "reports": 0, "cached": 0, "duplicates": 0, "exact": 0, "fuzzy": 0,
+            "low_confidence": 0, "rejected": 0, "corrupted": 0, "failed": 0, "stored": 0, "seconds": 0.0}
+
+
+def tally(job, summary, verbose=True):
+    """Wait for a submitted file and add its outcomes to summary."""
+    outcomes = job.wait()
+    summary["cached"] += job.cached
+    for outcome in outcomes:
+        status = outcome["status"]
+        if status == "corrupted":
+            summary["corrupted"] += 1
+            if verbose:
+                print(f"ERROR: {job.source}: {'; '.join(outcome['errors'])}")
+            continue
+        summary["reports"] += 1
+        if status == "duplicate":
+            summary["duplicates"] += 1
+            if verbose:
+                print(f"INFO: {job.source}: duplicate report, skipped.")
+        elif status == "rejected":
+            summary["rejected"] += 1
+            if verbose:
+                print(f"ERROR: {job.source}: no match found above threshold ({outcome['confidence']}%). "
+                      f"Transmission NOT stored.")
+        elif status == "stored":
+            summary["stored"] += 1
+            summary[outcome["match"]] += 1
+            patient = outcome["patient"]
+            if outcome["match"] == "fuzzy" and outcome["confidence"] < LOW_CONFIDENCE:
+                summary["low_confidence"] += 1
+                if verbose:
+                    print(f"WARNING: {job.source}: low confidence match ({outcome['confidence']}%) "
+                          f"to {patient.Name} ({patient.MRN})")
+        else:
+            summary["failed"] += 1
+            print(f"ERROR: {job.source}: failed to store transmission.")
+    return outcomes
+
+
+def print_summary(summary):
+    seconds = summary["seconds"] or 1e-9
+    print(f"\nIngest complete: {summary['files']} files ({summary['reports']} reports) "
+          f"in {summary['seconds']:.2f}s - {summary['files'] / seconds:.1f} files/sec")
+    print(f"  Parse cache hits: {summary['cached']}")
+    print(f"  Duplicates:       {summary['duplicates']}")
+    print(f"  Matched (exact):  {summary['exact']}")
+    print(f"  Matched (fuzzy):  {summary['fuzzy']} ({summary['low_confidence']} low confidence)")
+    print(f"  Rejected:         {summary['rejected']}")
+    print(f"  Corrupted:        {summary['corrupted']}")
+    print(f"  Failed:           {summary['failed']}")
+    print(f"  Stored:           {summary['stored']}")
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:]:
+        print("Usage: python -m parsing.ingest <directory> [workers]")
+        sys.exit(1)
+    ingest_directory(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,101 @@
+# parsing/mllp_client.py
+# Test sender: replays the .hl7 files in a folder to an MLLP listener on localhost.
+# python -m parsing.mllp_client [--rate N] [--connections N] [--repeat N] [--fresh-ids] [--port N] [folder]
+import os
+import time
+import uuid
+import asyncio
+import argparse
+from .hl7_parser import BATCH_SEGMENTS
+from .mllp_listener import START_BLOCK, END_BLOCK, DEFAULT_HOST, DEFAULT_PORT, frame
+
+
+def load_messages(folder):
+    """Every HL7 message in the folder's .hl7 files, segments joined with CR."""
+    messages = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".hl7"):
+            continue
+        with open(os.path.join(folder, name), "r", encoding="utf-8", errors="replace") as f:
+            segments = [line.rstrip("\r\n") for line in f if line.strip()]
+        current = []
+        for segment in segments:
+            if segment[:3] in BATCH_SEGMENTS:
+                continue
+            if segment.startswith("MSH") and current:
+                messages.append("\r".join(current))
+                current = []
+            current.append(segment)
+        if current:
+            messages.append("\r".join(current))
+    return messages
+
+
+def with_fresh_control_id(message):
+    """Replace MSH-10 so the listener sees a new message rather than a resend."""
+    lines = message.split("\r")
+    fields = lines[0].split("|")
+    if len(fields) > 9:
+        fields[9] = uuid.uuid4().hex[:20]
+        lines[0] = "|".join(fields)
+    return "\r".join(lines)
+
+
+async def send_messages(messages, host, port, interval, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for message in messages:
+            started = time.perf_counter()
+            writer.write(frame(message))
+            await writer.drain()
+            data = await reader.readuntil(END_BLOCK)
+            latency = time.perf_counter() - started
+            ack = data.lstrip(START_BLOCK)[:-len(END_BLOCK)].decode("utf-8", errors="replace")
+            msa = next((s.split("|") for s in ack.split("\r") if s.startswith("MSA")), ["MSA", "??"])
+            results.append((msa[1], latency))
+            if interval:
+                await asyncio.sleep(max(0.0, interval - latency))
+    finally:
+        writer.close()
+
+
+async def replay(folder, host, port, rate, connections, repeat, fresh_ids):
+    messages = load_messages(folder) * repeat
+    if fresh_ids:
+        messages = [with_fresh_control_id(m) for m in messages]
+    # Each connection sends its share at rate / connections messages per second
+    interval = connections / rate if rate else 0
+    shares = [messages[i::connections] for i in range(connections)]
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*(send_messages(s, host, port, interval, results) for s in shares if s))
+    elapsed = time.perf_counter() - started
+
+    codes = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+    print(f"Sent {len(results)} messages on {connections} connections in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.1f} msg/sec)")
+    print("ACK codes: " + ", ".join(f"{code}={count}" for code, count in sorted(codes.items())))
+    if latencies:
+        print(f"Latency: p50 {latencies[len(latencies) // 2] * 1e3:.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1e3:.1f} ms, max {latencies[-1] * 1e3:.1f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay HL7 files to an MLLP listener.")
+    parser.add_argument("folder", nargs="?", default="reports")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--rate", type=float, default=0, help="messages per second in total (0 = as fast as ACKs return)")
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="send the folder this many times")
+    parser.add_argument("--fresh-ids", action="store_true", help="new MSH-10 per message so resends are not de-duplicated")
+    args = parser.parse_args()
+    asyncio.run(replay(args.folder, args.host, args.port, args.rate, args.connections, args.repeat, args.fresh_ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# parsing/mllp_listener.py
+# Real-time HL7 over MLLP: python -m parsing.mllp_listener [port] [host]
+import sys
+import uuid
+import signal
+import asyncio
+from datetime import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from .hl7_message import HL7Message
+from .pipeline import get_pipeline
+
+# MLLP framing: <VT> message <FS><CR>
+START_BLOCK = b"\x0b"
+END_BLOCK = b"\x1c\x0d"
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 2575
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+
+def frame(text):
+    return START_BLOCK + text.encode("utf-8") + END_BLOCK
+
+
+def build_ack(message, code, text=""):
+    """HL7 ACK for a received message: MSA-1 is AA (accepted) or AE (error)."""
+    msh = message.segment("MSH")
+
+    def msh_field(n):
+        raw = msh.raw(n) if msh is not None else None
+        return message.text(raw) if raw else ""
+
+    trigger = msh_field(9).split("^")[1] if "^" in msh_field(9) else ""
+    text = "".join(c for c in text if c not in "|^~\\&\r\n")[:80]
+    return "\r".join([
+        f"MSH|^~\\&|HEALTHPLUS|HEALTHPLUS|{msh_field(3)}|{msh_field(4)}|{datetime.now():%Y%m%d%H%M%S}||"
+        f"ACK^{trigger}|{uuid.uuid4().hex[:20]}|P|{msh_field(12) or '2.5'}",
+        f"MSA|{code}|{msh_field(10)}|{text}",
+    ])
+
+
+class MLLPListener:
+    """
+    asyncio MLLP server. Connections are read on the event loop; each message
+    is submitted to the shared ingestion pipeline, and the sender gets its
+    ACK/NAK once the pipeline has stored or rejected it, before its next
+    message is read.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.stats = Counter()
+        self.pipeline = None
+        self.server = None
+        # One submitting thread: while the pipeline's parse queue is full it
+        # blocks, and readers wait on it instead of reading further messages
+        self._submitter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mllp-submit")
+
+    # ACKS
+
+    def acknowledge(self, text, outcome):
+        """ACK text for a message's pipeline outcome."""
+        message = HL7Message(text)
+        status = outcome["status"]
+        self.stats[outcome["match"] if status == "stored" else status] += 1
+        if status == "stored":
+            return build_ack(message, "AA", f"Stored as {outcome['report']['reportId']}")
+        if status == "duplicate":
+            return build_ack(message, "AA", "Duplicate, already stored")
+        if status == "rejected":
+            return build_ack(message, "AE", f"No matching patient ({outcome['confidence']}%)")
+        if status == "corrupted":
+            return build_ack(message, "AE", "; ".join(outcome["errors"]))
+        return build_ack(message, "AE", "Failed to store transmission")
+
+    # EVENT LOOP
+
+    async def process(self, text):
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        job = await loop.run_in_executor(self._submitter, self.pipeline.submit_message, text)
+        job.add_done_callback(lambda j: loop.call_soon_threadsafe(done.set_result, j))
+        outcomes = (await done).outcomes
+        return self.acknowledge(text, outcomes[0])
+
+    async def _handle_connection(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    data = await reader.readuntil(END_BLOCK)
+                except asyncio.IncompleteReadError:
+                    break  # sender closed the connection
+                start = data.find(START_BLOCK)
+                text = data[start + 1 if start != -1 else 0:-len(END_BLOCK)].decode("utf-8", errors="replace")
+                self.stats["received"] += 1
+                try:
+                    ack = await self.process(text)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    ack = build_ack(HL7Message(text), "AE", f"Internal error: {e}")
+                writer.write(frame(ack))
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # Start the pipeline (loads the registry) off the event loop
+        self.pipeline = await loop.run_in_executor(None, get_pipeline)
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                 limit=MAX_MESSAGE_BYTES)
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+        print(f"INFO: MLLP listener on {self.host}:{self.port} (Ctrl+C to stop)")
+        async with self.server:
+            await stop.wait()
+        self._submitter.shutdown(wait=True)
+
+    def print_summary(self):
+        s = self.stats
+        print(f"\nListener stopped: {s['received']} messages on {s['connections']} connections")
+        print(f"  Stored: {s['exact'] + s['fuzzy']} ({s['exact']} exact, {s['fuzzy']} fuzzy)")
+        print(f"  Duplicates: {s['duplicate']}  Rejected: {s['rejected']}  "
+              f"Corrupted: {s['corrupted']}  Failed: {s['failed']}")
+        if self.pipeline:
+            self.pipeline.print_metrics()
+
+
+def run_listener(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    listener = MLLPListener(host, port)
+    try:
+        asyncio.run(listener.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    listener.print_summary()
+
+
+if __name__ == "__main__":
+    run_listener(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_HOST,
+                 int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT)
@@ -0,0 +1,103 @@
+# parsing/pdf_backends.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF before 1.24 only ships the fitz name
+    except ImportError:
+        pymupdf = None
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+# "auto" picks PyMuPDF when installed and falls back to PyPDF2
+PDF_BACKEND = os.environ.get("HEALTHPLUS_PDF_BACKEND", "auto").lower()
+# Documents with at least this many pages are extracted by page range in a process pool
+PARALLEL_MIN_PAGES = 64
+# iter_page_texts() extracts this many leading pages one at a time before going parallel
+LAZY_PAGES = 4
+
+
+class PyMuPDFBackend:
+    name = "pymupdf"
+
+    def page_count(self, path):
+        with pymupdf.open(path) as doc:
+            return doc.page_count
+
+    def iter_pages(self, path, start, stop):
+        with pymupdf.open(path) as doc:
+            for i in range(start, min(stop, doc.page_count)):
+                yield doc[i].get_text()
+
+
+class PyPDF2Backend:
+    name = "pypdf2"
+
+    def page_count(self, path):
+        return len(PyPDF2.PdfReader(path).pages)
+
+    def iter_pages(self, path, start, stop):
+        pages = PyPDF2.PdfReader(path).pages
+        for i in range(start, min(stop, len(pages))):
+            yield pages[i].extract_text()
+
+
+BACKENDS = {"pymupdf": (PyMuPDFBackend, lambda: pymupdf), "pypdf2": (PyPDF2Backend, lambda: PyPDF2)}
+
+
+def available_backends():
+    return [name for name, (_, module) in BACKENDS.items() if module() is not None]
+
+
+def get_pdf_backend(name=None):
+    """Backend instance for name (default: PDF_BACKEND), or None if its library is missing."""
+    name = (name or PDF_BACKEND).lower()
+    if name == "auto":
+        available = available_backends()
+        return BACKENDS[available[0]][0]() if available else None
+    if name not in BACKENDS or BACKENDS[name][1]() is None:
+        return None
+    return BACKENDS[name][0]()
+
+
+def _extract_range(backend_name, path, start, stop):
+    # Runs in a worker process: each worker opens the document itself
+    return list(get_pdf_backend(backend_name).iter_pages(path, start, stop))
+
+
+def _extract_parallel(path, backend, start, stop, workers):
+    step = -(-(stop - start) // workers)
+    ranges = [(first, min(first + step, stop)) for first in range(start, stop, step)]
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        chunks = pool.map(_extract_range, [backend.name] * len(ranges), [path] * len(ranges),
+                          [r[0] for r in ranges], [r[1] for r in ranges])
+        for chunk in chunks:
+            yield from chunk
+
+
+def iter_page_texts(path, backend, workers=None, lazy_pages=LAZY_PAGES, min_parallel_pages=PARALLEL_MIN_PAGES):
+    """
+    Yield page texts in order, extracting only as far as the caller reads.
+    The first lazy_pages pages come one at a time; if the caller keeps reading
+    a large document, the rest is extracted by page range in a process pool.
+    workers=1 always extracts in this process.
+    """
+    count = backend.page_count(path)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or count - lazy_pages < min_parallel_pages:
+        yield from backend.iter_pages(path, 0, count)
+        return
+    yield from backend.iter_pages(path, 0, lazy_pages)
+    yield from _extract_parallel(path, backend, lazy_pages, count, workers)
+
+
+def extract_text(path, backend, workers=None, min_parallel_pages=PARALLEL_MIN_PAGES):
+    """Text of every page, one newline after each non-empty page."""
+    pages = iter_page_texts(path, backend, workers, 0, min_parallel_pages)
+    return "".join(page + "\n" for page in pages if page)
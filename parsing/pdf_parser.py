@@ -1,79 +1,126 @@
 import os
 import uuid
 import re
-import PyPDF2
+from .pdf_backends import PDF_BACKEND, get_pdf_backend, iter_page_texts
 
-def parse_pdf_report(file_path):
-    if PyPDF2 is None:
-        return None, ["ERROR: PyPDF2 not installed. Install it with: pip install PyPDF2"]
+# FIELD TABLES
+# Each pattern captures the field value in its first group.
+
+IDENTIFIER_FIELDS = [
+    {"key": "name", "label": "Patient Name", "pattern": r"Patient Name:\s*(.*)"},
+    {"key": "mrn", "label": "MRN", "pattern": r"MRN:\s*(.*)"},
+    {"key": "dateOfBirth", "label": "Date of Birth", "pattern": r"Date of Birth:\s*(.*)"},
+    {"key": "reportDate", "label": "Report Date", "pattern": r"Report Date:\s*(.*)"},
+]
+
+# Observations are reported in this order; add entries to pick up more vitals
+OBSERVATION_FIELDS = [
+    {"code": "HR", "label": "Heart Rate", "pattern": r"Heart Rate:\s*(\d+)", "unit": "bpm", "referenceRange": "60-100"},
+    {"code": "RHY", "label": "Rhythm", "pattern": r"Rhythm:\s*(.*)", "unit": None, "referenceRange": None},
+]
+
+
+def compile_scanner(fields):
+    """One alternation over every field pattern; group f<i> marks which field matched."""
+    return re.compile("|".join(f"(?P<f{i}>{f['pattern']})" for i, f in enumerate(fields)), re.IGNORECASE)
+
+
+_FIELDS = IDENTIFIER_FIELDS + OBSERVATION_FIELDS
+_SCANNER = compile_scanner(_FIELDS)
+
+
+def add_observation_field(code, label, pattern, unit=None, reference_range=None):
+    """Register another observation pattern for parse_pdf_report."""
+    global _FIELDS, _SCANNER
+    OBSERVATION_FIELDS.append({"code": code, "label": label, "pattern": pattern,
+                               "unit": unit, "referenceRange": reference_range})
+    _FIELDS = IDENTIFIER_FIELDS + OBSERVATION_FIELDS
+    _SCANNER = compile_scanner(_FIELDS)
+
+
+def scan_pages(pages, fields=None, scanner=None):
+    """
+    Collect the first value of every field in a single regex pass per page,
+    reading pages only until all fields are found. Values are captured as the
+    fields' own patterns would on their own, labels sharing a line included.
+    Returns (values by field index, whether any page had text).
+    """
+    fields = fields or _FIELDS
+    scanner = scanner or _SCANNER
+    found = {}
+    has_text = False
+    for page in pages:
+        if not page:
+            continue
+        has_text = has_text or bool(page.strip())
+        pos = 0
+        while True:
+            match = scanner.search(page, pos)
+            if match is None:
+                break
+            name = match.lastgroup
+            index = int(name[1:])
+            # The field's own capture group directly follows its f<i> group
+            group = scanner.groupindex[name] + 1
+            if index not in found:
+                found[index] = (match.group(group) or "").strip()
+            # Resume at the value, not after it: a greedy value can run over
+            # another label on the same line ("Patient Name: ...   MRN: ...")
+            pos = max(match.start(group), match.start() + 1)
+        if len(found) == len(fields):
+            break  # remaining pages are never extracted
+    return found, has_text
+
+
+def parse_pdf_report(file_path, backend=None, workers=None):
+    """
+    backend: "pymupdf", "pypdf2" or "auto" (default from HEALTHPLUS_PDF_BACKEND).
+    workers: processes used for page-parallel extraction of large documents.
+    """
+    pdf_backend = get_pdf_backend(backend)
+    if pdf_backend is None:
+        return None, [f"ERROR: PDF backend '{backend or PDF_BACKEND}' is not available. Install one with: pip install pymupdf (or PyPDF2)"]
 
     if not os.path.exists(file_path):
         return None, ["ERROR: File not found."]
 
+    fields, scanner = _FIELDS, _SCANNER
+    pages = iter_page_texts(file_path, pdf_backend, workers)
     try:
-        reader = PyPDF2.PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            extracted = page.extract_text()
-            if extracted:
-                text += extracted + "\n"
+        found, has_text = scan_pages(pages, fields, scanner)
     except Exception:
         return None, ["ERROR: Failed to extract text from PDF file."]
+    finally:
+        pages.close()
 
-    if not text.strip():
+    if not has_text:
         return None, ["ERROR: PDF text extraction returned empty content."]
 
-    errors = []
-    report_id = str(uuid.uuid4())
-
-    # Helper for regex fields
-    def find(pattern, label):
-        match = re.search(pattern, text, re.IGNORECASE)
-        if not match:
-            errors.append(f"ERROR: Could not find '{label}' in PDF.")
-            return None
-        return match.group(1).strip()
-
-    # Extract patient data
-    patient_name = find(r"Patient Name:\s*(.*)", "Patient Name")
-    mrn = find(r"MRN:\s*(.*)", "MRN")
-    dob = find(r"Date of Birth:\s*(.*)", "Date of Birth")
-    report_date = find(r"Report Date:\s*(.*)", "Report Date")
-
-    # Extract clinical observations
-    heart_rate = find(r"Heart Rate:\s*(\d+)", "Heart Rate")
-    rhythm = find(r"Rhythm:\s*(.*)", "Rhythm")
+    errors = [f"ERROR: Could not find '{f['label']}' in PDF." for i, f in enumerate(fields) if i not in found]
+    values = {f["key"]: found.get(i) for i, f in enumerate(IDENTIFIER_FIELDS)}
 
     observations = []
-    if heart_rate:
-        observations.append({
-            "code": "HR",
-            "value": heart_rate,
-            "unit": "bpm",
-            "referenceRange": "60-100",
-            "abnormalFlag": None
-        })
-
-    if rhythm:
-        observations.append({
-            "code": "RHY",
-            "value": rhythm,
-            "unit": None,
-            "referenceRange": None,
-            "abnormalFlag": None
-        })
-
-    if not patient_name or not mrn:
+    for i, f in enumerate(fields[len(IDENTIFIER_FIELDS):], start=len(IDENTIFIER_FIELDS)):
+        if found.get(i):
+            observations.append({
+                "code": f["code"],
+                "value": found[i],
+                "unit": f["unit"],
+                "referenceRange": f["referenceRange"],
+                "abnormalFlag": None
+            })
+
+    if not values["name"] or not values["mrn"]:
         return None, errors
 
     report = {
-        "reportId": report_id,
-        "reportDate": report_date,
+        "reportId": str(uuid.uuid4()),
+        "reportDate": values["reportDate"],
         "messageType": "PDF_REPORT",
         "patientIdentifiers": {
-            "mrn": mrn,
-            "name": patient_name,
-            "dateOfBirth": dob
+            "mrn": values["mrn"],
+            "name": values["name"],
+            "dateOfBirth": values["dateOfBirth"]
         },
         "observations": observations
     }
@@ -0,0 +1,433 @@
+# parsing/pipeline.py
+import os
+import time
+import queue
+import atexit
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from .hl7_parser import parse_hl7_message, iter_hl7_messages
+from .pdf_parser import parse_pdf_report
+from .report_cache import get_report_cache, file_digest, content_key, control_key
+from Auth.patient_management import PatientManager, track_new_patients
+
+# Bounded queues between stages: a full queue blocks the stage (or caller) feeding it
+QUEUE_SIZE = 100
+# The writer commits up to this many transmissions at once, waiting at most
+# COMMIT_WAIT seconds for a group to fill
+COMMIT_SIZE = 64
+COMMIT_WAIT = 0.05
+# Reports already queued for matching are taken together, up to this many,
+# and those without an exact match are fuzzy-scored in one batch
+MATCH_BATCH = 64
+
+_pipeline = None
+
+
+def parse_report_file(file_path):
+    """Parse one file (in a worker process). Returns (file_path, [(report, errors), ...])."""
+    if file_path.lower().endswith(".pdf"):
+        # Already inside a worker process: no nested page-level pool
+        return file_path, [parse_pdf_report(file_path, workers=1)]
+    return file_path, list(iter_hl7_messages(file_path))
+
+
+class StageStats:
+    """Count, mean and max service time of one stage."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, items=1):
+        with self._lock:
+            self.count += items
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "mean_ms": mean * 1e3, "max_ms": self.max * 1e3}
+
+
+class MeteredQueue(queue.Queue):
+    """queue.Queue that samples its depth on every put."""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.max_depth = 0
+        self._samples = 0
+        self._depth_total = 0
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        depth = self.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        self._samples += 1
+        self._depth_total += depth
+
+    def summary(self):
+        mean = self._depth_total / self._samples if self._samples else 0.0
+        return {"depth": self.qsize(), "max_depth": self.max_depth, "mean_depth": mean, "capacity": self.maxsize}
+
+
+class Job:
+    """
+    One submitted file or message. Every report in it ends with one outcome:
+    {"message", "status", "report", "patient", "match", "confidence", "details",
+     "errors", "duplicate_of", "messages"} where status is stored, duplicate,
+    rejected, corrupted or failed, and messages are the matcher's lines.
+    """
+
+    def __init__(self, source, kind, digest=None):
+        self.source = source
+        self.digest = digest  # content hash, when the caller has already computed it
+        self.kind = kind  # "file", "stream" (multi-message file read in order) or "message"
+        self.outcomes = []
+        self.submitted = time.perf_counter()
+        self.cached = False  # parse served from the content-hash cache
+        self._expected = 0
+        self._sealed = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+
+    def _expect(self):
+        with self._lock:
+            self._expected += 1
+
+    def _seal(self):
+        # The parse stage has queued every report in this job
+        with self._lock:
+            self._sealed = True
+            finished = len(self.outcomes) == self._expected
+        if finished:
+            self._finish()
+
+    def _complete(self, outcome):
+        with self._lock:
+            self.outcomes.append(outcome)
+            finished = self._sealed and len(self.outcomes) == self._expected
+        if finished:
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self.outcomes.sort(key=lambda o: o["message"])
+            self._done.set()
+            callbacks = self._callbacks
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """Call callback(job) from a pipeline thread once every report has an outcome."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.outcomes
+
+
+def _outcome(n, status, report=None, **extra):
+    outcome = {"message": n, "status": status, "report": report, "patient": None, "match": None,
+               "confidence": None, "details": {}, "errors": [], "duplicate_of": None, "messages": []}
+    outcome.update(extra)
+    return outcome
+
+
+class IngestPipeline:
+    """
+    parse -> match -> persist, connected by bounded queues.
+
+    parse:   one thread parsing in-process; once jobs queue up, parse_workers
+             threads, each driving one process of a shared pool (files seen
+             before come from the content-hash cache)
+    match:   one thread holding the in-memory PatientManager; drops duplicates,
+             then exact matching, then fuzzy matching: blocked for a lone
+             report, one fuzzy_match_batch for reports that queued up
+    persist: one writer that group-commits accepted transmissions
+    """
+
+    def __init__(self, parse_workers=None, queue_size=QUEUE_SIZE, commit_size=COMMIT_SIZE,
+                 commit_wait=COMMIT_WAIT, patient_manager=None):
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.commit_size = commit_size
+        self.commit_wait = commit_wait
+        self.patient_manager = patient_manager
+        self.cache = get_report_cache()
+        self.parse_queue = MeteredQueue(queue_size)
+        self.match_queue = MeteredQueue(queue_size)
+        self.persist_queue = MeteredQueue(queue_size)
+        self.stats = {"parse": StageStats(), "match": StageStats(), "persist": StageStats(),
+                      "end_to_end": StageStats()}
+        self.counts = {"stored": 0, "duplicate": 0, "rejected": 0, "corrupted": 0, "failed": 0}
+        self._counts_lock = threading.Lock()  # outcomes finish in the parse, match and persist threads
+        self._pending_keys = set()  # keys matched but not yet committed, shared by match and persist
+        self._keys_lock = threading.Lock()
+        self._pool = None
+        self._threads = []
+        self._scale_lock = threading.Lock()
+
+    # LIFECYCLE
+
+    def start(self):
+        if self.patient_manager is None:
+            self.patient_manager = PatientManager()
+        track_new_patients(self.patient_manager)
+        self._start_stages([("parse", self._parse_stage), ("match", self._match_stage),
+                            ("persist", self._persist_stage)])
+        return self
+
+    def _start_stages(self, stages):
+        for name, target in stages:
+            thread = threading.Thread(target=target, name=f"pipeline-{name}-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append((name, thread))
+
+    def _parse_threads(self):
+        return sum(1 for stage, _ in self._threads if stage == "parse")
+
+    def _scale_parse(self):
+        """
+        Start the process pool and the other parse threads once a second job
+        is waiting; a single upload is parsed in the first thread without them.
+        """
+        if self.parse_queue.qsize() < 2 or self._pool or self.parse_workers == 1:
+            return
+        with self._scale_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+                self._start_stages([("parse", self._parse_stage)] * (self.parse_workers - self._parse_threads()))
+
+    def close(self):
+        """Finish all queued work, then stop every stage."""
+        with self._scale_lock:
+            for _ in range(self._parse_threads()):
+                self.parse_queue.put(None)
+        self._join("parse")
+        self.match_queue.put(None)
+        self._join("match")
+        self.persist_queue.put(None)
+        self._join("persist")
+        if self._pool:
+            self._pool.shutdown()
+        self._threads = []
+
+    def _join(self, name):
+        for stage, thread in self._threads:
+            if stage == name:
+                thread.join()
+
+    # SUBMISSION (blocks while the parse queue is full)
+
+    def submit_file(self, file_path, stream=False, digest=None):
+        """
+        Queue a .hl7/.pdf file. stream=True reads a multi-message HL7 file one
+        message at a time in the parse thread instead of parsing it whole.
+        Pass digest when the file's SHA-256 is already known.
+        """
+        job = Job(file_path, "stream" if stream else "file", digest)
+        self.parse_queue.put(job)
+        self._scale_parse()
+        return job
+
+    def submit_message(self, text):
+        """Queue one HL7 message already in memory (e.g. received over MLLP)."""
+        job = Job(text, "message")
+        self.parse_queue.put(job)
+        self._scale_parse()
+        return job
+
+    # STAGES
+
+    def _parse(self, fn, arg):
+        if self._pool:
+            return self._pool.submit(fn, arg).result()
+        return fn(arg)
+
+    def _finish(self, job, outcome):
+        with self._counts_lock:
+            self.counts[outcome["status"]] += 1
+        self.stats["end_to_end"].record(time.perf_counter() - job.submitted)
+        job._complete(outcome)
+
+    def _parse_stage(self):
+        while True:
+            job = self.parse_queue.get()
+            if job is None:
+                return
+            started = time.perf_counter()
+            try:
+                if job.kind == "stream":
+                    digest = job.digest or (file_digest(job.source) if os.path.exists(job.source) else None)
+                    results = iter_hl7_messages(job.source)
+                elif job.kind == "message":
+                    digest = hashlib.sha256(job.source.encode("utf-8")).hexdigest()
+                    results = [self._parse(parse_hl7_message, job.source)]
+                elif os.path.exists(job.source):
+                    digest = job.digest or file_digest(job.source)
+                    results = self.cache.get(digest)
+                    job.cached = results is not None
+                    if results is None:
+                        results = self.cache.put(digest, self._parse(parse_report_file, job.source)[1])
+                else:
+                    digest, results = None, parse_report_file(job.source)[1]
+                if job.kind != "stream":
+                    # Streamed files are parsed while being queued, so their time includes hand-off
+                    self.stats["parse"].record(time.perf_counter() - started)
+
+                for n, (report, errors) in enumerate(results, start=1):
+                    job._expect()
+                    if not report:
+                        self._finish(job, _outcome(n, "corrupted", errors=errors))
+                        continue
+                    keys = [content_key(digest, n) if digest else None, control_key(report)]
+                    self.match_queue.put((job, n, report, errors, keys))
+            except Exception as e:
+                job._expect()
+                self._finish(job, _outcome(0, "failed", errors=[str(e)]))
+            if job.kind == "stream":
+                self.stats["parse"].record(time.perf_counter() - started)
+            job._seal()
+
+    def _match_stage(self):
+        while True:
+            item = self.match_queue.get()
+            if item is None:
+                return
+            items = [item]
+            while len(items) < MATCH_BATCH:
+                try:
+                    item = self.match_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.match_queue.put(None)  # stop after this group
+                    break
+                items.append(item)
+            self._match_group(items)
+
+    def _match_group(self, items):
+        pm = self.patient_manager
+        fuzzy, fuzzy_keys = [], set()  # reports waiting for the batch score, and their dedupe keys
+        for item in items:
+            job, n, report, errors, keys = item
+            if fuzzy_keys.intersection(keys):
+                # May repeat a report still being matched: settle those first
+                self._match_fuzzy(fuzzy)
+                fuzzy, fuzzy_keys = [], set()
+            started = time.perf_counter()
+            with self._keys_lock:
+                pending = self._pending_keys.intersection(keys)
+            duplicate = None if pending else self.cache.find_duplicate(*keys)
+            if pending or duplicate:
+                self._finish(job, _outcome(n, "duplicate", report, errors=errors,
+                                           duplicate_of=duplicate["reportId"] if duplicate else None))
+                self.stats["match"].record(time.perf_counter() - started)
+                continue
+
+            pid = report.get("patientIdentifiers") or {}
+            pid = {k: pid.get(k) or "" for k in ("mrn", "name", "dateOfBirth")}
+            # Printed with the outcome, after its parse result, not from this thread
+            messages = []
+            patient = pm.match_patient(pid["mrn"], pid["name"], pid["dateOfBirth"], messages)
+            self.stats["match"].record(time.perf_counter() - started)
+            if patient:
+                self._accept(item, patient, "exact", 100, {}, messages)
+            else:
+                fuzzy.append((item, pid, messages))
+                fuzzy_keys.update(k for k in keys if k)
+        self._match_fuzzy(fuzzy)
+
+    def _match_fuzzy(self, fuzzy):
+        if not fuzzy:
+            return
+        started = time.perf_counter()
+        if len(fuzzy) == 1:
+            results = [self.patient_manager.fuzzy_match_patient(fuzzy[0][1])]
+        else:
+            results = self.patient_manager.fuzzy_match_batch([pid for _, pid, _ in fuzzy])
+        self.stats["match"].record(time.perf_counter() - started, 0)
+        for (item, _, messages), (patient, confidence, details) in zip(fuzzy, results):
+            self._accept(item, patient, "fuzzy", confidence, details, messages)
+
+    def _accept(self, item, patient, match, confidence, details, messages):
+        """Queue a matched report for the writer, or reject it when no patient matched."""
+        job, n, report, errors, keys = item
+        if not patient:
+            self._finish(job, _outcome(n, "rejected", report, errors=errors,
+                                       confidence=confidence, details=details))
+            return
+        with self._keys_lock:
+            self._pending_keys.update(k for k in keys if k)
+        self.persist_queue.put((job, _outcome(n, "stored", report, patient=patient, match=match,
+                                              confidence=confidence, details=details, errors=errors,
+                                              messages=messages), keys))
+
+    def _persist_stage(self):
+        while True:
+            item = self.persist_queue.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = time.perf_counter() + self.commit_wait
+            while len(group) < self.commit_size:
+                try:
+                    item = self.persist_queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.persist_queue.put(None)  # handle the stop after this group
+                    break
+                group.append(item)
+
+            started = time.perf_counter()
+            stored = self.patient_manager.add_transmissions([(o["patient"], o["report"]) for _, o, _ in group])
+            for job, outcome, keys in group:
+                if stored:
+                    self.cache.record(keys, outcome["report"]["reportId"], outcome["patient"].patientID)
+                else:
+                    outcome["status"] = "failed"
+                with self._keys_lock:
+                    self._pending_keys.difference_update(keys)
+            self.stats["persist"].record(time.perf_counter() - started, len(group))
+            for job, outcome, _ in group:
+                self._finish(job, outcome)
+
+    # METRICS
+
+    def metrics(self):
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {
+            "counts": counts,
+            "stages": {name: s.summary() for name, s in self.stats.items()},
+            "queues": {"parse": self.parse_queue.summary(), "match": self.match_queue.summary(),
+                       "persist": self.persist_queue.summary()},
+        }
+
+    def print_metrics(self):
+        m = self.metrics()
+        print("\nPipeline metrics")
+        print("  " + ", ".join(f"{k}: {v}" for k, v in m["counts"].items()))
+        print(f"  {'stage':<11} {'items':>6} {'mean (ms)':>10} {'max (ms)':>9}")
+        for name, s in m["stages"].items():
+            print(f"  {name:<11} {s['count']:>6} {s['mean_ms']:>10.2f} {s['max_ms']:>9.2f}")
+        print(f"  {'queue':<11} {'depth':>6} {'max':>6} {'mean':>6} {'capacity':>9}")
+        for name, q in m["queues"].items():
+            print(f"  {name:<11} {q['depth']:>6} {q['max_depth']:>6} {q['mean_depth']:>6.1f} {q['capacity']:>9}")
+
+
+def get_pipeline():
+    """The process-wide pipeline (one parse worker per CPU), started on first use and drained at exit."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = IngestPipeline().start()
+        atexit.register(_pipeline.close)
+    return _pipeline
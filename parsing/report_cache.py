@@ -0,0 +1,125 @@
+# parsing/report_cache.py
+import os
+import json
+import hashlib
+import threading
+from Auth.db_utils import REPORT_CACHE_DIR, REPORT_INDEX_FILE, get_storage
+from Auth.storage import read_new_lines
+from Auth.atomic_io import file_lock
+
+HASH_CHUNK = 1024 * 1024
+
+_report_cache = None
+
+
+def file_digest(file_path):
+    """SHA-256 of the file's bytes, read in chunks."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_key(digest, message_number=1):
+    """Dedupe key for message N (1 for single-report files) of a file with this digest."""
+    return f"sha256:{digest}:{message_number}"
+
+
+def control_key(report):
+    """
+    Dedupe key for a resent HL7 message: sending application and facility,
+    MSH-10 control ID and patient MRN. None for PDFs or messages without MSH-10.
+    """
+    control_id = report.get("messageControlId")
+    if not control_id:
+        return None
+    mrn = (report.get("patientIdentifiers") or {}).get("mrn") or ""
+    return "msh10:" + "|".join([report.get("sendingApplication") or "", report.get("sendingFacility") or "",
+                                control_id, mrn])
+
+
+class ReportCache:
+    """
+    Parsed reports keyed by file content hash (one JSON file each under
+    DB/report_cache/), plus a persisted dedupe index (DB/report_index.jsonl)
+    mapping content and control-ID keys to the transmission they were stored as.
+    """
+
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, index_path=REPORT_INDEX_FILE):
+        self.cache_dir = cache_dir
+        self.index_path = index_path
+        self._index = None
+        self._offset = 0
+        self._lock = threading.Lock()
+        # Serialises appends to the index across ingesting processes
+        self._write_lock = file_lock(index_path + ".lock")
+
+    # PARSE CACHE
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def get(self, digest):
+        """Cached [(report, errors), ...] for a file digest, or None."""
+        try:
+            with open(self._cache_path(digest), "r") as f:
+                return [(report, errors) for report, errors in json.load(f)]
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest, results):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # Per-process temporary name: several ingesting processes may cache the same file
+        tmp_path = f"{self._cache_path(digest)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump([list(r) for r in results], f)
+            os.replace(tmp_path, self._cache_path(digest))
+        except OSError:
+            pass  # the cache is an optimisation; parsing already succeeded
+        return results
+
+    # DEDUPE INDEX
+
+    def _load_index(self):
+        """The dedupe index, caught up with entries other processes appended since the last read."""
+        with self._lock:
+            if self._index is None:
+                self._index, self._offset = {}, 0
+            if os.path.exists(self.index_path) and os.path.getsize(self.index_path) > self._offset:
+                entries, self._offset = read_new_lines(self.index_path, self._offset)
+                for entry in entries:
+                    self._index[entry["key"]] = entry
+            return self._index
+
+    def find_duplicate(self, *keys):
+        """
+        The index entry ({"key", "reportId", "patientID"}) of the first key that
+        was already stored, or None. Entries whose transmission no longer
+        exists in storage are ignored.
+        """
+        index = self._load_index()
+        for key in keys:
+            entry = index.get(key) if key else None
+            if entry and get_storage().get_transmission(entry["patientID"], entry["reportId"]) is not None:
+                return entry
+        return None
+
+    def record(self, keys, report_id, patient_id):
+        """Remember that these keys were stored as report_id for patient_id."""
+        entries = [{"key": k, "reportId": report_id, "patientID": patient_id} for k in keys if k]
+        if not entries:
+            return
+        with self._write_lock:
+            with open(self.index_path, "a") as f:
+                f.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries))
+        self._load_index()
+
+
+def get_report_cache():
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = ReportCache()
+    return _report_cache
@@ -1,19 +1,29 @@
 # Auth/parsing/report_uploader.py
+import os
 import json
-from .hl7_parser import parse_hl7_file
-from .pdf_parser import parse_pdf_report
+from .ingest import ingest_directory, LOW_CONFIDENCE
+from .pipeline import get_pipeline
+from .watcher import watch_directory, POLL_INTERVAL
 from Auth.user_management import get_current_user
-from Auth.patient_management import PatientManager
-
-def upload_report():
-    current_user = get_current_user()
 
+def can_upload(current_user):
     if not current_user:
         print("ERROR: User not authenticated.")
-        return
+        return False
 
     if current_user.role not in ["doctor", "nurse"]:
         print("ERROR: Only doctors and nurses can upload reports.")
+        return False
+    return True
+
+
+def upload_report(batch=False):
+    current_user = get_current_user()
+    if not can_upload(current_user):
+        return
+
+    if batch:
+        upload_hl7_batch()
         return
 
     file_path = input("Enter file path (.hl7 or .pdf): ").strip()
@@ -22,51 +32,90 @@ def upload_report():
         print("ERROR: Unsupported file type.")
         return
 
-    report = None
-    errors = []
+    # Parse, match and store through the shared ingestion pipeline
+    job = get_pipeline().submit_file(file_path)
+    kind = "HL7" if file_path.endswith(".hl7") else "PDF"
+    for outcome in job.wait():
+        print_outcome(outcome, kind)
 
-    # --- Parse HL7 ---
-    if file_path.endswith(".hl7"):
-        report, errors = parse_hl7_file(file_path)
-        if report:
-            print("\nSUCCESS: HL7 parsed successfully!")
-        else:
-            print("\nERROR: Corrupted HL7 file.")
 
-    # --- Parse PDF ---
-    if file_path.endswith(".pdf"):
-        report, errors = parse_pdf_report(file_path)
-        if report:
-            print("\nSUCCESS: PDF parsed successfully!")
-        else:
-            print("\nERROR: Failed to parse PDF.")
-
-    
-
-    if not report:
+def print_outcome(outcome, kind=None):
+    """Report one pipeline outcome; kind ("HL7"/"PDF") adds the parse result line."""
+    status = outcome["status"]
+    if status == "corrupted":
+        print("\nERROR: Corrupted HL7 file." if kind == "HL7" else "\nERROR: Failed to parse PDF.")
         return
+    if status == "failed" and outcome["report"] is None:
+        print(f"\nERROR: {'; '.join(outcome['errors'])}")
+        return
+    if status == "duplicate":
+        already = f" as transmission {outcome['duplicate_of']}" if outcome["duplicate_of"] else ""
+        print(f"INFO: Duplicate report, already stored{already}. Skipping.")
+        return
+    if kind:
+        print(f"\nSUCCESS: {kind} parsed successfully!")
+    for message in outcome["messages"]:
+        print(message)
 
-    # --- Patient Matching ---
-    patient_manager = PatientManager()
-    pid = report.get("patientIdentifiers", {})
-
-    # First try exact match
-    matched_patient = patient_manager.match_patient(
-        pid.get("mrn", ""), 
-        pid.get("name", ""), 
-        pid.get("dateOfBirth", "")
-    )
-
-    if matched_patient:
-        print(f"Exact match found: {matched_patient.Name} ({matched_patient.MRN})")
+    patient, confidence, details = outcome["patient"], outcome["confidence"], outcome["details"]
+    if outcome["match"] == "exact":
+        print(f"Exact match found: {patient.Name} ({patient.MRN})")
     else:
         print("No exact match found. Attempting fuzzy matching...")
-        matched_patient, confidence, details = patient_manager.fuzzy_match_patient(pid)
-        if matched_patient:
-            print(f"Found potential match: {matched_patient.Name} ({matched_patient.MRN})")
-            print(f"Match confidence: {confidence}% (MRN: {details['mrn_score']}%, Name: {details['name_score']}%, DOB: {details['dob_score']}%)")
-            if confidence < 85:
-                print(f"WARNING: Low confidence match ({confidence}%). Please verify patient.")
-        else:
+        if status == "rejected":
             print(f"ERROR: No match found above threshold ({confidence}%). Transmission NOT stored.")
             return
+        print(f"Found potential match: {patient.Name} ({patient.MRN})")
+        print(f"Match confidence: {confidence}% (MRN: {details['mrn_score']}%, Name: {details['name_score']}%, DOB: {details['dob_score']}%)")
+        if confidence < LOW_CONFIDENCE:
+            print(f"WARNING: Low confidence match ({confidence}%). Please verify patient.")
+
+    if status == "stored":
+        print(f"SUCCESS: Transmission {outcome['report']['reportId']} stored for {patient.Name}.")
+    else:
+        print("ERROR: Failed to store transmission.")
+
+
+def upload_hl7_batch():
+    """Stream a multi-message HL7 batch file through the pipeline, one message at a time."""
+    file_path = input("Enter HL7 batch file path (.hl7): ").strip()
+    if not file_path.endswith(".hl7"):
+        print("ERROR: Unsupported file type.")
+        return
+
+    counts = {"stored": 0, "rejected": 0, "corrupted": 0, "duplicate": 0, "failed": 0}
+    for outcome in get_pipeline().submit_file(file_path, stream=True).wait():
+        counts[outcome["status"]] += 1
+        if outcome["status"] == "corrupted":
+            print(f"\nERROR: Message {outcome['message']} could not be parsed: {'; '.join(outcome['errors'])}")
+            continue
+        print(f"\n--- Message {outcome['message']} ---")
+        print_outcome(outcome)
+
+    print(f"\nBatch complete: {counts['stored']} stored, {counts['rejected']} not matched, "
+          f"{counts['corrupted']} corrupted, {counts['duplicate']} duplicates, {counts['failed']} failed.")
+
+
+def upload_directory():
+    """Bulk-ingest every .hl7/.pdf report in a directory (see parsing/ingest.py)."""
+    if not can_upload(get_current_user()):
+        return
+    dir_path = input("Enter directory path: ").strip()
+    if not os.path.isdir(dir_path):
+        print("ERROR: Directory not found.")
+        return
+    ingest_directory(dir_path)
+
+
+def watch_folder():
+    """Ingest new and changed reports in a directory until Ctrl+C (see parsing/watcher.py)."""
+    if not can_upload(get_current_user()):
+        return
+    dir_path = input("Enter directory to watch: ").strip()
+    interval = input(f"Poll interval in seconds (Enter for {POLL_INTERVAL:g}): ").strip()
+    try:
+        interval = float(interval) if interval else POLL_INTERVAL
+    except ValueError:
+        print("ERROR: Invalid interval.")
+        return
+    watch_directory(dir_path, interval)
@@ -0,0 +1,231 @@
+# parsing/watcher.py
+# Watch-folder ingestion: python -m parsing.watcher <directory> [interval]
+import os
+import sys
+import json
+import time
+from .ingest import REPORT_EXTENSIONS, new_summary, tally
+from .pipeline import get_pipeline
+from .report_cache import file_digest
+from Auth.db_utils import WATCH_CHECKPOINT_FILE
+
+# Seconds between directory sweeps
+POLL_INTERVAL = 5.0
+# Files modified more recently than this are probably still being copied in;
+# they are picked up on a later sweep
+SETTLE_SECONDS = 2.0
+# Rewrite the checkpoint once the journal holds this many superseded lines
+COMPACT_AFTER = 10000
+# Finished files are checkpointed (one fsync) in groups of this size
+CHECKPOINT_BATCH = 256
+
+
+class WatchCheckpoint:
+    """
+    Files already ingested, keyed by absolute path: {"path", "size", "mtime",
+    "sha256"} (mtime in nanoseconds). Kept as an append-only journal
+    (DB/watch_checkpoint.jsonl) where the last line for a path wins and a
+    line with "deleted" removes it; compacted when it grows stale.
+    """
+
+    def __init__(self, path=WATCH_CHECKPOINT_FILE):
+        self.path = path
+        self.entries = {}
+        self._stale = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                lines += 1
+                if entry.get("deleted"):
+                    self.entries.pop(entry["path"], None)
+                else:
+                    self.entries[entry["path"]] = entry
+        self._stale = lines - len(self.entries)
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def _append(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def update(self, entries):
+        """Record files as processed."""
+        if not entries:
+            return
+        self._append(entries)
+        for e in entries:
+            if e["path"] in self.entries:
+                self._stale += 1
+            self.entries[e["path"]] = e
+        self._maybe_compact()
+
+    def forget(self, paths):
+        """Drop files that no longer exist."""
+        paths = [p for p in paths if p in self.entries]
+        if not paths:
+            return
+        self._append([{"path": p, "deleted": True} for p in paths])
+        for p in paths:
+            del self.entries[p]
+        self._stale += 2 * len(paths)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._stale >= COMPACT_AFTER:
+            self.compact()
+
+    def compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in self.entries.values()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._stale = 0
+
+
+def stat_reports(dir_path):
+    """Yield (path, size, mtime_ns) for every .hl7/.pdf under dir_path: one stat per file, no reads."""
+    stack = [dir_path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.lower().endswith(REPORT_EXTENSIONS):
+                            st = entry.stat()
+                            yield entry.path, st.st_size, st.st_mtime_ns
+                    except OSError:
+                        continue  # removed while we were listing
+        except OSError:
+            continue
+
+
+class FolderWatcher:
+    """
+    Polls a directory and feeds new or changed reports into the ingestion
+    pipeline. A file is unchanged when its size and mtime match the
+    checkpoint; only changed files are hashed, and only changed content is
+    parsed. Files are checkpointed once the pipeline has finished them, so a
+    restart skips everything already processed; a file whose report failed to
+    store is retried on the next poll.
+    """
+
+    def __init__(self, dir_path, interval=POLL_INTERVAL, checkpoint=None, pipeline=None,
+                 settle=SETTLE_SECONDS, verbose=True):
+        self.dir_path = os.path.abspath(dir_path)
+        self.interval = interval
+        self.checkpoint = checkpoint or WatchCheckpoint()
+        self.pipeline = pipeline
+        self.settle = settle
+        self.verbose = verbose
+        self.totals = new_summary()
+
+    def scan(self):
+        """One stat sweep. Returns ([(path, size, mtime_ns), ...] new or changed, set of paths seen)."""
+        changed, seen = [], set()
+        settled_before = time.time_ns() - int(self.settle * 1e9)
+        for path, size, mtime in stat_reports(self.dir_path):
+            seen.add(path)
+            entry = self.checkpoint.get(path)
+            if entry and entry["size"] == size and entry["mtime"] == mtime:
+                continue
+            if mtime > settled_before:
+                continue
+            changed.append((path, size, mtime))
+        return changed, seen
+
+    def poll(self):
+        """Run one cycle. Returns the summary of what was ingested."""
+        start = time.perf_counter()
+        if not os.path.isdir(self.dir_path):
+            # e.g. a share that is briefly unmounted: keep the checkpoint as it is
+            print(f"WARNING: {self.dir_path} is not available, skipping this cycle.")
+            return new_summary()
+        changed, seen = self.scan()
+        prefix = self.dir_path + os.sep
+        self.checkpoint.forget([p for p in self.checkpoint.entries if p.startswith(prefix) and p not in seen])
+
+        summary = new_summary(len(changed))
+        touched, jobs = [], []
+        for path, size, mtime in sorted(changed):
+            try:
+                digest = file_digest(path)
+            except OSError:
+                continue  # vanished since the sweep
+            entry = {"path": path, "size": size, "mtime": mtime, "sha256": digest}
+            previous = self.checkpoint.get(path)
+            if previous and previous["sha256"] == digest:
+                touched.append(entry)  # same bytes, new mtime: nothing to ingest
+                continue
+            if self.pipeline is None:
+                self.pipeline = get_pipeline()
+            jobs.append((self.pipeline.submit_file(path, digest=digest), entry))
+        self.checkpoint.update(touched)
+
+        done = []
+        for job, entry in jobs:
+            tally(job, summary, self.verbose)
+            if any(outcome["status"] == "failed" for outcome in job.outcomes):
+                continue  # not stored: left out of the checkpoint so the next poll retries it
+            done.append(entry)
+            if len(done) >= CHECKPOINT_BATCH:
+                self.checkpoint.update(done)
+                done = []
+        self.checkpoint.update(done)
+
+        summary["files"] = len(jobs)
+        summary["seconds"] = time.perf_counter() - start
+        for key in self.totals:
+            self.totals[key] += summary[key]
+        if jobs:
+            print(f"INFO: {len(jobs)} new/changed files: {summary['stored']} stored, "
+                  f"{summary['duplicates']} duplicates, {summary['rejected']} rejected, "
+                  f"{summary['corrupted']} corrupted ({summary['seconds']:.2f}s)")
+        return summary
+
+    def run(self):
+        """Poll until Ctrl+C."""
+        print(f"INFO: Watching {self.dir_path} every {self.interval:g}s "
+              f"({len(self.checkpoint.entries)} files in checkpoint, Ctrl+C to stop)")
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
+        t = self.totals
+        print(f"\nWatch stopped: {t['files']} files ingested, {t['stored']} stored, {t['duplicates']} duplicates, "
+              f"{t['rejected']} rejected, {t['corrupted']} corrupted")
+        return self.totals
+
+
+def watch_directory(dir_path, interval=POLL_INTERVAL):
+    if not os.path.isdir(dir_path):
+        print("ERROR: Directory not found.")
+        return None
+    return FolderWatcher(dir_path, interval).run()
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:]:
+        print("Usage: python -m parsing.watcher <directory> [interval]")
+        sys.exit(1)
+    watch_directory(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else POLL_INTERVAL)